@@ -1,11 +1,28 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import os
+import json
+import uuid
 import numpy as np
 import pandas as pd
 from datetime import datetime
-from utils.data_processor import preprocess_dataset, create_pivot_data
-from utils.ai_integration import summarize_and_analyze_esg_results
+from utils.data_processor import preprocess_csv, create_pivot_data, KEY_COLUMNS
+from utils.ai_integration import (
+    summarize_and_analyze_esg_results, summarize_long_esg_results, classify_esg_texts, summarizer, warm_up
+)
+from utils.dataset_registry import DatasetRegistry
+from utils.row_index import RowIndex
+from utils.upload_index import UploadIndex, content_dataset_id
+from utils.dataset_store import save_dataset, export_csv, DEFAULT_STORAGE_FORMAT
+from utils.chunked_ingest import spill_upload, ingest_csv_in_chunks, get_progress
+from utils.model_store import ModelStore, train_in_process, predict_with_bundle, predict_risk_with_bundle, forecast_with_bundle
+from utils.job_queue import TrainingJobQueue
+from utils.allocation_engine import (
+    solve_allocation, solve_budget_sweep, allocate_greedy, allocate_fractional, portfolio_constraints, STRATEGIES
+)
+from utils.serving import CpuOffload, serve, DEFAULT_SERVER_THREADS
+from utils.prediction_sessions import PredictionSessionStore, PredictionResultNotFound
+from utils.response_formats import RESPONSE_FORMATS, negotiate_format, negotiate_encoding, encode_frame, compress
 import logging
 
 # Initialize Flask app
@@ -20,7 +37,73 @@ logger = logging.getLogger(__name__)
 UPLOAD_FOLDER = './uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Limit uploads to 16 MB
+# Upload size limit in MB, 0 disables the limit
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 16))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024 if MAX_UPLOAD_MB > 0 else None
+# Uploads larger than this are preprocessed in chunks instead of in one frame
+app.config['CHUNKED_INGEST_THRESHOLD'] = int(os.environ.get('CHUNKED_INGEST_THRESHOLD_MB', 8)) * 1024 * 1024
+app.config['INGEST_CHUNK_ROWS'] = 100_000
+app.config['DATASET_CACHE_MAX_ENTRIES'] = 8
+app.config['DATASET_CACHE_MAX_BYTES'] = 512 * 1024 * 1024
+app.config['DATASET_STORAGE_FORMAT'] = os.environ.get('DATASET_STORAGE_FORMAT', DEFAULT_STORAGE_FORMAT)
+
+# Index of content-addressed uploads; the retention limits evict the least recently
+# uploaded datasets (0 disables a limit)
+app.config['UPLOAD_RETENTION_MAX_BYTES'] = int(os.environ.get('UPLOAD_RETENTION_MAX_MB', 0)) * 1024 * 1024
+app.config['UPLOAD_RETENTION_MAX_AGE_DAYS'] = float(os.environ.get('UPLOAD_RETENTION_MAX_AGE_DAYS', 0))
+upload_index = UploadIndex(
+    app.config['UPLOAD_FOLDER'],
+    max_bytes=app.config['UPLOAD_RETENTION_MAX_BYTES'],
+    max_age_days=app.config['UPLOAD_RETENTION_MAX_AGE_DAYS']
+)
+
+# In-memory registry of preprocessed datasets shared by the read endpoints
+dataset_registry = DatasetRegistry(
+    app.config['UPLOAD_FOLDER'],
+    max_entries=app.config['DATASET_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['DATASET_CACHE_MAX_BYTES'],
+    index=upload_index
+)
+
+# Trained models are saved next to the datasets and cached per dataset fingerprint
+app.config['MODEL_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'models')
+app.config['MODEL_CACHE_MAX_ENTRIES'] = 4
+# "random_forest" or "hist_gradient_boosting" (native categorical splits, early stopping)
+app.config['MODEL_BACKEND'] = os.environ.get('MODEL_BACKEND', 'random_forest')
+model_store = ModelStore(
+    app.config['MODEL_FOLDER'],
+    max_entries=app.config['MODEL_CACHE_MAX_ENTRIES'],
+    backend=app.config['MODEL_BACKEND']
+)
+
+# Background training: worker processes for the forests, and whether uploads queue a job
+app.config['TRAINING_N_JOBS'] = int(os.environ.get('TRAINING_N_JOBS', 2))
+app.config['TRAIN_ON_UPLOAD'] = os.environ.get('TRAIN_ON_UPLOAD', '1') == '1'
+# Update the models of the previous upload incrementally instead of training from scratch
+app.config['INCREMENTAL_TRAINING'] = os.environ.get('INCREMENTAL_TRAINING', '1') == '1'
+training_jobs = TrainingJobQueue(model_store, n_jobs=app.config['TRAINING_N_JOBS'])
+
+# "production" serves with a multi-threaded server and runs CSV parsing, model fits and
+# large allocation solves in worker processes, so they do not hold up the handler threads
+app.config['SERVING_MODE'] = os.environ.get('SERVING_MODE', 'development')
+default_offload_workers = max(1, (os.cpu_count() or 2) // 2) if app.config['SERVING_MODE'] == 'production' else 0
+app.config['CPU_OFFLOAD_WORKERS'] = int(os.environ.get('CPU_OFFLOAD_WORKERS', default_offload_workers))
+# Smaller allocation problems solve faster inline than the round trip to a worker takes
+app.config['OFFLOAD_MIN_PROJECTS'] = int(os.environ.get('OFFLOAD_MIN_PROJECTS', 1000))
+cpu_offload = CpuOffload(app.config['CPU_OFFLOAD_WORKERS'])
+
+# Bounds on constrained (MILP) allocations; a solve stops at the time limit or once the
+# relative gap to the best bound is reached (0 lets CBC use its default)
+app.config['ALLOCATION_TIME_LIMIT_SECONDS'] = float(os.environ.get('ALLOCATION_TIME_LIMIT_SECONDS', 10))
+app.config['ALLOCATION_MIP_GAP'] = float(os.environ.get('ALLOCATION_MIP_GAP', 0))
+
+# Prediction results kept server-side so /allocate-budget can refer to them by result ID
+app.config['PREDICTION_SESSION_TTL_SECONDS'] = int(os.environ.get('PREDICTION_SESSION_TTL_SECONDS', 900))
+app.config['PREDICTION_SESSION_MAX_ENTRIES'] = int(os.environ.get('PREDICTION_SESSION_MAX_ENTRIES', 32))
+prediction_sessions = PredictionSessionStore(
+    ttl_seconds=app.config['PREDICTION_SESSION_TTL_SECONDS'],
+    max_entries=app.config['PREDICTION_SESSION_MAX_ENTRIES']
+)
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'csv'}
@@ -31,166 +114,807 @@ def allowed_file(filename):
 
 @app.route('/upload-dataset', methods=['POST'])
 def upload_dataset():
-    """Handle dataset uploads."""
-    if 'file' not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
-
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
-
-    if not allowed_file(file.filename):
-        return jsonify({"error": "Invalid file type. Only .csv files are allowed"}), 400
+    """
+    Handle dataset uploads.
+
+    Accepts a multipart form with a "file" field or a raw text/csv body. Large
+    files (or ?mode=chunked) are preprocessed in chunks, and their progress can
+    be polled at /upload-progress/<upload_id>.
+    """
+    if request.mimetype == 'text/csv':
+        stream = request.stream
+    else:
+        if 'file' not in request.files:
+            return jsonify({"error": "No file uploaded"}), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+
+        if not allowed_file(file.filename):
+            return jsonify({"error": "Invalid file type. Only .csv files are allowed"}), 400
+        stream = file.stream
 
     timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    raw_file_path = os.path.join(app.config['UPLOAD_FOLDER'], f'uploaded_dataset_{timestamp}.csv')
+    upload_id = request.args.get('upload_id', timestamp)
+    previous_dataset_id = previous_trained_dataset()
+    spill_path = os.path.join(app.config['UPLOAD_FOLDER'], f'uploaded_dataset_{timestamp}_{uuid.uuid4().hex[:8]}.part')
+    # Raw file moved into place but not indexed yet, so retention would never delete it
+    unindexed_path = None
     try:
-        file.save(raw_file_path)
-        logger.info(f"File saved at: {raw_file_path}")
+        raw_bytes, digest = spill_upload(stream, spill_path)
+        dataset_id = content_dataset_id(digest)
+
+        # Uploads are content-addressed: the same bytes map to the same dataset
+        with upload_index.claim(digest):
+            existing = upload_index.lookup(digest)
+            if existing is not None:
+                os.remove(spill_path)
+                upload_index.touch(digest)
+                dataset_registry.add(dataset_id, existing["path"])
+                logger.info(f"Upload matches dataset {dataset_id}, skipping preprocessing")
+                response = {
+                    "message": "Dataset already uploaded",
+                    "file_path": existing["path"],
+                    "dataset_id": dataset_id,
+                    "upload_id": upload_id,
+                    "mode": "deduplicated",
+                    "bytes": raw_bytes,
+                    "rows": existing["rows"]
+                }
+            else:
+                raw_file_path = os.path.join(app.config['UPLOAD_FOLDER'], f'uploaded_dataset_{dataset_id}.csv')
+                os.replace(spill_path, raw_file_path)
+                unindexed_path = raw_file_path
+                logger.info(f"File saved at: {raw_file_path} ({raw_bytes} bytes)")
+                response = preprocess_upload(raw_file_path, raw_bytes, dataset_id, upload_id)
+                upload_index.add(digest, raw_file_path, response["file_path"], response["rows"])
+                unindexed_path = None
+
+        # The parent of the incremental training job is kept too
+        for evicted_id in upload_index.enforce_retention(protect={dataset_id, previous_dataset_id} - {None}):
+            dataset_registry.remove(evicted_id)
+
+        if app.config['TRAIN_ON_UPLOAD']:
+            try:
+                job, _ = submit_training_job(dataset_id, parent_dataset_id=previous_dataset_id)
+            except FileNotFoundError as e:
+                if previous_dataset_id is None:
+                    raise
+                # The parent was removed in the meantime, e.g. by a concurrent upload
+                logger.warning(f"Parent dataset {previous_dataset_id} is gone ({e}), training {dataset_id} from scratch")
+                job, _ = submit_training_job(dataset_id)
+            response["training_job_id"] = job["job_id"]
+
+        return jsonify(response), 200
+    except Exception as e:
+        for path in (spill_path, unindexed_path):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+        logger.error(f"Error processing file: {e}")
+        return jsonify({"error": f"Failed to process file: {str(e)}"}), 500
 
+def preprocess_upload(raw_file_path, raw_bytes, dataset_id, upload_id):
+    """Preprocess a spilled upload in memory or in chunks and register the dataset."""
+    chunked = request.args.get('mode') == 'chunked' or raw_bytes > app.config['CHUNKED_INGEST_THRESHOLD']
+    if chunked:
+        result = ingest_csv_in_chunks(
+            raw_file_path,
+            app.config['UPLOAD_FOLDER'],
+            f'preprocessed_dataset_{dataset_id}',
+            upload_id=upload_id,
+            storage_format=app.config['DATASET_STORAGE_FORMAT'],
+            chunk_rows=app.config['INGEST_CHUNK_ROWS']
+        )
+        preprocessed_file_path, rows, year_columns = result["path"], result["rows"], result["year_columns"]
+        dataset_registry.add(dataset_id, preprocessed_file_path)
+        # Build the series/country row index now rather than on the first filtered request
+        dataset_registry.row_index(dataset_id)
+    else:
         # Validate and preprocess dataset
-        df = pd.read_csv(raw_file_path)
-        preprocessed_df, year_columns = preprocess_dataset(df)
-        logger.info(f"Year columns detected: {year_columns}")
-
-        preprocessed_file_path = os.path.join(app.config['UPLOAD_FOLDER'], f'preprocessed_dataset_{timestamp}.csv')
-        preprocessed_df.to_csv(preprocessed_file_path, index=False)
-        logger.info(f"Dataset preprocessed and saved at: {preprocessed_file_path}")
+        preprocessed_df, year_columns = cpu_offload.run(preprocess_csv, raw_file_path)
+
+        preprocessed_file_path = save_dataset(
+            preprocessed_df,
+            app.config['UPLOAD_FOLDER'],
+            f'preprocessed_dataset_{dataset_id}',
+            app.config['DATASET_STORAGE_FORMAT']
+        )
+        rows = len(preprocessed_df)
+        dataset_registry.register(dataset_id, preprocessed_file_path, preprocessed_df)
+
+    logger.info(f"Year columns detected: {year_columns}")
+    logger.info(f"Dataset preprocessed and saved at: {preprocessed_file_path}")
+    return {
+        "message": "Dataset uploaded and preprocessed successfully",
+        "file_path": preprocessed_file_path,
+        "dataset_id": dataset_id,
+        "upload_id": upload_id,
+        "mode": "chunked" if chunked else "in_memory",
+        "bytes": raw_bytes,
+        "rows": rows
+    }
 
-        return jsonify({"message": "Dataset uploaded and preprocessed successfully", "file_path": preprocessed_file_path}), 200
+@app.route('/upload-progress/<upload_id>', methods=['GET'])
+def upload_progress(upload_id):
+    """Report the progress of a chunked dataset ingestion."""
+    progress = get_progress(upload_id)
+    if progress is None:
+        return jsonify({"error": f"No ingestion found for upload ID: {upload_id}"}), 404
+    return jsonify(progress), 200
+
+def submit_training_job(dataset_id, parent_dataset_id=None):
+    """
+    Queue background training for a dataset; duplicate submissions share one job.
+
+    With a parent dataset the parent's models are updated with the changed
+    training data instead of training new models from scratch.
+    """
+    fingerprint = dataset_registry.fingerprint(dataset_id)
+    parent = None
+    if parent_dataset_id is not None:
+        parent = (dataset_registry.fingerprint(parent_dataset_id), lambda: dataset_registry.get(parent_dataset_id))
+    return training_jobs.submit(
+        fingerprint, lambda: dataset_registry.get(dataset_id), dataset_id=dataset_id, parent=parent
+    )
+
+def previous_trained_dataset():
+    """Return the latest dataset whose models are already trained, if incremental training is enabled."""
+    if not (app.config['TRAIN_ON_UPLOAD'] and app.config['INCREMENTAL_TRAINING']):
+        return None
+    try:
+        dataset_id = dataset_registry.latest_id()
+        return dataset_id if model_store.has_models(dataset_registry.fingerprint(dataset_id)) else None
+    except FileNotFoundError:
+        return None
+
+@app.route('/train', methods=['POST'])
+def train():
+    """
+    Start training the ESG and risk models for a dataset in the background.
+
+    With "mode": "incremental" and a "parent_dataset_id", the parent's models
+    are updated with the cells that are new or changed in the dataset.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        mode = data.get("mode", "full")
+        if mode not in ("full", "incremental"):
+            return jsonify({"error": "Invalid mode. Must be 'full' or 'incremental'."}), 400
+        if mode == "incremental" and not data.get("parent_dataset_id"):
+            return jsonify({"error": "Incremental training requires a parent_dataset_id."}), 400
+        try:
+            dataset_id = data.get("dataset_id") or dataset_registry.latest_id()
+            parent_dataset_id = data.get("parent_dataset_id") if mode == "incremental" else None
+            job, coalesced = submit_training_job(dataset_id, parent_dataset_id)
+        except FileNotFoundError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify({"job_id": job["job_id"], "status": job["status"], "coalesced": coalesced}), 202
     except Exception as e:
-        logger.error(f"Error processing file: {e}")
-        return jsonify({"error": f"Failed to process file: {str(e)}"}), 500
+        logger.error(f"Error in /train: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report the status, timings and model version of a training job."""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify(job), 200
+
+@app.route('/datasets/<dataset_id>/lineage', methods=['GET'])
+def model_lineage(dataset_id):
+    """Report how the models of a dataset were trained, followed by their ancestors."""
+    try:
+        lineage = model_store.lineage(dataset_registry.fingerprint(dataset_id))
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    if not lineage:
+        return jsonify({"error": f"No trained models found for dataset: {dataset_id}"}), 404
+    return jsonify({"dataset_id": dataset_id, "lineage": lineage}), 200
 
 @app.route('/project-series', methods=['GET'])
 def get_project_series():
     """Fetch unique project series from the uploaded dataset."""
     try:
-        uploaded_files = [f for f in os.listdir(app.config['UPLOAD_FOLDER']) if f.endswith('.csv')]
-        if not uploaded_files:
-            return jsonify({"error": "No dataset uploaded. Please upload a file first."}), 400
-
-        latest_file = max(uploaded_files, key=lambda f: os.path.getmtime(os.path.join(app.config['UPLOAD_FOLDER'], f)))
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], latest_file)
-
-        df = pd.read_csv(file_path)
-        if 'SeriesName' not in df.columns:
+        try:
+            row_index = dataset_registry.row_index(request.args.get("dataset_id"))
+        except FileNotFoundError as e:
+            return jsonify({"error": str(e)}), 400
+        if 'SeriesName' not in row_index.columns:
             return jsonify({"error": "'SeriesName' column not found in the dataset."}), 400
 
-        project_series = df['SeriesName'].dropna().unique().tolist()
-        return jsonify({"series": project_series}), 200
+        return jsonify({"series": row_index.values('SeriesName')}), 200
     except Exception as e:
         logger.error(f"Error in /project-series: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/predict-esg', methods=['POST'])
 def predict_esg():
-    try:
-        data = request.get_json()
-        project_series = data.get("project_series", "All Projects")
+    """
+    Predict ESG scores and risk factors for the projects of a dataset.
 
-        preprocessed_files = [f for f in os.listdir(app.config['UPLOAD_FOLDER']) if f.startswith('preprocessed_dataset_')]
-        if not preprocessed_files:
-            return jsonify({"error": "No preprocessed dataset found. Please upload a dataset first."}), 400
+    Without "years" the YR2020 snapshot is scored. With "years" (a list, or
+    {"start": ..., "end": ...}) every project is forecast for each year, using
+    "lags" previous years of its time series as features.
 
-        latest_file = max(preprocessed_files, key=lambda f: os.path.getmtime(os.path.join(app.config['UPLOAD_FOLDER'], f)))
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], latest_file)
+    "project_series" and "countries" take a name or a list of names; the rows
+    are looked up in the dataset's series/country index.
 
-        df = pd.read_csv(file_path)
+    The predictions are sent as JSON records by default. An Accept header of
+    application/vnd.esg.split+json sends the column names once and the rows as
+    lists, application/vnd.apache.arrow.stream an Arrow IPC stream; large
+    responses are compressed per Accept-Encoding (zstd or gzip).
 
-        if project_series != "All Projects":
-            df = df[df["SeriesName"] == project_series]
-            if df.empty:
-                return jsonify({"error": f"No data found for project series: {project_series}"}), 400
+    The result is also kept server-side: pass the returned "result_id" to
+    /allocate-budget instead of posting the predictions back.
+    """
+    try:
+        data = request.get_json()
+        try:
+            filters = parse_filters(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        dataset_id = data.get("dataset_id")
+        if data.get("years") is not None:
+            try:
+                years = parse_years(data["years"])
+                lags = int(data.get("lags", 0))
+                if not 0 <= lags <= MAX_FORECAST_LAGS:
+                    raise ValueError(f"lags must be between 0 and {MAX_FORECAST_LAGS}.")
+            except (TypeError, ValueError, KeyError) as e:
+                return jsonify({"error": f"Invalid years or lags: {e}"}), 400
+            return predict_esg_years(dataset_id, filters, years, lags)
 
         year_column = 'YR2020'
-        if year_column not in df.columns:
-            raise ValueError(f"Year column '{year_column}' not found in the dataset.")
-
-        pivot_data = create_pivot_data(df, year_column)
-
-        # Ensure "Cost" and "RiskFactor" exist in the dataset
+        try:
+            rows = dataset_registry.row_index(dataset_id).rows(filters)
+            df = dataset_registry.get(dataset_id, columns=KEY_COLUMNS + [year_column], rows=rows)
+            fingerprint = dataset_registry.fingerprint(dataset_id)
+        except FileNotFoundError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if df.empty:
+            return jsonify({"error": f"No data found for {describe_filters(filters)}"}), 400
+
+        pivot_data = create_pivot_data(df, year_column, encode=False)
+
+        # Models are trained once per dataset version and served from the model cache
+        bundle, model_source = model_store.get_or_train(
+            fingerprint, lambda: dataset_registry.get(dataset_id), trainer=offloaded_trainer
+        )
+        predicted_esg_scores, predicted_risk_factors, inference_ms = predict_with_bundle(bundle, pivot_data)
+        logger.info(f"Predicted {len(pivot_data)} rows in {inference_ms:.1f} ms (models from {model_source})")
+
+        # Ensure "Cost" exists in the dataset
         if "Cost" not in pivot_data.columns:
             pivot_data["Cost"] = np.random.randint(20, 81, size=len(pivot_data))
-        if "RiskFactor" not in pivot_data.columns:
-            pivot_data["RiskFactor"] = np.random.uniform(0.1, 0.5, size=len(pivot_data))
 
         # Add predictions
-        pivot_data['Predicted ESG Score'] = np.random.uniform(50, 100, len(pivot_data))
-
-        predictions = pivot_data.to_dict(orient="records")
-        return jsonify({"predictions": predictions}), 200
+        pivot_data['RiskFactor'] = predicted_risk_factors
+        pivot_data['Predicted ESG Score'] = predicted_esg_scores
+
+        return frame_response(pivot_data, "predictions", {
+            **store_prediction_result(pivot_data),
+            "model": {
+                "fingerprint": fingerprint,
+                "backend": bundle.get("backend", "random_forest"),
+                "source": model_source,
+                "train_seconds": bundle["train_seconds"],
+                "inference_ms": inference_ms,
+                "cache_hit_rate": model_store.stats()["hit_rate"]
+            }
+        }), 200
     except Exception as e:
         logger.error(f"Error in /predict-esg: {e}")
         return jsonify({"error": str(e)}), 500
 
+def frame_response(frame, key, metadata):
+    """Send a frame with the format and compression negotiated from the request headers."""
+    # One-hot key columns would repeat every country and series name in every row
+    one_hot = [col for col in frame.columns if any(str(col).startswith(f'{key_col}_') for key_col in KEY_COLUMNS)]
+    frame = frame.drop(columns=one_hot)
+
+    fmt = negotiate_format(request.headers.get('Accept'))
+    body = encode_frame(frame, fmt, key, metadata, dumps=app.json.dumps)
+    body, encoding = compress(body, negotiate_encoding(request.headers.get('Accept-Encoding')))
+    response = Response(body, mimetype=RESPONSE_FORMATS[fmt])
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.update(['Accept', 'Accept-Encoding'])
+    return response
+
+def store_prediction_result(predictions):
+    """Keep the allocation columns of a prediction frame for later /allocate-budget calls."""
+    result_id = prediction_sessions.put(indexed_projects(predictions_to_frame(predictions)))
+    return {"result_id": result_id, "result_ttl_seconds": prediction_sessions.ttl_seconds}
+
+def offloaded_trainer(X, y, risk_X, risk_y, **model_options):
+    """Fit the ESG and risk models of a request-time cache miss in a worker process."""
+    return cpu_offload.run(train_in_process, X, y, risk_X, risk_y, **model_options)
+
+MAX_FORECAST_YEARS = 50
+MAX_FORECAST_LAGS = 10
+
+def parse_filter(value, name):
+    """Return a series/country filter as a list of names, or None for no filter."""
+    if value is None or value == "All Projects":
+        return None
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not value or not all(isinstance(item, str) and item.strip() for item in value):
+        raise ValueError(f"Invalid {name} value. Must be a name or a non-empty list of names.")
+    return None if "All Projects" in value else value
+
+def parse_filters(data):
+    """Return the dataset row filters of a request: series and countries by name."""
+    return {
+        "SeriesName": parse_filter(data.get("project_series"), "project_series"),
+        "CountryName": parse_filter(data.get("countries"), "countries"),
+    }
+
+def describe_filters(filters):
+    """Describe the active filters for error messages."""
+    labels = {"SeriesName": "project series", "CountryName": "countries"}
+    active = [f"{labels[col]}: {', '.join(values)}" for col, values in filters.items() if values is not None]
+    return "; ".join(active) or "the dataset"
+
+def parse_years(years):
+    """Return the requested years of a list or a {"start", "end"} range, in order and without duplicates."""
+    if isinstance(years, dict):
+        years = range(int(years["start"]), int(years["end"]) + 1)
+    elif not isinstance(years, list):
+        raise ValueError("years must be a list or a {\"start\", \"end\"} range.")
+    years = list(dict.fromkeys(int(year) for year in years))
+    if not 0 < len(years) <= MAX_FORECAST_YEARS:
+        raise ValueError(f"Between 1 and {MAX_FORECAST_YEARS} years can be predicted at once.")
+    return years
+
+def predict_esg_years(dataset_id, filters, years, lags):
+    """Forecast every project of a dataset for several years in one batch."""
+    try:
+        rows = dataset_registry.row_index(dataset_id).rows(filters)
+        df = dataset_registry.get(dataset_id, rows=rows)
+        fingerprint = dataset_registry.fingerprint(dataset_id)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if df.empty:
+        return jsonify({"error": f"No data found for {describe_filters(filters)}"}), 400
+
+    # One row per project, like the pivot of the single-year mode
+    projects = df.groupby(KEY_COLUMNS, observed=True, as_index=False).mean(numeric_only=True)
+
+    load_dataset = lambda: dataset_registry.get(dataset_id)
+    forecast_bundle, forecast_source = model_store.get_or_train(
+        fingerprint, load_dataset, trainer=offloaded_trainer, lags=lags
+    )
+    bundle, model_source = model_store.get_or_train(fingerprint, load_dataset, trainer=offloaded_trainer)
+    predicted_esg_scores, predict_calls, inference_ms = forecast_with_bundle(forecast_bundle, projects, years)
+    predicted_risk_factors = predict_risk_with_bundle(bundle, projects)
+    logger.info(f"Forecast {len(projects)} projects for {len(years)} years in {inference_ms:.1f} ms ({predict_calls} predict calls)")
+
+    n = len(projects)
+    predictions = pd.DataFrame({
+        "CountryName": np.tile(projects["CountryName"].astype(str).to_numpy(), len(years)),
+        "SeriesName": np.tile(projects["SeriesName"].astype(str).to_numpy(), len(years)),
+        "Year": np.repeat(years, n),
+        "Cost": np.tile(projects["Cost"].to_numpy(), len(years)),
+        "RiskFactor": np.tile(predicted_risk_factors, len(years)),
+        "Predicted ESG Score": predicted_esg_scores.ravel(),
+    })
+    return frame_response(predictions, "predictions", {
+        **store_prediction_result(predictions),
+        "model": {
+            "fingerprint": fingerprint,
+            "backend": forecast_bundle.get("backend", "random_forest"),
+            "source": forecast_source,
+            "risk_model_source": model_source,
+            "lags": lags,
+            "train_seconds": forecast_bundle["train_seconds"],
+            "inference_ms": inference_ms,
+            "predict_calls": predict_calls,
+            "cache_hit_rate": model_store.stats()["hit_rate"]
+        }
+    }), 200
+
 @app.route('/allocate-budget', methods=['POST'])
 def allocate_budget():
-    """Allocate budget for projects based on predictions."""
+    """
+    Allocate budget for projects based on predictions.
+
+    The optional "strategy" selects the allocator: "knapsack" (exact, default),
+    "greedy" (risk-adjusted score per cost, skipping projects that do not fit)
+    or "fractional" (the last project may be funded partially).
+
+    "project_series" and "countries" take a name or a list of names. The
+    projects are the "predictions" posted with the request, or those of an
+    earlier /predict-esg call given by its "result_id".
+
+    With the knapsack strategy, "constraints" adds diversification limits:
+    max_country_share, max_series_share and max_pillar_share (largest share of
+    the budget per country, series or "Pillar" of the predictions),
+    max_average_risk, min_projects, and min_projects_per_country, _series and
+    _pillar. "time_limit_seconds" (at most ALLOCATION_TIME_LIMIT_SECONDS) and
+    "mip_gap" (in [0, 1)) bound the solve.
+    """
     try:
         data = request.json
         budget = data.get('budget')
-        project_series = data.get('project_series')
+        strategy = data.get('strategy', 'knapsack')
 
         if not isinstance(budget, (int, float)) or budget <= 0:
             raise ValueError("Invalid budget value. Must be a positive number.")
-        if not isinstance(project_series, str) or not project_series.strip():
+        if data.get('project_series') is None:
             raise ValueError("Invalid project_series value.")
-
-        predictions = data.get('predictions', [])
-        if not predictions:
-            raise ValueError("No predictions provided. Please run ESG predictions first.")
-
-        filtered_predictions = [p for p in predictions if p['Series Name'] == project_series or project_series == 'All Projects']
-        allocated_budget = allocate(filtered_predictions, budget)
+        filters = parse_filters(data)
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Invalid strategy. Must be one of {list(STRATEGIES)}.")
+        time_limit, gap = solve_bounds(data)
+
+        projects = filter_projects(*request_projects(data), filters)
+        constraints = allocation_constraints(projects, budget, data.get('constraints') or {})
+        if constraints and strategy != 'knapsack':
+            raise ValueError("Constraints are only supported by the knapsack strategy.")
+        allocated_budget = allocate(
+            projects, budget, strategy, constraints,
+            time_limit=time_limit, gap=gap
+        )
 
         return jsonify(allocated_budget), 200
+    except PredictionResultNotFound as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         logger.error(f"Error in /allocate-budget: {e}")
         return jsonify({"error": str(e)}), 400
 
-def allocate(predictions, budget):
-    """Allocate budget to projects based on ESG scores."""
-    # Ensure predictions contain the expected keys
-    for project in predictions:
-        project.setdefault('Series Name', 'Unknown')
-        project.setdefault('Cost', 0)
-        project.setdefault('Predicted ESG Score', 0)
-        project.setdefault('RiskFactor', 'Unknown')
-
-    sorted_predictions = sorted(predictions, key=lambda x: x['Predicted ESG Score'], reverse=True)
-    total_cost = 0
-    allocated_projects = []
-
-    for project in sorted_predictions:
-        project_cost = project.get('Cost', 0)
-        if total_cost + project_cost <= budget:
-            allocated_projects.append({
-                'Project': project['Series Name'],
-                'ESGScore': project['Predicted ESG Score'],
-                'Cost': project_cost,
-                'RiskFactor': project.get('RiskFactor', 'Unknown')
-            })
-            total_cost += project_cost
+def solve_bounds(data):
+    """
+    Return the MILP time limit and gap of an allocation request.
+
+    The configured time limit is a ceiling, so a request cannot hold a
+    handler thread longer than ALLOCATION_TIME_LIMIT_SECONDS.
+    """
+    ceiling = app.config['ALLOCATION_TIME_LIMIT_SECONDS']
+    time_limit = data.get('time_limit_seconds', ceiling)
+    gap = data.get('mip_gap', app.config['ALLOCATION_MIP_GAP'])
+    if not isinstance(time_limit, (int, float)) or isinstance(time_limit, bool) or not time_limit > 0:
+        raise ValueError("Invalid time_limit_seconds value. Must be a positive number.")
+    if not isinstance(gap, (int, float)) or isinstance(gap, bool) or not 0 <= gap < 1:
+        raise ValueError("Invalid mip_gap value. Must be a number in [0, 1).")
+    return min(float(time_limit), ceiling), float(gap) or None
+
+def request_projects(data):
+    """
+    Return the projects of an allocation request and their row index.
+
+    Raises:
+        PredictionResultNotFound: If the "result_id" is unknown or has expired.
+        ValueError: If neither a "result_id" nor "predictions" are given.
+    """
+    result_id = data.get('result_id')
+    if result_id is not None:
+        result = prediction_sessions.get(str(result_id))
+        if result is None:
+            raise PredictionResultNotFound(f"Prediction result not found or expired: {result_id}. Please run ESG predictions again.")
+        return result
+
+    predictions = data.get('predictions', [])
+    if not predictions:
+        raise ValueError("No predictions provided. Please run ESG predictions first.")
+    return indexed_projects(predictions_to_frame(predictions))
+
+def indexed_projects(projects):
+    """Pair projects with the series/country row index the allocation filters use."""
+    return projects, RowIndex.from_frame(projects, columns=['Series Name', 'Country Name'])
+
+def predictions_to_frame(predictions):
+    """Collect the allocation fields of prediction records, split columns/data or a frame into typed columns."""
+    columns = [
+        'Series Name', 'Country Name', 'Pillar', 'Cost', 'Predicted ESG Score', 'RiskFactor', 'SeriesName', 'CountryName'
+    ]
+    if isinstance(predictions, pd.DataFrame):
+        projects = predictions.reindex(columns=columns).reset_index(drop=True)
+    elif isinstance(predictions, dict):
+        # The "split" response format of /predict-esg
+        projects = pd.DataFrame(predictions.get('data', []), columns=predictions.get('columns')).reindex(columns=columns)
+    else:
+        projects = pd.DataFrame.from_records(predictions, columns=columns)
+    # Records straight from /predict-esg name the keys like the dataset columns
+    projects['Series Name'] = projects['Series Name'].fillna(projects.pop('SeriesName')).fillna('Unknown')
+    projects['Country Name'] = projects['Country Name'].fillna(projects.pop('CountryName')).fillna('Unknown')
+    projects['Cost'] = pd.to_numeric(projects['Cost'], errors='coerce').fillna(0)
+    projects['Predicted ESG Score'] = pd.to_numeric(projects['Predicted ESG Score'], errors='coerce').fillna(0)
+    # Risk may be reported as "Unknown"; such projects are not risk-adjusted
+    projects['Risk'] = pd.to_numeric(projects['RiskFactor'], errors='coerce').fillna(0)
+    projects['RiskFactor'] = projects['RiskFactor'].fillna('Unknown')
+    return projects
+
+def filter_projects(projects, row_index, filters):
+    """Select the projects of the filtered series and countries through their row index."""
+    rows = row_index.rows({
+        'Series Name': filters.get('SeriesName'),
+        'Country Name': filters.get('CountryName'),
+    })
+    return projects if rows is None else projects.take(rows)
+
+# Allocation request constraints: grouping -> projects column
+CONSTRAINT_GROUPS = {"country": "Country Name", "series": "Series Name", "pillar": "Pillar"}
+CONSTRAINT_OPTIONS = (
+    [f"max_{group}_share" for group in CONSTRAINT_GROUPS]
+    + [f"min_projects_per_{group}" for group in CONSTRAINT_GROUPS]
+    + ["max_average_risk", "min_projects"]
+)
+
+def allocation_constraints(projects, budget, options):
+    """Translate the "constraints" of an allocation request into solver constraints."""
+    if not isinstance(options, dict):
+        raise ValueError("Invalid constraints value. Must be an object.")
+    unknown = set(options) - set(CONSTRAINT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown constraints: {sorted(unknown)}. Expected some of {CONSTRAINT_OPTIONS}.")
+
+    max_share = {group: float(options[f"max_{group}_share"])
+                 for group in CONSTRAINT_GROUPS if options.get(f"max_{group}_share") is not None}
+    min_per_group = {group: int(options[f"min_projects_per_{group}"])
+                     for group in CONSTRAINT_GROUPS if options.get(f"min_projects_per_{group}")}
+    if any(not 0 < share <= 1 for share in max_share.values()):
+        raise ValueError("Share caps must be between 0 and 1.")
+
+    groups = {}
+    for group in set(max_share) | set(min_per_group):
+        labels = projects[CONSTRAINT_GROUPS[group]]
+        if labels.isna().all():
+            raise ValueError(f"The predictions have no '{CONSTRAINT_GROUPS[group]}' values for the {group} constraints.")
+        groups[group] = labels.fillna('Unknown').to_numpy()
+
+    max_average_risk = options.get("max_average_risk")
+    return portfolio_constraints(
+        projects['Cost'].to_numpy(dtype=np.float64),
+        budget,
+        risk=projects['Risk'].to_numpy(dtype=np.float64),
+        groups=groups,
+        max_share=max_share,
+        max_average_risk=float(max_average_risk) if max_average_risk is not None else None,
+        min_projects=int(options.get("min_projects") or 0),
+        min_per_group=min_per_group
+    )
+
+def allocate(projects, budget, strategy='knapsack', constraints=None, time_limit=None, gap=None):
+    """Allocate budget to projects by risk-adjusted ESG score with the given strategy."""
+    values, costs = allocation_arrays(projects)
+
+    solver = optimal = None
+    if strategy == 'fractional':
+        fractions = allocate_fractional(values, costs, budget)
+    else:
+        if strategy == 'greedy':
+            selected = allocate_greedy(values, costs, budget)
         else:
-            break
-
-    return {
-        "allocated_projects": allocated_projects,
+            if constraints:
+                # CBC already solves in its own process; staying in this one keeps the warm starts
+                result = solve_allocation(
+                    values, costs, budget, constraints=constraints, time_limit=time_limit, gap=gap, warm_start=True
+                )
+            else:
+                result = run_solver(solve_allocation, values, costs, budget)
+            selected, solver, optimal = result["selected"], result["solver"], result["optimal"]
+        fractions = selected.astype(np.float64)
+
+    response = allocation_response(projects, values, costs, fractions, budget, strategy, solver)
+    if optimal is not None:
+        response["optimal"] = optimal
+    return response
+
+def run_solver(solver, values, costs, *args, **kwargs):
+    """Run an allocation solver, in a worker process when the problem is large."""
+    if len(values) >= app.config['OFFLOAD_MIN_PROJECTS']:
+        return cpu_offload.run(solver, values, costs, *args, **kwargs)
+    return solver(values, costs, *args, **kwargs)
+
+def allocation_arrays(projects):
+    """Return the risk-adjusted values and the costs of the projects as arrays."""
+    scores = projects['Predicted ESG Score'].to_numpy(dtype=np.float64)
+    costs = projects['Cost'].to_numpy(dtype=np.float64)
+    return scores * (1 - projects['Risk'].to_numpy(dtype=np.float64)), costs
+
+def allocation_response(projects, values, costs, fractions, budget, strategy, solver=None):
+    """Format funded projects, ordered by ESG score, with the allocation totals."""
+    funded = fractions > 0
+    allocated = projects[funded].assign(Fraction=fractions[funded], Allocated=costs[funded] * fractions[funded])
+    allocated = allocated.sort_values('Predicted ESG Score', ascending=False, kind='stable')
+    allocated_projects = allocated.rename(columns={
+        'Series Name': 'Project',
+        'Predicted ESG Score': 'ESGScore'
+    })[['Project', 'ESGScore', 'Cost', 'RiskFactor'] + (['Fraction'] if strategy == 'fractional' else [])]
+    if strategy == 'fractional':
+        allocated_projects = allocated_projects.assign(Cost=allocated['Allocated'])
+
+    total_cost = float(allocated['Allocated'].sum())
+    response = {
+        "allocated_projects": allocated_projects.to_dict(orient="records"),
         "total_allocated": total_cost,
-        "remaining_budget": budget - total_cost
+        "remaining_budget": budget - total_cost,
+        "objective": float(np.dot(values, fractions)),
+        "strategy": strategy
     }
+    if solver is not None:
+        response["solver"] = solver
+    return response
+
+# Bounds of a batch request: the frontier is read at this many budgets per series
+MAX_FRONTIER_POINTS = 1000
+MAX_BATCH_SCENARIOS = 100
+
+@app.route('/allocate-budget/batch', methods=['POST'])
+def allocate_budget_batch():
+    """
+    Solve several budget/series scenarios over one prediction set.
+
+    Scenarios sharing a project series (or the same list of series, in any
+    order) are answered from a single knapsack DP table, which also yields
+    the efficient frontier of the risk-adjusted ESG score against the budget
+    for those series. Frontiers are keyed by the comma-separated series names.
+    The prediction set is the posted "predictions" or a "result_id" from
+    /predict-esg.
+    """
+    try:
+        data = request.json
+        scenarios = data.get('scenarios', [])
+        frontier_points = data.get('frontier_points', 50)
+        include_projects = data.get('include_projects', True)
+
+        if not isinstance(frontier_points, int) or isinstance(frontier_points, bool) \
+                or not 2 <= frontier_points <= MAX_FRONTIER_POINTS:
+            raise ValueError(f"Invalid frontier_points value. Must be an integer between 2 and {MAX_FRONTIER_POINTS}.")
+        if not isinstance(scenarios, list) or not scenarios:
+            raise ValueError("No scenarios provided.")
+        if len(scenarios) > MAX_BATCH_SCENARIOS:
+            raise ValueError(f"At most {MAX_BATCH_SCENARIOS} scenarios can be solved per request.")
+        for scenario in scenarios:
+            budget = scenario.get('budget')
+            if not isinstance(budget, (int, float)) or budget <= 0:
+                raise ValueError("Invalid budget value. Must be a positive number.")
+            scenario.setdefault('project_series', 'All Projects')
+
+        # Series lists are grouped independently of their order and duplicates
+        groups = {}
+        for i, scenario in enumerate(scenarios):
+            series = parse_filter(scenario['project_series'], 'project_series')
+            key = None if series is None else tuple(sorted(set(series)))
+            groups.setdefault(key, []).append(i)
+
+        projects, row_index = request_projects(data)
+
+        results = [None] * len(scenarios)
+        frontiers = {}
+        for series, indices in groups.items():
+            rows = row_index.rows({'Series Name': series})
+            series_projects = projects if rows is None else projects.take(rows)
+            values, costs = allocation_arrays(series_projects)
+            budgets = [scenarios[i]['budget'] for i in indices]
+            frontier_key = 'All Projects' if series is None else ', '.join(series)
+            solutions, frontiers[frontier_key] = run_solver(
+                solve_budget_sweep, values, costs, budgets, frontier_points=frontier_points
+            )
+
+            for i, budget, solution in zip(indices, budgets, solutions):
+                response = allocation_response(
+                    series_projects, values, costs, solution["selected"].astype(np.float64),
+                    budget, 'knapsack', solution["solver"]
+                )
+                if not include_projects:
+                    del response["allocated_projects"]
+                results[i] = {
+                    "budget": budget, "project_series": scenarios[i]['project_series'],
+                    "frontier": frontier_key, **response
+                }
+
+        return jsonify({"scenarios": results, "frontiers": frontiers}), 200
+    except PredictionResultNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error in /allocate-budget/batch: {e}")
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/datasets/<dataset_id>/export', methods=['GET'])
+def export_dataset(dataset_id):
+    """Export a preprocessed dataset as CSV."""
+    try:
+        csv_data = export_csv(dataset_registry.dataset_path(dataset_id))
+        return Response(
+            csv_data,
+            mimetype='text/csv',
+            headers={"Content-Disposition": f"attachment; filename=preprocessed_dataset_{dataset_id}.csv"}
+        )
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error in /datasets/{dataset_id}/export: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Report hit/miss counters of the in-memory caches."""
+    return jsonify({
+        "datasets": dataset_registry.stats(),
+        "models": model_store.stats(),
+        "uploads": upload_index.stats(),
+        "summaries": summarizer.stats(),
+        "cpu_offload": cpu_offload.stats(),
+        "prediction_sessions": prediction_sessions.stats()
+    }), 200
 
 @app.route('/summarize-esg-results', methods=['POST'])
 def summarize_esg_results():
-    """Summarize ESG results."""
+    """
+    Summarize ESG results.
+
+    With "mode": "hierarchical" texts longer than the model's 512-token window
+    are summarized chunk by chunk instead of being truncated.
+    """
     try:
         text_data = request.json.get('text', '')
+        if request.json.get('mode') == 'hierarchical':
+            summary, stats = summarize_long_esg_results(text_data)
+            return jsonify({"summary": summary, "stats": stats}), 200
         summary = summarize_and_analyze_esg_results(text_data)
         return jsonify({"summary": summary}), 200
     except Exception as e:
         logger.error(f"Error in /summarize-esg-results: {e}")
         return jsonify({"error": f"Failed to summarize ESG results: {str(e)}"}), 500
 
+@app.route('/classify-esg', methods=['POST'])
+def classify_esg():
+    """
+    Classify a list of texts with FinBERT-ESG.
+
+    Results are streamed as NDJSON, one line per text as its batch finishes,
+    each with the index of the text in the request. Set "stream": false to get
+    a single JSON list in input order instead.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        texts = data.get('texts')
+        batch_size = int(data.get('batch_size', 32))
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive.")
+        results = classify_esg_texts(texts, batch_size=batch_size)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in /classify-esg: {e}")
+        return jsonify({"error": f"Failed to classify texts: {str(e)}"}), 500
+
+    if data.get('stream', True):
+        def generate():
+            try:
+                for result in results:
+                    yield json.dumps(result) + "\n"
+            except Exception as e:
+                # Headers are already sent, so the error is reported as the last line
+                logger.error(f"Error in /classify-esg: {e}")
+                yield json.dumps({"error": f"Failed to classify texts: {str(e)}"}) + "\n"
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    try:
+        return jsonify({"results": sorted(results, key=lambda result: result["index"])}), 200
+    except Exception as e:
+        logger.error(f"Error in /classify-esg: {e}")
+        return jsonify({"error": f"Failed to classify texts: {str(e)}"}), 500
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Models load lazily on first use; set WARM_UP_MODELS=1 to load them before serving
+    if os.environ.get('WARM_UP_MODELS') == '1':
+        warm_up()
+    if app.config['SERVING_MODE'] == 'production':
+        serve(
+            app,
+            host=os.environ.get('HOST', '0.0.0.0'),
+            port=int(os.environ.get('PORT', 5000)),
+            threads=int(os.environ.get('SERVER_THREADS', DEFAULT_SERVER_THREADS))
+        )
+    else:
+        app.run(debug=True)
@@ -0,0 +1,49 @@
+"""
+Benchmark the allocation solvers against the PuLP/CBC MILP path.
+
+Run from the backend directory:
+    python -m benchmarks.bench_allocation --sizes 100 10000 100000
+"""
+import argparse
+import time
+import numpy as np
+from utils.allocation_engine import solve_allocation
+
+
+def make_projects(n, integer_costs=True, seed=42):
+    """Random ESG scores, risk factors and costs like the ones /predict-esg produces."""
+    rng = np.random.default_rng(seed)
+    scores = rng.uniform(50, 100, n)
+    risk = rng.uniform(0.1, 0.5, n)
+    costs = rng.integers(20, 81, n).astype(float) if integer_costs else rng.uniform(20, 80, n)
+    return scores, risk, costs
+
+
+def time_solver(solver, scores, risk, costs, budget):
+    start = time.perf_counter()
+    result = solve_allocation(scores, costs, budget, risk=risk, solver=solver)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--budget-share", type=float, default=0.1, help="Budget as a share of the total cost")
+    parser.add_argument("--skip-cbc-above", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'projects':>9} {'costs':>7} {'solver':>26} {'ms':>10} {'objective':>14} {'optimal':>8}")
+    for n in args.sizes:
+        for integer_costs in (True, False):
+            scores, risk, costs = make_projects(n, integer_costs)
+            budget = float(np.floor(costs.sum() * args.budget_share))
+            solvers = ["auto"] + (["milp"] if n <= args.skip_cbc_above else [])
+            for solver in solvers:
+                result, ms = time_solver(solver, scores, risk, costs, budget)
+                label = f"{solver} ({result['solver']})" if solver == "auto" else solver
+                print(f"{n:>9} {'int' if integer_costs else 'float':>7} {label:>26} {ms:>10.1f} "
+                      f"{result['objective']:>14.3f} {str(result['optimal']):>8}")
+
+
+if __name__ == "__main__":
+    main()
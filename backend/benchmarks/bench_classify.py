@@ -0,0 +1,47 @@
+"""
+Measure FinBERT-ESG classification throughput in texts per second on CPU.
+
+Run from the backend directory (downloads the model on first use):
+    python -m benchmarks.bench_classify --texts 2000 --batch-sizes 8 32 64
+"""
+import argparse
+import time
+import numpy as np
+from models.FinGreen_NLP import classify_esg, esg_bert
+
+WORDS = (
+    "emissions renewable energy governance board disclosure water usage diversity "
+    "supply chain labour rights carbon intensity audit committee community investment "
+    "waste recycling biodiversity remuneration shareholder climate risk"
+).split()
+
+
+def make_paragraphs(n, seed=42):
+    """Synthetic disclosure paragraphs with lengths between 10 and 300 words."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(10, 300, n)
+    return [" ".join(rng.choice(WORDS, length)) + "." for length in lengths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32, 64])
+    args = parser.parse_args()
+
+    texts = make_paragraphs(args.texts)
+    start = time.perf_counter()
+    esg_bert.get()
+    print(f"model load: {time.perf_counter() - start:.1f}s")
+
+    print(f"{'batch':>6} {'sorted':>7} {'seconds':>9} {'texts/s':>9}")
+    for batch_size in args.batch_sizes:
+        for sort_by_length in (False, True):
+            start = time.perf_counter()
+            count = sum(1 for _ in classify_esg(texts, batch_size=batch_size, sort_by_length=sort_by_length))
+            seconds = time.perf_counter() - start
+            print(f"{batch_size:>6} {str(sort_by_length):>7} {seconds:>9.2f} {count / seconds:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
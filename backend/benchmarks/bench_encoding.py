@@ -0,0 +1,83 @@
+"""
+Compare dense get_dummies features with the sparse and ordinal CategoricalEncoder.
+
+Run from the backend directory:
+    python -m benchmarks.bench_encoding --countries 100 --series 700 --years 10
+
+Reports the peak memory of building the feature matrix (traced with
+tracemalloc), its size, and the fit time of a small random forest on it.
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from utils.categorical_encoder import CategoricalEncoder
+from utils.data_processor import KEY_COLUMNS
+
+
+def make_long_frame(countries, series, years, seed=42):
+    """One row per (country, series, year), like the melted training data."""
+    rng = np.random.default_rng(seed)
+    keys = pd.MultiIndex.from_product(
+        [[f"Country {i}" for i in range(countries)], [f"Series {i}" for i in range(series)], range(years)],
+        names=KEY_COLUMNS + ["Year"]
+    ).to_frame(index=False)
+    keys[KEY_COLUMNS] = keys[KEY_COLUMNS].astype("category")
+    keys["Value"] = rng.uniform(0, 100, len(keys)).astype(np.float32)
+    return keys
+
+
+def encode_dense(frame):
+    return pd.get_dummies(frame[KEY_COLUMNS], columns=KEY_COLUMNS)
+
+
+def encode_sparse(frame):
+    return CategoricalEncoder(KEY_COLUMNS).fit_transform(frame)
+
+
+def encode_ordinal(frame):
+    return CategoricalEncoder(KEY_COLUMNS, mode="ordinal").fit_transform(frame)
+
+
+def matrix_bytes(matrix):
+    if isinstance(matrix, pd.DataFrame):
+        return int(matrix.memory_usage(index=False).sum())
+    if hasattr(matrix, "indptr"):
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return matrix.nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--countries", type=int, default=100)
+    parser.add_argument("--series", type=int, default=700)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--estimators", type=int, default=10)
+    parser.add_argument("--skip-fit", action="store_true")
+    args = parser.parse_args()
+
+    frame = make_long_frame(args.countries, args.series, args.years)
+    y = frame["Value"].to_numpy()
+    print(f"{len(frame)} rows, {args.countries + args.series} one-hot columns")
+    print(f"{'encoding':>9} {'encode s':>9} {'peak MB':>9} {'matrix MB':>10} {'fit s':>8}")
+
+    for name, encode in (("dense", encode_dense), ("sparse", encode_sparse), ("ordinal", encode_ordinal)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        X = encode(frame)
+        encode_seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        fit_seconds = float("nan")
+        if not args.skip_fit:
+            start = time.perf_counter()
+            RandomForestRegressor(n_estimators=args.estimators, max_depth=12, random_state=42, n_jobs=-1).fit(X, y)
+            fit_seconds = time.perf_counter() - start
+        print(f"{name:>9} {encode_seconds:>9.2f} {peak / 2**20:>9.1f} {matrix_bytes(X) / 2**20:>10.1f} {fit_seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
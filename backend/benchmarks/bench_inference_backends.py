@@ -0,0 +1,99 @@
+"""
+Compare inference backends on summary quality, label agreement, latency and RSS.
+
+Run from the backend directory (exports the ONNX models on first use):
+    python -m benchmarks.bench_inference_backends --backends native onnx onnx-int8
+
+Each backend runs in its own interpreter so load time and peak RSS are not
+mixed up. Summaries are compared with the first backend's by token-overlap
+F1, classifications by the share of identical labels.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+from benchmarks.bench_classify import make_paragraphs
+
+
+def run_backend(texts, summary_texts):
+    """Summarize and classify with the backend configured in the environment."""
+    from utils.ai_integration import generate_summaries, t5
+    from models.FinGreen_NLP import classify_esg, esg_bert
+
+    start = time.perf_counter()
+    t5.get()
+    esg_bert.get()
+    load_seconds = time.perf_counter() - start
+
+    summary_ms, summaries = [], []
+    for text in summary_texts:
+        start = time.perf_counter()
+        summaries.extend(generate_summaries([text]))
+        summary_ms.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    results = sorted(classify_esg(texts), key=lambda result: result["index"])
+    classify_seconds = time.perf_counter() - start
+
+    return {
+        "load_seconds": load_seconds,
+        "summary_ms_p50": float(np.percentile(summary_ms, 50)),
+        "summary_ms_p99": float(np.percentile(summary_ms, 99)),
+        "texts_per_second": len(texts) / classify_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "summaries": summaries,
+        "labels": [result["label"] for result in results],
+    }
+
+
+def token_f1(candidate, reference):
+    """Token-overlap F1 between two summaries."""
+    candidate, reference = candidate.lower().split(), reference.lower().split()
+    common = sum(min(candidate.count(token), reference.count(token)) for token in set(candidate))
+    if not common:
+        return 0.0
+    precision, recall = common / len(candidate), common / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", nargs="+", default=["native", "onnx", "onnx-int8"])
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--summaries", type=int, default=20)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    texts = make_paragraphs(args.texts)
+    summary_texts = make_paragraphs(args.summaries, seed=7)
+    if args.worker:
+        print(json.dumps(run_backend(texts, summary_texts)))
+        return
+
+    results = {}
+    for backend in args.backends:
+        env = {**os.environ, "SUMMARY_INFERENCE_BACKEND": backend, "CLASSIFY_INFERENCE_BACKEND": backend}
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_inference_backends", "--worker", backend,
+             "--texts", str(args.texts), "--summaries", str(args.summaries)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        results[backend] = json.loads(output)
+
+    reference = results[args.backends[0]]
+    print(f"{'backend':>10} {'load s':>7} {'sum p50':>8} {'sum p99':>8} {'texts/s':>8} "
+          f"{'RSS MB':>7} {'sum F1':>7} {'labels':>7}")
+    for backend, result in results.items():
+        f1 = np.mean([token_f1(s, r) for s, r in zip(result["summaries"], reference["summaries"])])
+        agreement = np.mean([a == b for a, b in zip(result["labels"], reference["labels"])])
+        print(f"{backend:>10} {result['load_seconds']:>7.1f} {result['summary_ms_p50']:>8.0f} "
+              f"{result['summary_ms_p99']:>8.0f} {result['texts_per_second']:>8.1f} "
+              f"{result['peak_rss_mb']:>7.0f} {f1:>7.3f} {agreement:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare the ESG model backends on fit time, predict latency, model size and error.
+
+Run from the backend directory:
+    python -m benchmarks.bench_model_backends --countries 200 --series 300 --years 10
+
+The synthetic dataset has country and series effects plus noise, so the
+error is measured against a learnable target. Cells are split 80/20 at
+random; latency is the time to predict 10k rows in one call.
+"""
+import argparse
+import io
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from models.esg_model import (
+    prepare_training_data, train_model, categorical_feature_mask, MODEL_BACKENDS, BACKEND_ENCODINGS
+)
+
+LATENCY_ROWS = 10_000
+
+
+def make_dataset(countries, series, years, seed=42):
+    """A preprocessed dataset whose values depend on country, series and year."""
+    rng = np.random.default_rng(seed)
+    country_effect = rng.normal(0, 10, countries)
+    series_effect = rng.normal(50, 15, series)
+    country = np.repeat(np.arange(countries), series)
+    series_codes = np.tile(np.arange(series), countries)
+    dataset = pd.DataFrame({
+        "CountryName": pd.Categorical([f"Country {i}" for i in country]),
+        "SeriesName": pd.Categorical([f"Series {i}" for i in series_codes]),
+        "Cost": rng.integers(20, 81, len(country)),
+        "RiskFactor": rng.uniform(0.1, 0.5, len(country)).astype(np.float32),
+    })
+    for i, year in enumerate(range(2020 - years, 2020)):
+        trend = 0.5 * i
+        dataset[f"YR{year}"] = (country_effect[country] + series_effect[series_codes] + trend
+                                + rng.normal(0, 3, len(country))).astype(np.float32)
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--countries", type=int, default=100)
+    parser.add_argument("--series", type=int, default=200)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", choices=MODEL_BACKENDS, default=list(MODEL_BACKENDS))
+    parser.add_argument("--n-jobs", type=int, default=None, help="Forest fit threads")
+    args = parser.parse_args()
+
+    dataset = make_dataset(args.countries, args.series, args.years)
+    rng = np.random.default_rng(0)
+
+    print(f"{'backend':>23} {'train rows':>10} {'fit s':>8} {'ms/10k':>8} {'size MB':>8} {'rmse':>8} {'mae':>8}")
+    for backend in args.backends:
+        X, y, _, _, encoder = prepare_training_data(dataset, encoding=BACKEND_ENCODINGS[backend])
+        test = rng.random(X.shape[0]) < 0.2
+        train_rows, test_rows = np.flatnonzero(~test), np.flatnonzero(test)
+        options = {"categorical_features": categorical_feature_mask(encoder)} if backend == "hist_gradient_boosting" else {}
+
+        start = time.perf_counter()
+        model = train_model(X[train_rows], y[train_rows], args.n_jobs, backend=backend, **options)
+        fit_seconds = time.perf_counter() - start
+
+        predicted = model.predict(X[test_rows])
+        request = X[test_rows[np.arange(LATENCY_ROWS) % len(test_rows)]]
+        latency_ms = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            model.predict(request)
+            latency_ms = min(latency_ms, (time.perf_counter() - start) * 1000)
+
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        print(f"{backend:>23} {len(train_rows):>10} {fit_seconds:>8.2f} {latency_ms:>8.1f} "
+              f"{buffer.tell() / 1e6:>8.1f} {np.sqrt(mean_squared_error(y[test_rows], predicted)):>8.3f} "
+              f"{mean_absolute_error(y[test_rows], predicted):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark preprocess_dataset on synthetic World Bank style input.
+
+Run from the backend directory:
+    python -m benchmarks.bench_preprocess --rows 1000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from utils.data_processor import preprocess_dataset
+
+YEARS = range(2004, 2024)
+
+
+def make_world_bank_frame(rows, countries=200, series=1400, seed=42):
+    """
+    Build a raw World Bank export with ".." gaps and some all-zero rows.
+
+    Args:
+        rows (int): Number of rows to generate.
+        countries (int): Number of distinct countries.
+        series (int): Number of distinct series.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: Raw dataset with World Bank column headers.
+    """
+    rng = np.random.default_rng(seed)
+    country_ids = rng.integers(0, countries, size=rows)
+    series_ids = rng.integers(0, series, size=rows)
+    values = rng.normal(50, 20, size=(rows, len(YEARS))).round(3)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[rng.random(rows) < 0.01] = 0
+
+    frame = pd.DataFrame(values, columns=[f"{year} [YR{year}]" for year in YEARS])
+    # Mimic the ".." placeholders of the World Bank exports in a few columns
+    for col in frame.columns[:3]:
+        frame[col] = frame[col].astype(object).where(frame[col].notna(), "..")
+    frame.insert(0, "Country Name", pd.Series(country_ids).map(lambda i: f"Country {i}"))
+    frame.insert(1, "Country Code", pd.Series(country_ids).map(lambda i: f"C{i:03d}"))
+    frame.insert(2, "Series Name", pd.Series(series_ids).map(lambda i: f"Series {i}"))
+    frame.insert(3, "Series Code", pd.Series(series_ids).map(lambda i: f"S.{i:04d}"))
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frame = make_world_bank_frame(args.rows)
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        preprocessed, _ = preprocess_dataset(frame)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"rows: {args.rows}, kept: {len(preprocessed)}")
+    print(f"best of {args.repeat}: {best:.3f}s ({args.rows / best:,.0f} rows/sec)")
+    print(f"memory: {preprocessed.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare payload size and serialization time of the /predict-esg response formats.
+
+Run from the backend directory:
+    python -m benchmarks.bench_response_formats --rows 1000 20000 --countries 200 --series 100
+
+"records+onehot" is the former payload, where every row also carried one
+column per country and series; the other formats are the ones negotiated
+through the Accept and Accept-Encoding headers.
+"""
+import argparse
+import gzip
+import json
+import time
+import numpy as np
+import pandas as pd
+from utils.response_formats import encode_frame, decode_frame, compress, pa, zstandard
+
+
+def make_predictions(rows, countries, series, seed=42):
+    """Prediction rows like the ones /predict-esg returns."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "CountryName": np.array([f"Country {i}" for i in range(countries)])[rng.integers(0, countries, rows)],
+        "SeriesName": np.array([f"Series indicator {i}" for i in range(series)])[rng.integers(0, series, rows)],
+        "YR2020": rng.uniform(0, 100, rows),
+        "Cost": rng.integers(20, 81, rows),
+        "RiskFactor": rng.uniform(0.1, 0.5, rows),
+        "Predicted ESG Score": rng.uniform(50, 100, rows),
+    })
+
+
+def timed(fn, repeat):
+    """Return the result of fn and its best time over repeat runs in ms."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 20000])
+    parser.add_argument("--countries", type=int, default=200)
+    parser.add_argument("--series", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    formats = ["records", "split"] + (["arrow"] if pa is not None else [])
+    encodings = [None, "gzip"] + (["zstd"] if zstandard is not None else [])
+    metadata = {"model": {"fingerprint": "0" * 64, "source": "memory"}}
+
+    print(f"{'rows':>7} {'format':>15} {'encoding':>9} {'bytes':>12} {'encode ms':>10} {'decode ms':>10}")
+    for rows in args.rows:
+        frame = make_predictions(rows, args.countries, args.series)
+
+        one_hot = pd.get_dummies(frame[["CountryName", "SeriesName"]], dtype=np.uint8)
+        legacy = pd.concat([frame, one_hot], axis=1)
+        body, ms = timed(lambda: json.dumps({"predictions": legacy.to_dict(orient="records"), **metadata}).encode(), args.repeat)
+        print(f"{rows:>7} {'records+onehot':>15} {'-':>9} {len(body):>12,} {ms:>10.1f} {'-':>10}")
+
+        for fmt in formats:
+            for encoding in encodings:
+                def encode():
+                    return compress(encode_frame(frame, fmt, "predictions", metadata), encoding)[0]
+
+                def decode():
+                    data = body
+                    if encoding == "gzip":
+                        data = gzip.decompress(data)
+                    elif encoding == "zstd":
+                        data = zstandard.ZstdDecompressor().decompress(data)
+                    return decode_frame(data, fmt, "predictions")
+
+                body, encode_ms = timed(encode, args.repeat)
+                _, decode_ms = timed(decode, args.repeat)
+                print(f"{rows:>7} {fmt:>15} {encoding or '-':>9} {len(body):>12,} {encode_ms:>10.1f} {decode_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
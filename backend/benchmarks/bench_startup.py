@@ -0,0 +1,61 @@
+"""
+Measure how long importing the Flask app takes, optionally against a budget.
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup --runs 5
+
+Exits with status 1 if the median import time exceeds the budget or if
+importing the app pulled in a heavy ML framework.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("transformers", "tensorflow", "torch")
+# Median import time the app must stay under, asserted in tests/test_startup.py
+IMPORT_BUDGET_SECONDS = 5.0
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+app.training_jobs.shutdown()
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(runs):
+    """Import the app in fresh interpreters and return the timings and heavy modules seen."""
+    timings, heavy = [], set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        timings.append(result["seconds"])
+        heavy.update(result["heavy"])
+    return timings, sorted(heavy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="Maximum median import time in seconds")
+    args = parser.parse_args()
+
+    timings, heavy = measure_import(args.runs)
+    median = statistics.median(timings)
+    print(f"import app: median {median:.2f}s, min {min(timings):.2f}s, max {max(timings):.2f}s over {args.runs} runs")
+    print(f"heavy modules imported: {', '.join(heavy) or 'none'}")
+
+    within = median <= args.budget
+    print(f"budget {args.budget:.2f}s: {'ok' if within else 'exceeded'}")
+    failed = bool(heavy) or not within
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Load-test a running backend and report throughput and tail latency per endpoint.
+
+Start the server, e.g. in production mode, and run from the backend directory:
+    SERVING_MODE=production python app.py
+    python -m benchmarks.load_test --dataset data.csv --concurrency 32 --duration 15
+
+Each endpoint is driven for --duration seconds by --concurrency asyncio
+clients, each holding one keep-alive HTTP/1.1 connection. --dataset uploads a
+CSV first; otherwise the latest uploaded dataset is used.
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+import numpy as np
+
+ENDPOINTS = {
+    "project-series": ("GET", "/project-series", None),
+    "predict-esg": ("POST", "/predict-esg", {}),
+    "forecast": ("POST", "/predict-esg", {"years": {"start": 2021, "end": 2025}, "lags": 2}),
+    "allocate-budget": ("POST", "/allocate-budget", None),
+    "cache-stats": ("GET", "/cache-stats", None),
+}
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 connection; reconnects when the server closes it."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b"", content_type="application/json"):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode() + body)
+        try:
+            status, headers, payload = await self._read_response()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            raise
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, payload
+
+    async def _read_response(self):
+        status = int((await self.reader.readuntil(b"\r\n")).split()[1])
+        headers = {}
+        while (line := await self.reader.readuntil(b"\r\n")) != b"\r\n":
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            payload = await self.reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            parts = []
+            while size := int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16):
+                parts.append(await self.reader.readexactly(size))
+                await self.reader.readuntil(b"\r\n")
+            await self.reader.readuntil(b"\r\n")
+            payload = b"".join(parts)
+        else:
+            payload = await self.reader.read()
+            headers["connection"] = "close"
+        return status, headers, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def drive(connection, method, path, body, deadline, latencies, errors):
+    """Send requests back to back on one connection until the deadline."""
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            status, _ = await connection.request(method, path, body)
+        except (OSError, asyncio.IncompleteReadError):
+            errors.append("connection")
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        if status >= 400:
+            errors.append(status)
+    connection.close()
+
+
+async def run_endpoint(host, port, method, path, body, concurrency, duration):
+    """Drive one endpoint with concurrent clients and summarize the latencies."""
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        drive(Connection(host, port), method, path, body, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)) if latencies else 0.0,
+        "p95_ms": float(np.percentile(latencies, 95)) if latencies else 0.0,
+        "p99_ms": float(np.percentile(latencies, 99)) if latencies else 0.0,
+        "max_ms": max(latencies, default=0.0),
+    }
+
+
+async def prepare(host, port, dataset, budget):
+    """Upload the dataset if given and build the /allocate-budget payload from one prediction."""
+    connection = Connection(host, port)
+    if dataset:
+        with open(dataset, "rb") as handle:
+            status, payload = await connection.request("POST", "/upload-dataset", handle.read(), "text/csv")
+        if status != 200:
+            raise RuntimeError(f"Upload failed ({status}): {payload[:200]!r}")
+    status, payload = await connection.request("POST", "/predict-esg", b"{}")
+    connection.close()
+    if status != 200:
+        raise RuntimeError(f"Prediction failed ({status}): {payload[:200]!r}")
+    predictions = json.loads(payload)["predictions"]
+    return {"budget": budget, "project_series": "All Projects", "predictions": predictions}
+
+
+async def main_async(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    allocation_payload = await prepare(host, port, args.dataset, args.budget)
+
+    print(f"{'endpoint':>16} {'requests':>9} {'errors':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for name in args.endpoints:
+        method, path, payload = ENDPOINTS[name]
+        if name == "allocate-budget":
+            payload = allocation_payload
+        body = json.dumps(payload).encode() if payload is not None else b""
+        result = await run_endpoint(host, port, method, path, body, args.concurrency, args.duration)
+        print(f"{name:>16} {result['requests']:>9} {result['errors']:>7} {result['rps']:>8.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['max_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--dataset", help="CSV file to upload before the test")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per endpoint")
+    parser.add_argument("--budget", type=float, default=500.0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Cross-validate and tune the ESG regressors, reporting accuracy against fit and predict time.
+
+Run from the backend directory on an uploaded (raw CSV) or preprocessed dataset:
+    python -m benchmarks.tune_models uploads/uploaded_dataset_<id>.csv --cv time --iter 10 --slo-ms 50
+
+Every model is evaluated with its default parameters and --iter random
+samples of its search space (see utils.model_evaluation.MODEL_SPACES). The
+report is sorted by RMSE; the --finalists best are re-timed one at a time
+after the parallel rounds, and --slo-ms picks the most accurate of them whose
+prediction of a --latency-rows request meets the latency SLO.
+"""
+import argparse
+import json
+import logging
+from utils.data_processor import preprocess_csv
+from utils.dataset_store import load_dataset
+from utils.model_evaluation import evaluate_models, best_within_slo, MODEL_SPACES, CV_METHODS, DEFAULT_FINALISTS
+
+
+def load(path):
+    """Load a raw CSV upload or a preprocessed dataset file."""
+    if path.endswith(".csv") and not path.rsplit("/", 1)[-1].startswith("preprocessed_"):
+        return preprocess_csv(path)[0]
+    return load_dataset(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("dataset", help="Raw CSV upload or preprocessed dataset file")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_SPACES), default=list(MODEL_SPACES))
+    parser.add_argument("--iter", type=int, default=10, help="Random candidates per model")
+    parser.add_argument("--cv", choices=CV_METHODS, default="kfold")
+    parser.add_argument("--splits", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel worker processes, -1 for all cores")
+    parser.add_argument("--latency-rows", type=int, default=1000, help="Rows of one simulated prediction request")
+    parser.add_argument("--slo-ms", type=float, help="Latency SLO for predicting one request")
+    parser.add_argument("--time-budget", type=float, help="Stop starting new candidates after this many seconds")
+    parser.add_argument("--finalists", type=int, default=DEFAULT_FINALISTS,
+                        help="Best candidates re-timed serially; only these are eligible for --slo-ms")
+    parser.add_argument("--report", help="Write the full report as JSON to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    results = evaluate_models(
+        load(args.dataset), models=args.models, n_iter=args.iter, cv=args.cv, n_splits=args.splits,
+        n_jobs=args.jobs, latency_rows=args.latency_rows, time_budget=args.time_budget, finalists=args.finalists
+    )
+    results.sort(key=lambda result: result["rmse"])
+
+    print(f"{'model':>22} {'rmse':>9} {'± std':>8} {'r2':>7} {'mae':>9} {'fit s':>7} "
+          f"{'us/row':>7} {'req ms':>7} {'timing':>8}  params")
+    for result in results:
+        print(f"{result['model']:>22} {result['rmse']:>9.4f} {result['rmse_std']:>8.4f} {result['r2']:>7.3f} "
+              f"{result['mae']:>9.4f} {result['fit_seconds']:>7.2f} {result['predict_us_per_row']:>7.2f} "
+              f"{result['latency_ms']:>7.1f} {result['timing']:>8}  {json.dumps(result['params'])}")
+
+    best = best_within_slo(results, args.slo_ms)
+    slo = f" within {args.slo_ms:g} ms" if args.slo_ms is not None else ""
+    if best is None:
+        print(f"\nNo candidate predicts {args.latency_rows} rows{slo}.")
+    else:
+        print(f"\nBest{slo}: {best['model']} {json.dumps(best['params'])} (rmse {best['rmse']:.4f}, "
+              f"{best['latency_ms']:.1f} ms per {args.latency_rows} rows)")
+
+    if args.report:
+        with open(args.report, "w") as handle:
+            json.dump({"settings": vars(args), "best": best, "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,149 +1,192 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import os
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
-from pulp import LpProblem, LpMaximize, LpVariable, lpSum
-from transformers import AutoTokenizer, TFAutoModelForSequenceClassification
-from transformers import T5Tokenizer, T5ForConditionalGeneration
-from utils.data_processor import load_and_preprocess_data
-import warnings
-warnings.filterwarnings('ignore')
-
-# Adjust Pandas display settings
-pd.set_option('display.max_rows', None)
-pd.set_option('display.max_columns', None)
-pd.set_option('display.width', None)
-
-# Load the dataset
-file_path = r"D:\ESG_REAL20_with_costs.csv"  # Update the relative path if necessary
-data = pd.read_csv(file_path)
-
-# Preprocessing: Melt the dataset to long format
-year_columns = [col for col in data.columns if '[YR' in col]
-time_series_data = data.melt(
-    id_vars=['Country Name', 'Country Code', 'Series Name', 'Series Code'],
-    value_vars=year_columns,
-    var_name='Year',
-    value_name='Value'
-)
-time_series_data['Year'] = time_series_data['Year'].str.extract(r'\[YR(\d+)\]').astype(int)
-time_series_data.dropna(subset=['Value'], inplace=True)
-
-# Pivot data to wide format for machine learning
-pivot_data = time_series_data.pivot_table(
-    index=['Country Name', 'Series Name', 'Year'],
-    values='Value'
-).reset_index()
-
-# One-hot encode categorical features
-pivot_data_encoded = pd.get_dummies(pivot_data, columns=['Country Name', 'Series Name'])
-
-# Prepare data for ESG score prediction
-X = pivot_data_encoded[pivot_data_encoded['Year'] < 2020].drop(columns=['Value', 'Year'])
-y = pivot_data_encoded[pivot_data_encoded['Year'] < 2020]['Value']
-X_future = pivot_data_encoded[pivot_data_encoded['Year'] >= 2020].drop(columns=['Value', 'Year'])
-future_years = pivot_data[pivot_data['Year'] >= 2020][['Country Name', 'Series Name', 'Year']]
-
-# Train-Test Split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Train ESG Prediction Model
-rf_model_esg = RandomForestRegressor(random_state=42)
-rf_model_esg.fit(X_train, y_train)
-
-# Predict ESG Scores for future years
-predicted_scores = rf_model_esg.predict(X_future)
-
-# Convert NumPy array to DataFrame
-predicted_scores_df = pd.DataFrame(predicted_scores, columns=["Predicted ESG Score"])
-future_years = pd.concat([future_years.reset_index(drop=True), predicted_scores_df], axis=1)
-
-# Add hypothetical project costs
-future_years['Project Cost'] = np.random.randint(50, 200, size=len(future_years))
-
-# Train Risk Factor Prediction Model
-pivot_data_encoded['Risk Factor'] = np.random.uniform(0.1, 0.5, size=len(pivot_data_encoded))
-risk_X = pivot_data_encoded[pivot_data_encoded['Year'] < 2020].drop(columns=['Value', 'Year', 'Risk Factor'])
-risk_y = pivot_data_encoded[pivot_data_encoded['Year'] < 2020]['Risk Factor']
-risk_X_future = pivot_data_encoded[pivot_data_encoded['Year'] >= 2020].drop(columns=['Value', 'Year', 'Risk Factor'])
-
-# Train-Test Split for Risk Factor
-risk_X_train, risk_X_test, risk_y_train, risk_y_test = train_test_split(risk_X, risk_y, test_size=0.2, random_state=42)
-
-# Train Risk Prediction Model
-rf_model_risk = RandomForestRegressor(random_state=42)
-rf_model_risk.fit(risk_X_train, risk_y_train)
-
-# Predict Risk Factors for future years
-predicted_risks = rf_model_risk.predict(risk_X_future)
-future_years['Risk Factor'] = predicted_risks
-
-# Function for MILP Allocation
-def allocate_budget_milp(budget, project_series="All Projects"):
+from models.esg_model import load_and_preprocess_data
+from utils.allocation_engine import solve_allocation
+from utils.lazy_loader import LazyResource
+from utils.hierarchical_summary import project_result_texts, summarize_hierarchical
+from utils.esg_classifier import classify_texts, CLASSIFY_BATCH_SIZE
+from utils.inference_backend import backend_for, load_onnx_model, input_tensor_type
+
+# Dataset used to train the standalone pipeline; nothing is read until first use
+DATASET_PATH = os.environ.get("FINGREEN_DATASET_PATH", r"D:\ESG_REAL20_with_costs.csv")
+ESG_BERT_MODEL = "yiyanghkust/finbert-esg"
+T5_MODEL = "t5-small"
+
+
+def build_pipeline(file_path=DATASET_PATH):
+    """
+    Train the ESG score and risk models on a raw World Bank dataset.
+
+    Args:
+        file_path (str): Path to the dataset.
+
+    Returns:
+        dict: Trained models, their feature columns and the future-year
+            projects with predicted ESG scores, risk factors and costs.
+    """
+    # Preprocessing: melt, pivot and one-hot encode the dataset
+    pivot_data, pivot_data_encoded = load_and_preprocess_data(file_path)
+
+    # Prepare data for ESG score prediction
+    X = pivot_data_encoded[pivot_data_encoded['Year'] < 2020].drop(columns=['Value', 'Year'])
+    y = pivot_data_encoded[pivot_data_encoded['Year'] < 2020]['Value']
+    X_future = pivot_data_encoded[pivot_data_encoded['Year'] >= 2020].drop(columns=['Value', 'Year'])
+    future_years = pivot_data[pivot_data['Year'] >= 2020][['Country Name', 'Series Name', 'Year']]
+
+    # Train-Test Split
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Train ESG Prediction Model
+    rf_model_esg = RandomForestRegressor(random_state=42)
+    rf_model_esg.fit(X_train, y_train)
+
+    # Predict ESG Scores for future years
+    predicted_scores_df = pd.DataFrame(rf_model_esg.predict(X_future), columns=["Predicted ESG Score"])
+    future_years = pd.concat([future_years.reset_index(drop=True), predicted_scores_df], axis=1)
+
+    # Add hypothetical project costs
+    future_years['Project Cost'] = np.random.randint(50, 200, size=len(future_years))
+
+    # Train Risk Factor Prediction Model
+    risk_y = pd.Series(np.random.uniform(0.1, 0.5, size=len(X)), index=X.index)
+    risk_X_train, risk_X_test, risk_y_train, risk_y_test = train_test_split(X, risk_y, test_size=0.2, random_state=42)
+    rf_model_risk = RandomForestRegressor(random_state=42)
+    rf_model_risk.fit(risk_X_train, risk_y_train)
+
+    # Predict Risk Factors for future years
+    future_years['Risk Factor'] = rf_model_risk.predict(X_future)
+
+    return {
+        "esg_model": rf_model_esg,
+        "risk_model": rf_model_risk,
+        "feature_columns": list(X.columns),
+        "future_years": future_years,
+    }
+
+
+def _load_esg_bert():
+    backend = backend_for("classify")
+    if backend != "native":
+        return load_onnx_model(ESG_BERT_MODEL, "sequence-classification", quantized=backend == "onnx-int8")
+    from transformers import AutoTokenizer, TFAutoModelForSequenceClassification
+    tokenizer = AutoTokenizer.from_pretrained(ESG_BERT_MODEL)
+    model = TFAutoModelForSequenceClassification.from_pretrained(ESG_BERT_MODEL, from_pt=True)
+    return tokenizer, model
+
+
+def _load_t5():
+    backend = backend_for("summary")
+    if backend != "native":
+        return load_onnx_model(T5_MODEL, "seq2seq", quantized=backend == "onnx-int8")
+    from transformers import T5Tokenizer, T5ForConditionalGeneration
+    return T5Tokenizer.from_pretrained(T5_MODEL), T5ForConditionalGeneration.from_pretrained(T5_MODEL)
+
+
+# Trained pipeline and transformer models, created on first use or by warm_up()
+pipeline = LazyResource("FinGreen ESG pipeline", build_pipeline)
+esg_bert = LazyResource("FinBERT-ESG", _load_esg_bert)
+t5 = LazyResource("T5 summarizer (PyTorch)", _load_t5)
+
+
+def warm_up(train_pipeline=True, load_nlp=True):
+    """Load the trained pipeline and/or transformer models ahead of the first request."""
+    if train_pipeline:
+        pipeline.get()
+    if load_nlp:
+        esg_bert.get()
+        t5.get()
+
+
+def predicted_scores(X):
+    """Predict ESG scores for one-hot encoded projects with the pipeline's model."""
+    state = pipeline.get()
+    X = X.reindex(columns=state["feature_columns"], fill_value=False)
+    return state["esg_model"].predict(X)
+
+
+# Function for Budget Allocation (exact knapsack, see utils.allocation_engine)
+def allocate_budget_milp(budget, project_series="All Projects", future_years=None):
+    if future_years is None:
+        future_years = pipeline.get()["future_years"]
+
     if project_series != "All Projects":
         future_years_filtered = future_years[future_years['Series Name'] == project_series]
     else:
         future_years_filtered = future_years.copy()
 
-    problem = LpProblem("ESG_Optimization", LpMaximize)
+    result = solve_allocation(
+        future_years_filtered['Predicted ESG Score'].to_numpy(),
+        future_years_filtered['Project Cost'].to_numpy(),
+        budget,
+        risk=future_years_filtered['Risk Factor'].to_numpy()
+    )
 
-    projects = list(future_years_filtered.index)
-    allocations = LpVariable.dicts("Allocation", projects, 0, 1, cat='Binary')
+    allocated_allocation = future_years_filtered[result["selected"]].copy()
+    allocated_allocation['Allocated Cost'] = allocated_allocation['Project Cost']
+    return allocated_allocation
 
-    problem += lpSum([
-        future_years_filtered.loc[i, 'Predicted ESG Score'] * (1 - future_years_filtered.loc[i, 'Risk Factor']) * allocations[i]
-        for i in projects
-    ])
-    problem += lpSum([
-        future_years_filtered.loc[i, 'Project Cost'] * allocations[i]
-        for i in projects
-    ]) <= budget
+def analyze_with_esg_bert(text):
+    result = next(classify_esg([text]))
+    return result["label"], np.array(list(result["scores"].values()))
 
-    problem.solve()
+def classify_esg(texts, batch_size=CLASSIFY_BATCH_SIZE, sort_by_length=True):
+    """
+    Tag texts with FinBERT-ESG in length-sorted batches.
 
-    allocated_projects = []
-    for i in projects:
-        if allocations[i].varValue == 1:
-            allocated_projects.append(i)
+    Yields one dict per text (index, label, scores) as each batch finishes;
+    see utils.esg_classifier.classify_texts.
+    """
+    esg_bert_tokenizer, esg_bert_model = esg_bert.get()
+    return classify_texts(texts, esg_bert_tokenizer, esg_bert_model, batch_size=batch_size, sort_by_length=sort_by_length)
 
-    allocated_allocation = future_years_filtered.loc[allocated_projects].copy()
-    allocated_allocation['Allocated Cost'] = allocated_allocation['Project Cost']
-    return allocated_allocation
+def summarize_results_with_t5(text):
+    return summarize_batch_with_t5([text])[0]
+
+def summarize_batch_with_t5(texts, max_length=150, min_length=40):
+    """Summarize several texts with one padded beam-search generate call."""
+    t5_tokenizer, t5_model = t5.get()
+    inputs = t5_tokenizer(["summarize: " + text for text in texts], return_tensors=input_tensor_type(t5_model), padding=True, max_length=512, truncation=True)
+    summary_ids = t5_model.generate(
+        inputs["input_ids"], attention_mask=inputs["attention_mask"],
+        max_length=max_length, min_length=min_length, length_penalty=2.0, num_beams=4, early_stopping=True
+    )
+    return t5_tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+
+def summarize_and_analyze_esg_results(future_years=None, mode="hierarchical", batch_size=8):
+    """
+    Summarize the predicted projects.
+
+    Args:
+        future_years (pd.DataFrame): Projects to summarize, the pipeline's by default.
+        mode (str): "hierarchical" summarizes every project with map-reduce over
+            token-bounded chunks; "truncate" keeps only the first 512 tokens.
+        batch_size (int): Chunks summarized per generate call.
 
-# Load ESG-BERT Model
-esg_bert_tokenizer = AutoTokenizer.from_pretrained("yiyanghkust/finbert-esg")
-esg_bert_model = TFAutoModelForSequenceClassification.from_pretrained("yiyanghkust/finbert-esg", from_pt=True)
+    Returns:
+        str: Summary of the projects.
+    """
+    if future_years is None:
+        future_years = pipeline.get()["future_years"]
 
-# Load T5 Model for Summarization
-t5_tokenizer = T5Tokenizer.from_pretrained("t5-small")
-t5_model = T5ForConditionalGeneration.from_pretrained("t5-small")
+    result_texts = project_result_texts(future_years)
+    if mode == "truncate":
+        return summarize_results_with_t5(" ".join(result_texts))
 
-def analyze_with_esg_bert(text):
-    inputs = esg_bert_tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-    outputs = esg_bert_model(**inputs)
-    scores = outputs.logits.softmax(dim=-1).detach().numpy()[0]
-    sentiment = ["Environmental", "Social", "Governance"][scores.argmax()]
-    return sentiment, scores
+    def summarize_many(texts):
+        return [
+            summary
+            for start in range(0, len(texts), batch_size)
+            for summary in summarize_batch_with_t5(texts[start:start + batch_size])
+        ]
 
-def summarize_results_with_t5(text):
-    input_ids = t5_tokenizer.encode("summarize: " + text, return_tensors="pt", max_length=512, truncation=True)
-    summary_ids = t5_model.generate(input_ids, max_length=150, min_length=40, length_penalty=2.0, num_beams=4, early_stopping=True)
-    return t5_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-
-def summarize_and_analyze_esg_results():
-    combined_results = []
-    for _, row in future_years.iterrows():
-        result_text = (
-            f"Project: {row['Series Name']}, ESG Score: {row['Predicted ESG Score']:.2f}, "
-            f"Risk Factor: {row['Risk Factor']:.2f}, Cost: {row['Project Cost']}"
-        )
-        combined_results.append(result_text)
-
-    full_text = " ".join(combined_results)
-    return summarize_results_with_t5(full_text)
+    summary, _ = summarize_hierarchical(result_texts, t5.get()[0], summarize_many)
+    return summary
 
 # Main Pipeline
 def main_pipeline(file_path, budget, project_series="All Projects"):
@@ -158,22 +201,20 @@ def main_pipeline(file_path, budget, project_series="All Projects"):
     Returns:
         pd.DataFrame: Allocated projects with relevant details.
     """
-    pivot_data, pivot_data_encoded = load_and_preprocess_data(file_path)
-    X = pivot_data_encoded[pivot_data_encoded['Year'] < 2020].drop(columns=['Value', 'Year'])
-    y = pivot_data_encoded[pivot_data_encoded['Year'] < 2020]['Value']
-    X_future = pivot_data_encoded[pivot_data_encoded['Year'] >= 2020].drop(columns=['Value', 'Year'])
-    future_years = pivot_data[pivot_data['Year'] >= 2020][['Country Name', 'Series Name', 'Year']]
+    state = build_pipeline(file_path)
+    return allocate_budget_milp(budget, project_series, future_years=state["future_years"])
 
-    rf_model_esg = RandomForestRegressor(random_state=42)
-    rf_model_esg.fit(X_train, y_train)
 
-    predicted_scores = rf_model_esg.predict(X_future)
-    
-    # Convert NumPy array to DataFrame
-    predicted_scores_df = pd.DataFrame(predicted_scores, columns=["Predicted ESG Score"])
-    future_years = pd.concat([future_years.reset_index(drop=True), predicted_scores_df], axis=1)
+if __name__ == "__main__":
+    import sys
+    import warnings
+    warnings.filterwarnings('ignore')
 
-    future_years['Project Cost'] = np.random.randint(50, 200, size=len(future_years))
+    # Adjust Pandas display settings
+    pd.set_option('display.max_rows', None)
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.width', None)
 
-    allocated_projects = allocate_budget_milp(budget, project_series)
-    return allocated_projects
+    dataset_path = sys.argv[1] if len(sys.argv) > 1 else DATASET_PATH
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    print(main_pipeline(dataset_path, budget))
@@ -1,8 +1,19 @@
+import copy
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
 from sklearn.model_selection import train_test_split
-from pulp import LpProblem, LpMaximize, LpVariable, lpSum
+from utils.allocation_engine import solve_allocation
+from utils.categorical_encoder import CategoricalEncoder
+
+# Regressor backends: forests on one-hot keys, or histogram gradient boosting on
+# category codes, which it splits on natively
+MODEL_BACKENDS = ("random_forest", "hist_gradient_boosting")
+BACKEND_ENCODINGS = {"random_forest": "onehot", "hist_gradient_boosting": "ordinal"}
+# HistGradientBoosting handles categorical features with at most this many categories
+HGB_MAX_CATEGORIES = 255
+# Smaller training sets are fitted without holding out an early-stopping validation split
+HGB_EARLY_STOPPING_MIN_ROWS = 1000
 
 # Function to load and preprocess the dataset
 def load_and_preprocess_data(file_path):
@@ -25,20 +36,174 @@ def load_and_preprocess_data(file_path):
         values='Value'
     ).reset_index()
 
-    # One-hot encode categorical features
-    pivot_data_encoded = pd.get_dummies(pivot_data, columns=['Country Name', 'Series Name'])
+    # One-hot encode categorical features (sparse columns: most entries are zero)
+    pivot_data_encoded = pd.get_dummies(pivot_data, columns=['Country Name', 'Series Name'], sparse=True, dtype=np.float32)
 
     return pivot_data, pivot_data_encoded
 
+# Function to build training data from a preprocessed dataset (see utils.data_processor).
+# The country/series keys are one-hot encoded into sparse matrices (or into category codes
+# with encoding="ordinal") with the returned encoder
+def prepare_training_data(dataset, split_year=2020, encoder=None, encoding="onehot"):
+    key_columns = ['CountryName', 'SeriesName']
+    year_columns = [col for col in dataset.columns if col.startswith('YR')]
+
+    # Melt the year columns to long format and keep the history before split_year
+    time_series_data = dataset.melt(
+        id_vars=key_columns,
+        value_vars=year_columns,
+        var_name='Year',
+        value_name='Value'
+    )
+    time_series_data['Year'] = time_series_data['Year'].str[2:].astype(int)
+    time_series_data = time_series_data[time_series_data['Year'] < split_year].dropna(subset=['Value'])
+
+    pivot_data = time_series_data.pivot_table(
+        index=key_columns + ['Year'],
+        values='Value',
+        observed=True
+    ).reset_index()
+    encoder = encoder or CategoricalEncoder(key_columns, mode=encoding).fit(pivot_data)
+
+    X = encoder.transform(pivot_data)
+    y = pivot_data['Value'].to_numpy()
+
+    # Risk is modelled per project from the RiskFactor column of the dataset
+    risk_data = dataset[key_columns + ['RiskFactor']].dropna()
+    risk_X = encoder.transform(risk_data)
+    risk_y = risk_data['RiskFactor'].to_numpy()
+
+    return X, y, risk_X, risk_y, encoder
+
+# Function to melt the year columns of a preprocessed dataset into (country, series, year) cells before split_year
+def training_cells(dataset, split_year=2020):
+    key_columns = ['CountryName', 'SeriesName']
+    year_columns = [col for col in dataset.columns if col.startswith('YR') and int(col[2:]) < split_year]
+    cells = dataset.melt(id_vars=key_columns, value_vars=year_columns, var_name='Year', value_name='Value')
+    cells['Year'] = cells['Year'].str[2:].astype(int)
+    cells[key_columns] = cells[key_columns].astype(str)
+    cells = cells.dropna(subset=['Value']).groupby(key_columns + ['Year'], as_index=False)['Value'].mean()
+    return cells
+
+# Function to compare the training cells and project risks of new_dataset with old_dataset.
+# Returns all ESG cells and risk rows of new_dataset, with a "Changed" flag on the new or
+# changed ones, and their counts
+def training_delta(old_dataset, new_dataset, split_year=2020, tolerance=1e-6):
+    key_columns = ['CountryName', 'SeriesName']
+    cells = training_cells(new_dataset, split_year).merge(
+        training_cells(old_dataset, split_year), on=key_columns + ['Year'],
+        how='outer', suffixes=('', '_old'), indicator=True
+    )
+    new_cells = cells['_merge'] == 'left_only'
+    changed_cells = (cells['_merge'] == 'both') & ~np.isclose(cells['Value'], cells['Value_old'], atol=tolerance)
+    esg_cells = cells.loc[cells['_merge'] != 'right_only', key_columns + ['Year', 'Value']]
+    esg_cells['Changed'] = (new_cells | changed_cells)[esg_cells.index]
+
+    def risk_rows(dataset):
+        rows = dataset[key_columns + ['RiskFactor']].dropna().astype({col: str for col in key_columns})
+        return rows.groupby(key_columns, as_index=False)['RiskFactor'].mean()
+
+    risks = risk_rows(new_dataset).merge(risk_rows(old_dataset), on=key_columns, how='outer', suffixes=('', '_old'), indicator=True)
+    new_risks = risks['_merge'] == 'left_only'
+    changed_risks = (risks['_merge'] == 'both') & ~np.isclose(risks['RiskFactor'], risks['RiskFactor_old'], atol=tolerance)
+    risk_cells = risks.loc[risks['_merge'] != 'right_only', key_columns + ['RiskFactor']]
+    risk_cells['Changed'] = (new_risks | changed_risks)[risk_cells.index]
+
+    counts = {
+        "cells": len(esg_cells),
+        "new_cells": int(new_cells.sum()),
+        "changed_cells": int(changed_cells.sum()),
+        "removed_cells": int((cells['_merge'] == 'right_only').sum()),
+        "risk_rows": len(risk_cells),
+        "new_risk_rows": int(new_risks.sum()),
+        "changed_risk_rows": int(changed_risks.sum()),
+        "removed_risk_rows": int((risks['_merge'] == 'right_only').sum()),
+    }
+    return esg_cells, risk_cells, counts
+
+# Function to grow a copy of a fitted forest with extra trees fitted on new data only;
+# the existing trees are shared with the original model, which is left unchanged
+def warm_start_forest(model, X_new, y_new, added_trees, n_jobs=None, sample_weight=None):
+    updated = copy.copy(model)
+    updated.estimators_ = list(model.estimators_)
+    updated.set_params(warm_start=True, n_estimators=len(model.estimators_) + added_trees, n_jobs=n_jobs)
+    updated.fit(X_new, y_new, sample_weight=sample_weight)
+    updated.set_params(warm_start=False)
+    return updated
+
+# Function to collect the year columns of a preprocessed dataset as a (rows x years) matrix
+def year_value_matrix(dataset):
+    year_columns = sorted((col for col in dataset.columns if col.startswith('YR')), key=lambda col: int(col[2:]))
+    years = np.array([int(col[2:]) for col in year_columns])
+    values = dataset[year_columns].to_numpy(dtype=np.float32) if year_columns else np.empty((len(dataset), 0), np.float32)
+    return years, values
+
+# Function to build one feature row per (dataset row, target year): key codes, year and the values
+# of the previous lags years from value_lookup. Rows are year-major: all rows of the first target year come first
+def build_forecast_features(codes, years, value_lookup, target_years, lags=0):
+    rows = len(codes)
+    column_of = {int(year): i for i, year in enumerate(years)}
+    blocks = []
+    for year in target_years:
+        block = np.empty((rows, 3 + lags), dtype=np.float32)
+        block[:, :2] = codes
+        block[:, 2] = year
+        for lag in range(1, lags + 1):
+            column = column_of.get(int(year) - lag)
+            # Missing history stays NaN, which the forests handle natively
+            block[:, 2 + lag] = value_lookup[:, column] if column is not None else np.nan
+        blocks.append(block)
+    return np.concatenate(blocks) if blocks else np.empty((0, 3 + lags), dtype=np.float32)
+
+# Function to name the forecast feature columns
+def forecast_feature_columns(lags=0):
+    return ['CountryCode', 'SeriesCode', 'Year'] + [f'Lag{lag}' for lag in range(1, lags + 1)]
+
+# Function to build forecast training data: every observed year before split_year is a target
+def prepare_forecast_training_data(dataset, lags=0, split_year=2020):
+    encoder = CategoricalEncoder(['CountryName', 'SeriesName'], mode="ordinal").fit(dataset)
+    years, values = year_value_matrix(dataset)
+    target_years = [int(year) for year in years if year < split_year]
+
+    X = build_forecast_features(encoder.transform(dataset), years, values, target_years, lags)
+    y = values[:, [int(np.searchsorted(years, year)) for year in target_years]].T.ravel()
+    observed = ~np.isnan(y)
+    X = pd.DataFrame(X[observed], columns=forecast_feature_columns(lags))
+    return X, y[observed], encoder
+
+# Function to mark the category-code features of an ordinal encoder for gradient boosting,
+# followed by extra_features numeric ones; keys with too many categories stay numeric codes
+def categorical_feature_mask(encoder, extra_features=0):
+    mask = [len(encoder.vocabulary[col]) <= HGB_MAX_CATEGORIES for col in encoder.columns]
+    return mask + [False] * extra_features
+
+# Function to train a single regressor. "hist_gradient_boosting" takes dense category codes,
+# splits natively on the categorical_features mask and stops once a validation split stops improving
+def train_model(X_train, y_train, n_jobs=None, backend="random_forest", categorical_features=None):
+    if backend == "random_forest":
+        model = RandomForestRegressor(random_state=42, n_jobs=n_jobs)
+    elif backend == "hist_gradient_boosting":
+        model = HistGradientBoostingRegressor(
+            max_iter=500,
+            categorical_features=categorical_features if categorical_features is not None else "from_dtype",
+            early_stopping=len(y_train) >= HGB_EARLY_STOPPING_MIN_ROWS,
+            validation_fraction=0.1,
+            n_iter_no_change=10,
+            random_state=42
+        )
+    else:
+        raise ValueError(f"Unknown model backend '{backend}', expected one of {MODEL_BACKENDS}")
+    model.fit(X_train, y_train)
+    return model
+
 # Function to train ESG and risk factor models
-def train_models(X_train, y_train, risk_X_train, risk_y_train):
+def train_models(X_train, y_train, risk_X_train, risk_y_train, n_jobs=None, backend="random_forest",
+                 categorical_features=None):
     # Train ESG Prediction Model
-    rf_model_esg = RandomForestRegressor(random_state=42)
-    rf_model_esg.fit(X_train, y_train)
+    rf_model_esg = train_model(X_train, y_train, n_jobs, backend, categorical_features)
 
     # Train Risk Prediction Model
-    rf_model_risk = RandomForestRegressor(random_state=42)
-    rf_model_risk.fit(risk_X_train, risk_y_train)
+    rf_model_risk = train_model(risk_X_train, risk_y_train, n_jobs, backend, categorical_features)
 
     return rf_model_esg, rf_model_risk
 
@@ -55,38 +220,25 @@ def predict_scores(models, X_future, risk_X_future):
 
     return predicted_esg_scores, predicted_risk_factors
 
-# Function to allocate budget using optimization
-def allocate_budget(predicted_data, budget, project_series):
+# Function to allocate budget using optimization; constraints are extra limits
+# such as the ones built by utils.allocation_engine.portfolio_constraints
+def allocate_budget(predicted_data, budget, project_series, solver="auto", constraints=None):
     # Filter for selected project series
     if project_series != "All Projects":
         predicted_data = predicted_data[predicted_data['Series Name'] == project_series]
 
-    # Define MILP Problem
-    problem = LpProblem("ESG_Optimization", LpMaximize)
-
-    # Define decision variables
-    projects = list(predicted_data.index)
-    allocations = LpVariable.dicts("Allocation", projects, 0, 1, cat='Binary')
-
-    # Objective: Maximize ESG Scores while considering risk factors
-    problem += lpSum([
-        predicted_data.loc[i, 'Predicted ESG Score'] * (1 - predicted_data.loc[i, 'Risk Factor']) * allocations[i]
-        for i in projects
-    ]), "Maximize ESG Impact Adjusted for Risk"
-
-    # Constraint: Budget
-    problem += lpSum([
-        predicted_data.loc[i, 'Project Cost'] * allocations[i]
-        for i in projects
-    ]) <= budget, "Budget Constraint"
-
-    # Solve the problem
-    problem.solve()
+    # Maximize ESG Scores while considering risk factors, subject to the budget
+    result = solve_allocation(
+        predicted_data['Predicted ESG Score'].to_numpy(),
+        predicted_data['Project Cost'].to_numpy(),
+        budget,
+        risk=predicted_data['Risk Factor'].to_numpy(),
+        solver=solver,
+        constraints=constraints
+    )
 
     # Collect results
-    allocated_projects = [i for i in projects if allocations[i].varValue == 1]
-
-    allocated_data = predicted_data.loc[allocated_projects]
+    allocated_data = predicted_data[result["selected"]]
     used_budget = allocated_data['Project Cost'].sum()
 
     return allocated_data, used_budget
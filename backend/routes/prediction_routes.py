@@ -1,9 +1,12 @@
+import io
+import hashlib
 import pandas as pd
 from flask import Blueprint, request, jsonify
-from models.esg_model import ESGModel
+from utils.data_processor import preprocess_dataset, create_pivot_data
+from utils.model_store import ModelStore, predict_with_bundle
 
 prediction_blueprint = Blueprint('prediction_routes', __name__)
-esg_model = ESGModel()
+model_store = ModelStore('./uploads/models')
 
 @prediction_blueprint.route('/esg', methods=['POST'])
 def predict_esg():
@@ -11,13 +14,17 @@ def predict_esg():
         if 'file' not in request.files:
             return jsonify({"error": "No file uploaded"}), 400
 
-        file = request.files['file']
-        df = pd.read_csv(file)
+        content = request.files['file'].read()
+        df, _ = preprocess_dataset(pd.read_csv(io.BytesIO(content)))
 
-        # Call ESG model for predictions
-        esg_model.train_models(df)
-        future_predictions = esg_model.predict_esg(df)
+        # Models are only trained the first time a file is seen. The cache is keyed
+        # on the uploaded bytes, which are hashed as read instead of hashing the
+        # preprocessed frame in another pass before the lookup.
+        bundle, _ = model_store.get_or_train(hashlib.sha256(content).hexdigest(), lambda: df)
+        pivot_data = create_pivot_data(df, 'YR2020', encode=False)
+        predicted_esg_scores, _, _ = predict_with_bundle(bundle, pivot_data)
+        pivot_data['Predicted ESG Score'] = predicted_esg_scores
 
-        return jsonify({"predictions": future_predictions.to_dict()}), 200
+        return jsonify({"predictions": pivot_data.to_dict()}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
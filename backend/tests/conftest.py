@@ -0,0 +1,48 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def raw_dataset(countries=("A", "B", "C"), series=("S1", "S2", "S3"), years=range(2010, 2021), seed=0):
+    """A raw upload in the World Bank layout the app ingests."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for country in countries:
+        for name in series:
+            row = {"Country Name": country, "Country Code": country, "Series Name": name, "Series Code": name}
+            for year in years:
+                row[f"{year} [YR{year}]"] = round(float(rng.uniform(10, 90)), 3)
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """The Flask app module with its upload folder, registries and model store in a temp directory."""
+    monkeypatch.chdir(BACKEND_DIR)
+    import app as module
+    from utils.upload_index import UploadIndex
+    from utils.dataset_registry import DatasetRegistry
+    from utils.model_store import ModelStore
+    from utils.job_queue import TrainingJobQueue
+
+    folder = str(tmp_path)
+    upload_index = UploadIndex(folder)
+    model_store = ModelStore(os.path.join(folder, "models"))
+    monkeypatch.setitem(module.app.config, "UPLOAD_FOLDER", folder)
+    monkeypatch.setitem(module.app.config, "TRAIN_ON_UPLOAD", False)
+    monkeypatch.setattr(module, "upload_index", upload_index)
+    monkeypatch.setattr(module, "dataset_registry", DatasetRegistry(folder, index=upload_index))
+    monkeypatch.setattr(module, "model_store", model_store)
+    monkeypatch.setattr(module, "training_jobs", TrainingJobQueue(model_store, n_jobs=1))
+    return module
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,86 @@
+def test_batch_groups_list_valued_series(client):
+    predictions = [
+        {"SeriesName": series, "CountryName": country, "Cost": 10 + i, "RiskFactor": 0.2,
+         "Predicted ESG Score": 50 + i}
+        for i, (series, country) in enumerate(
+            (series, country) for series in ("S1", "S2", "S3") for country in ("A", "B")
+        )
+    ]
+    response = client.post("/allocate-budget/batch", json={
+        "predictions": predictions,
+        "include_projects": False,
+        "scenarios": [
+            {"budget": 30, "project_series": ["S1", "S3"]},
+            {"budget": 60, "project_series": ["S3", "S1"]},
+            {"budget": 30, "project_series": "S2"},
+            {"budget": 100},
+        ],
+    })
+
+    assert response.status_code == 200, response.json
+    scenarios = response.json["scenarios"]
+    assert [scenario["frontier"] for scenario in scenarios] == ["S1, S3", "S1, S3", "S2", "All Projects"]
+    assert scenarios[1]["project_series"] == ["S3", "S1"]
+    assert set(response.json["frontiers"]) == {"S1, S3", "S2", "All Projects"}
+    assert all(scenario["remaining_budget"] >= 0 for scenario in scenarios)
+
+
+def test_batch_rejects_unbounded_requests(client):
+    predictions = [{"SeriesName": "S1", "CountryName": "A", "Cost": 10, "RiskFactor": 0.2, "Predicted ESG Score": 50}]
+    scenario = {"budget": 100}
+
+    for frontier_points in (10 ** 8, 1, "50", 2.5):
+        response = client.post("/allocate-budget/batch", json={
+            "predictions": predictions, "scenarios": [scenario], "frontier_points": frontier_points
+        })
+        assert response.status_code == 400
+        assert "frontier_points" in response.json["error"]
+
+    response = client.post("/allocate-budget/batch", json={"predictions": predictions, "scenarios": [scenario] * 101})
+    assert response.status_code == 400
+    assert "scenarios" in response.json["error"]
+
+    response = client.post("/allocate-budget/batch", json={
+        "predictions": predictions, "scenarios": [scenario], "frontier_points": 1000
+    })
+    assert response.status_code == 200
+    assert len(response.json["frontiers"]["All Projects"]) == 1000
+
+
+def test_unknown_result_id_is_not_found(client):
+    for path in ("/allocate-budget", "/allocate-budget/batch"):
+        response = client.post(path, json={
+            "result_id": "missing", "budget": 100, "project_series": "All Projects", "scenarios": [{"budget": 100}]
+        })
+        assert response.status_code == 404
+        assert "not found or expired" in response.json["error"]
+
+
+def test_indexing_errors_are_not_reported_as_not_found(app_module, client, monkeypatch):
+    def broken(*args, **kwargs):
+        raise KeyError("Cost")
+
+    monkeypatch.setattr(app_module, "allocation_arrays", broken)
+    predictions = [{"SeriesName": "S1", "CountryName": "A", "Cost": 10, "RiskFactor": 0.2, "Predicted ESG Score": 50}]
+    response = client.post("/allocate-budget/batch", json={"predictions": predictions, "scenarios": [{"budget": 100}]})
+
+    assert response.status_code == 400
+
+
+def test_allocation_solve_bounds(app_module, client, monkeypatch):
+    predictions = [{"SeriesName": "S1", "CountryName": "A", "Cost": 10, "RiskFactor": 0.2, "Predicted ESG Score": 50}]
+    request = {"predictions": predictions, "budget": 100, "project_series": "All Projects",
+               "constraints": {"min_projects": 1}}
+
+    for bounds in ({"time_limit_seconds": 0}, {"time_limit_seconds": -1}, {"time_limit_seconds": "5"},
+                   {"mip_gap": 1}, {"mip_gap": -0.1}):
+        response = client.post("/allocate-budget", json={**request, **bounds})
+        assert response.status_code == 400
+
+    limits = []
+    allocate = app_module.allocate
+    monkeypatch.setattr(app_module, "allocate",
+                        lambda *args, time_limit, gap: limits.append(time_limit) or allocate(*args, time_limit=time_limit, gap=gap))
+    response = client.post("/allocate-budget", json={**request, "time_limit_seconds": 1e9, "mip_gap": 0.05})
+    assert response.status_code == 200
+    assert limits == [app_module.app.config["ALLOCATION_TIME_LIMIT_SECONDS"]]
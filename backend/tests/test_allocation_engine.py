@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+import itertools
+from utils.allocation_engine import (
+    solve_allocation, portfolio_constraints, knapsack_dp, knapsack_branch_and_bound, choose_solver
+)
+
+
+def problem(n=2000, poor_projects=0, seed=0):
+    rng = np.random.default_rng(seed)
+    scores = rng.uniform(50, 100, n)
+    costs = rng.integers(20, 81, n).astype(np.float64)
+    countries = rng.integers(0, 20, n).astype(str)
+    # Expensive projects with almost no impact, which only a constraint makes worth funding
+    scores[:poor_projects], costs[:poor_projects], countries[:poor_projects] = 1, 80, "poor"
+    return scores, costs, countries, costs.sum() * 0.3
+
+
+def satisfies(selected, costs, budget, constraints):
+    if costs[selected].sum() > budget:
+        return False
+    for constraint in constraints:
+        indices, coefficients = (constraint[0], constraint[1]) if len(constraint) == 3 else (np.arange(len(costs)), constraint[0])
+        coefficients = np.broadcast_to(coefficients, np.shape(indices))
+        if np.dot(coefficients, selected[indices]) > constraint[-1] + 1e-9:
+            return False
+    return True
+
+
+def test_milp_time_limit_without_incumbent_returns_feasible_fallback():
+    scores, costs, countries, budget = problem()
+    constraints = portfolio_constraints(
+        costs, budget, groups={"country": countries}, max_share={"country": 0.1}, min_projects=400
+    )
+
+    result = solve_allocation(scores, costs, budget, solver="milp", constraints=constraints, time_limit=1e-3)
+
+    assert not result["optimal"]
+    assert result["selected"].sum() >= 400
+    assert satisfies(result["selected"], costs, budget, constraints)
+
+
+def test_milp_time_limit_never_reports_an_infeasible_allocation():
+    scores, costs, countries, budget = problem()
+    # Every project costs at least 20, so the budget affords fewer than 400 of them
+    budget = 20 * 400 - 1
+    constraints = portfolio_constraints(costs, budget, groups={"country": countries}, min_projects=400)
+
+    # Whether CBC proves infeasibility or stops first, no allocation is reported
+    with pytest.raises(ValueError, match="Infeasible|time limit"):
+        solve_allocation(scores, costs, budget, solver="milp", constraints=constraints, time_limit=1e-3)
+
+
+def brute_force(values, costs, budget):
+    subsets = np.array(list(itertools.product([False, True], repeat=len(values))))
+    feasible = subsets @ costs <= budget + 1e-9
+    return float((subsets[feasible] @ values).max())
+
+
+def test_solvers_match_brute_force():
+    rng = np.random.default_rng(7)
+    for _ in range(400):
+        n = int(rng.integers(1, 11))
+        values = rng.uniform(-5, 100, n)
+        costs = rng.integers(0, 60, n).astype(np.float64)
+        budget = float(rng.integers(0, 200))
+        expected = brute_force(values, costs, budget)
+
+        selected = knapsack_dp(values, costs, budget)
+        assert costs[selected].sum() <= budget
+        assert values[selected].sum() == pytest.approx(expected)
+
+        real_costs = costs + rng.uniform(0, 1, n)
+        selected, optimal = knapsack_branch_and_bound(values, real_costs, budget)
+        assert optimal and real_costs[selected].sum() <= budget
+        assert values[selected].sum() == pytest.approx(brute_force(values, real_costs, budget))
+
+
+def test_budget_beyond_total_cost_takes_every_useful_project():
+    result = solve_allocation([5, 9, -1], [21, 80, 3], 1e8)
+
+    assert result["selected"].tolist() == [True, True, False]
+    assert choose_solver(np.array([21.0, 80.0]), 1e8) == "dp"
+    assert choose_solver(np.array([1.0, 1e8]), 1e8) == "branch_and_bound"
+    selected = knapsack_dp(np.array([5.0, 9.0]), np.array([21.0, 80.0]), 1e8)
+    assert selected.tolist() == [True, True]
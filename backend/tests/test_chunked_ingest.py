@@ -0,0 +1,55 @@
+import os
+import pytest
+from conftest import raw_dataset
+import utils.chunked_ingest as chunked_ingest
+from utils.chunked_ingest import ingest_csv_in_chunks, get_progress
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    path = tmp_path / "uploaded_dataset.csv"
+    raw_dataset().to_csv(path, index=False)
+    return str(path)
+
+
+def test_chunked_ingest_writes_dataset(tmp_path, raw_csv):
+    result = ingest_csv_in_chunks(raw_csv, str(tmp_path), "preprocessed_dataset_ok", upload_id="ok",
+                                  storage_format="csv", chunk_rows=4)
+
+    assert result["rows"] == 9 and result["chunks"] == 3
+    assert sorted(os.listdir(tmp_path)) == ["preprocessed_dataset_ok.csv", "uploaded_dataset.csv"]
+    assert get_progress("ok")["stage"] == "done"
+
+
+def test_failed_chunk_leaves_no_dataset_file(tmp_path, raw_csv, monkeypatch):
+    preprocess_dataset = chunked_ingest.preprocess_dataset
+    calls = []
+
+    def fail_on_second_chunk(chunk, **kwargs):
+        calls.append(len(chunk))
+        if len(calls) == 2:
+            raise ValueError("Malformed chunk")
+        return preprocess_dataset(chunk, **kwargs)
+
+    monkeypatch.setattr(chunked_ingest, "preprocess_dataset", fail_on_second_chunk)
+    with pytest.raises(ValueError, match="Malformed chunk"):
+        ingest_csv_in_chunks(raw_csv, str(tmp_path), "preprocessed_dataset_bad", upload_id="bad",
+                             storage_format="csv", chunk_rows=4)
+
+    assert os.listdir(tmp_path) == ["uploaded_dataset.csv"]
+    assert get_progress("bad")["stage"] == "failed"
+    assert get_progress("bad")["error"] == "Malformed chunk"
+
+
+def test_empty_result_leaves_no_dataset_file(tmp_path):
+    raw = raw_dataset()
+    raw[[col for col in raw.columns if "[YR" in col]] = 0
+    path = tmp_path / "uploaded_dataset.csv"
+    raw.to_csv(path, index=False)
+
+    with pytest.raises(ValueError, match="empty"):
+        ingest_csv_in_chunks(str(path), str(tmp_path), "preprocessed_dataset_empty", upload_id="empty",
+                             storage_format="csv", chunk_rows=4)
+
+    assert os.listdir(tmp_path) == ["uploaded_dataset.csv"]
+    assert get_progress("empty")["stage"] == "failed"
@@ -0,0 +1,24 @@
+import os
+import time
+from conftest import raw_dataset
+from utils.data_processor import preprocess_dataset
+from utils.dataset_registry import DatasetRegistry, find_latest_dataset
+from utils.dataset_store import save_dataset
+
+
+def test_legacy_scan_skips_row_index_sidecar(tmp_path):
+    folder = str(tmp_path)
+    dataset, _ = preprocess_dataset(raw_dataset())
+    path = save_dataset(dataset, folder, "preprocessed_dataset_20250115012421", "csv")
+    DatasetRegistry(folder).register("20250115012421", path, dataset)
+    sidecar = os.path.join(folder, "preprocessed_dataset_20250115012421.rows.npz")
+    assert os.path.exists(sidecar)
+    # The row index is written after the dataset and is the newest file
+    later = time.time() + 10
+    os.utime(sidecar, (later, later))
+
+    assert find_latest_dataset(folder) == path
+    # A new process scans the folder without an upload index
+    registry = DatasetRegistry(folder)
+    assert registry.latest_id() == "20250115012421"
+    assert sorted(registry.row_index().rows({"SeriesName": ["S2"]})) == [1, 4, 7]
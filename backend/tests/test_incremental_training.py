@@ -0,0 +1,44 @@
+import numpy as np
+from conftest import raw_dataset
+from utils.data_processor import preprocess_dataset, create_pivot_data
+from utils.model_store import ModelStore, predict_with_bundle, predict_risk_with_bundle
+
+COUNTRIES = [f"Country {i}" for i in range(12)]
+SERIES = [f"Series {i}" for i in range(12)]
+
+
+def update(tmp_path, changed_projects):
+    raw = raw_dataset(COUNTRIES, SERIES)
+    store = ModelStore(str(tmp_path))
+    parent_dataset, _ = preprocess_dataset(raw)
+    parent = store.train("a" * 64, parent_dataset)
+
+    changed = raw.copy()
+    changed.loc[:changed_projects - 1, "2012 [YR2012]"] = 1.2345
+    dataset, _ = preprocess_dataset(changed)
+    bundle = store.train_incremental("b" * 64, dataset, parent, parent_dataset)
+
+    pivot = create_pivot_data(dataset, "YR2020", encode=False)
+    keys = set(zip(raw["Country Name"][:changed_projects], raw["Series Name"][:changed_projects]))
+    unchanged = ~np.array([key in keys for key in zip(pivot["CountryName"], pivot["SeriesName"])])
+    return parent, bundle, pivot, unchanged
+
+
+def test_incremental_update_keeps_unchanged_predictions(tmp_path):
+    parent, bundle, pivot, unchanged = update(tmp_path, 40)
+
+    assert bundle["lineage"]["updates"] == {"esg": "warm_start", "risk": "reused"}
+    assert 0 < bundle["lineage"]["added_trees"]["esg"] < 10
+    before = predict_with_bundle(parent, pivot)[0][unchanged]
+    after = predict_with_bundle(bundle, pivot)[0][unchanged]
+    relative = np.abs(after - before) / np.abs(before)
+    assert np.median(relative) < 0.01
+    assert relative.max() < 0.05
+    np.testing.assert_allclose(predict_risk_with_bundle(bundle, pivot), predict_risk_with_bundle(parent, pivot))
+
+
+def test_tiny_delta_reuses_parent_models(tmp_path):
+    parent, bundle, pivot, _ = update(tmp_path, 1)
+
+    assert bundle["lineage"]["updates"] == {"esg": "reused", "risk": "reused"}
+    assert bundle["esg_model"] is parent["esg_model"]
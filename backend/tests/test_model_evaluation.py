@@ -0,0 +1,19 @@
+from conftest import raw_dataset
+from utils.data_processor import preprocess_dataset
+from utils.model_evaluation import evaluate_models, best_within_slo
+
+
+def test_slo_selection_uses_serial_latency():
+    dataset, _ = preprocess_dataset(raw_dataset([f"Country {i}" for i in range(6)], [f"Series {i}" for i in range(6)]))
+    results = evaluate_models(dataset, models=("random_forest",), n_iter=3, n_splits=3, n_jobs=1, finalists=2)
+
+    serial = sorted(results, key=lambda result: result["rmse"])[:2]
+    assert [result["timing"] for result in results].count("serial") == 2
+    assert all(result["timing"] == "serial" and "latency_ms_cv" in result for result in serial)
+
+    best = best_within_slo(results, latency_slo_ms=float("inf"))
+    assert best is serial[0]
+    for result in serial:
+        result["latency_ms"] = 1e9
+    assert best_within_slo(results, latency_slo_ms=1e6) is None
+    assert best_within_slo(results) is min(results, key=lambda result: result["rmse"])
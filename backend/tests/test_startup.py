@@ -0,0 +1,12 @@
+import statistics
+from conftest import BACKEND_DIR
+from benchmarks.bench_startup import measure_import, IMPORT_BUDGET_SECONDS
+
+
+def test_app_import_stays_light_and_within_budget(monkeypatch):
+    # The probe imports the app from the working directory
+    monkeypatch.chdir(BACKEND_DIR)
+    timings, heavy = measure_import(1)
+
+    assert heavy == []
+    assert statistics.median(timings) < IMPORT_BUDGET_SECONDS
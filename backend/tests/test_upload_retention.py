@@ -0,0 +1,71 @@
+import io
+import os
+import time
+import pytest
+from conftest import raw_dataset
+
+
+def upload(client, seed):
+    csv = raw_dataset(seed=seed).to_csv(index=False).encode()
+    return client.post("/upload-dataset", data={"file": (io.BytesIO(csv), "esg.csv")}, content_type="multipart/form-data")
+
+
+def wait_for_job(app_module, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = app_module.training_jobs.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Training job {job_id} did not finish")
+
+
+@pytest.fixture
+def training_client(app_module, client, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, "TRAIN_ON_UPLOAD", True)
+    monkeypatch.setitem(app_module.app.config, "INCREMENTAL_TRAINING", True)
+    # Every upload exceeds the limit, so only protected datasets are kept
+    monkeypatch.setattr(app_module.upload_index, "max_bytes", 1)
+    yield client
+    app_module.training_jobs.shutdown()
+
+
+def test_retention_keeps_parent_of_incremental_job(app_module, training_client):
+    first = upload(training_client, seed=0)
+    assert first.status_code == 200, first.json
+    wait_for_job(app_module, first.json["training_job_id"])
+
+    second = upload(training_client, seed=1)
+    assert second.status_code == 200, second.json
+    job = wait_for_job(app_module, second.json["training_job_id"])
+    assert job["status"] == "done", job["error"]
+    assert job["parent_fingerprint"] is not None
+
+
+def test_upload_trains_from_scratch_when_parent_is_evicted(app_module, training_client, monkeypatch):
+    first = upload(training_client, seed=0)
+    first_id = first.json["dataset_id"]
+    wait_for_job(app_module, first.json["training_job_id"])
+
+    # Evict the parent anyway, as a concurrent upload could
+    enforce_retention = app_module.upload_index.enforce_retention
+    monkeypatch.setattr(app_module.upload_index, "enforce_retention",
+                        lambda protect=(): enforce_retention(protect=set(protect) - {first_id}))
+    second = upload(training_client, seed=1)
+    assert second.status_code == 200, second.json
+    job = wait_for_job(app_module, second.json["training_job_id"])
+    assert job["status"] == "done", job["error"]
+    assert job["parent_fingerprint"] is None
+
+
+def test_failed_preprocess_removes_raw_upload(app_module, client):
+    raw = raw_dataset()
+    raw[[col for col in raw.columns if "[YR" in col]] = 0
+    csv = raw.to_csv(index=False).encode()
+
+    response = client.post("/upload-dataset?mode=chunked", data={"file": (io.BytesIO(csv), "esg.csv")},
+                           content_type="multipart/form-data")
+
+    assert response.status_code == 500
+    folder = app_module.app.config["UPLOAD_FOLDER"]
+    assert [name for name in os.listdir(folder) if name.endswith((".csv", ".part", ".feather"))] == []
@@ -1,18 +1,81 @@
+import os
 import pandas as pd
 import numpy as np
-from tensorflow.keras.models import load_model  # type: ignore
-from pulp import LpProblem, LpMaximize, LpVariable, lpSum
+from models import FinGreen_NLP
 from models.FinGreen_NLP import predicted_scores as nlp_predict_esg_scores
 from models.FinGreen_NLP import allocate_budget_milp as nlp_allocate_budget
 from models.FinGreen_NLP import summarize_and_analyze_esg_results as nlp_summarize_results
+from models.FinGreen_NLP import classify_esg as nlp_classify_esg
 from utils.data_processor import preprocess_dataset, create_pivot_data
-from transformers import T5Tokenizer, TFT5ForConditionalGeneration
+from utils.lazy_loader import LazyResource
+from utils.summarization_worker import SummarizationWorker
+from utils.hierarchical_summary import summarize_hierarchical
+from utils.inference_backend import backend_for, load_onnx_model, input_tensor_type
 import joblib
 
-# Load T5 model for summarization
+# T5 model for summarization, loaded on first use (transformers/TensorFlow are imported then too).
+# SUMMARY_INFERENCE_BACKEND=onnx or onnx-int8 serves it with ONNX Runtime instead
 T5_MODEL_PATH = 't5-small'
-t5_tokenizer = T5Tokenizer.from_pretrained(T5_MODEL_PATH)
-t5_model = TFT5ForConditionalGeneration.from_pretrained(T5_MODEL_PATH)
+
+
+def _load_t5():
+    backend = backend_for("summary")
+    if backend != "native":
+        return load_onnx_model(T5_MODEL_PATH, "seq2seq", quantized=backend == "onnx-int8")
+    from transformers import T5Tokenizer, TFT5ForConditionalGeneration
+    return T5Tokenizer.from_pretrained(T5_MODEL_PATH), TFT5ForConditionalGeneration.from_pretrained(T5_MODEL_PATH)
+
+
+t5 = LazyResource("T5 summarizer", _load_t5)
+
+
+def generate_summaries(texts, max_length=150, min_length=40):
+    """
+    Summarize a batch of prompted texts with one beam-search generate call.
+
+    Args:
+        texts (list[str]): Texts, each already prefixed with its prompt.
+        max_length (int): Maximum length of the summaries.
+        min_length (int): Minimum length of the summaries.
+
+    Returns:
+        list[str]: One summary per text.
+    """
+    t5_tokenizer, t5_model = t5.get()
+    inputs = t5_tokenizer(texts, return_tensors=input_tensor_type(t5_model), padding=True, max_length=512, truncation=True)
+    summary_ids = t5_model.generate(
+        inputs["input_ids"],
+        attention_mask=inputs["attention_mask"],
+        max_length=max_length,
+        min_length=min_length,
+        length_penalty=2.0,
+        num_beams=4,
+        early_stopping=True
+    )
+    return t5_tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+
+
+# Concurrent summarization requests are batched into shared generate calls and cached
+summarizer = SummarizationWorker(
+    generate_summaries,
+    batch_window_ms=float(os.environ.get('SUMMARY_BATCH_WINDOW_MS', 20)),
+    max_batch_size=int(os.environ.get('SUMMARY_MAX_BATCH_SIZE', 16)),
+    cache_entries=int(os.environ.get('SUMMARY_CACHE_ENTRIES', 1024))
+)
+
+
+def warm_up(summarizer=True, nlp_pipeline=False):
+    """
+    Load models ahead of the first request instead of on first use.
+
+    Args:
+        summarizer (bool): Load the T5 summarization model.
+        nlp_pipeline (bool): Train the FinGreen_NLP pipeline and load its transformer models.
+    """
+    if summarizer:
+        t5.get()
+    if nlp_pipeline:
+        FinGreen_NLP.warm_up()
 
 
 def predict_esg_scores(input_data):
@@ -28,7 +91,7 @@ def predict_esg_scores(input_data):
     try:
         # Preprocess the dataset
         preprocessed_data, year_columns = preprocess_dataset(input_data)
-        _, input_data_encoded = create_pivot_data(preprocessed_data, year_columns)
+        input_data_encoded = create_pivot_data(preprocessed_data)
 
         # Call ESG prediction logic
         predictions = nlp_predict_esg_scores(input_data_encoded)
@@ -59,10 +122,8 @@ def summarize_and_analyze_esg_results(text_data, prompt="summarize: ", max_lengt
         str: Summarized ESG results.
     """
     try:
-        # Tokenize and summarize using T5
-        input_ids = t5_tokenizer.encode(prompt + text_data, return_tensors="pt", max_length=512, truncation=True)
-        summary_ids = t5_model.generate(input_ids, max_length=max_length, min_length=min_length, length_penalty=2.0, num_beams=4, early_stopping=True)
-        summary = t5_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+        # Batched with concurrent requests and served from cache on repeats
+        summary = summarizer.summarize(text_data, prompt, max_length, min_length)
         print(f"Summary generated: {summary}")
         return summary
     except Exception as e:
@@ -70,12 +131,59 @@ def summarize_and_analyze_esg_results(text_data, prompt="summarize: ", max_lengt
         raise
 
 
+def summarize_long_esg_results(text_data, prompt="summarize: ", max_length=150, min_length=40):
+    """
+    Summarize ESG results longer than the T5 input window with map-reduce.
+
+    The text is split into token-bounded chunks whose summaries are summarized
+    again; all chunks of a round go through the batching summarizer together.
+
+    Args:
+        text_data (str or list[str]): Results text, or one sentence per project.
+        prompt (str): Prompt to guide the T5 model summarization.
+        max_length (int): Maximum length of each summary.
+        min_length (int): Minimum length of each summary.
+
+    Returns:
+        str: Summarized ESG results.
+        dict: Chunks per round, tokens processed and tokens per second.
+    """
+    def summarize_many(texts):
+        futures = [summarizer.submit(text, prompt, max_length, min_length) for text in texts]
+        return [future.result() for future in futures]
+
+    try:
+        t5_tokenizer, _ = t5.get()
+        return summarize_hierarchical(text_data, t5_tokenizer, summarize_many)
+    except Exception as e:
+        print(f"Error summarizing ESG results: {e}")
+        raise
+
+
+def classify_esg_texts(texts, batch_size=32, sort_by_length=True):
+    """
+    Classify texts as Environmental, Social or Governance by delegating to FinGreen_NLP.
+
+    Args:
+        texts (list[str]): Texts to classify.
+        batch_size (int): Texts per forward pass.
+        sort_by_length (bool): Batch texts of similar length together to reduce padding.
+
+    Yields:
+        dict: index, label and per-label scores of one text, in processing order.
+    """
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise ValueError("texts must be a list of strings.")
+    return nlp_classify_esg(texts, batch_size=batch_size, sort_by_length=sort_by_length)
+
+
 def allocate_budget_milp(data, budget, project_series="All Projects"):
     """
     Allocate budget using MILP by delegating to FinGreen_NLP.
 
     Args:
-        data (pd.DataFrame): Raw project data with ESG scores.
+        data (pd.DataFrame): Projects with "Series Name", "Predicted ESG Score",
+            "Risk Factor" and "Project Cost" columns.
         budget (float): Total budget for allocation.
         project_series (str): Optional filter for specific project series.
 
@@ -83,12 +191,8 @@ def allocate_budget_milp(data, budget, project_series="All Projects"):
         pd.DataFrame: Allocated projects with cost and ESG scores.
     """
     try:
-        # Preprocess and validate data
-        preprocessed_data, year_columns = preprocess_dataset(data)
-        pivot_data, _ = create_pivot_data(preprocessed_data, year_columns)
-
-        # Call FinGreen_NLP's MILP allocation logic
-        allocation_results = nlp_allocate_budget(pivot_data, budget, project_series)
+        # Call FinGreen_NLP's allocation logic on the projects with ESG scores
+        allocation_results = nlp_allocate_budget(budget, project_series, future_years=data)
 
         # Validate allocation results
         required_columns = ["Project Cost", "Predicted ESG Score", "Allocated Cost"]
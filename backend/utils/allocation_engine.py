@@ -0,0 +1,553 @@
+import time
+import bisect
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from pulp import (
+    LpProblem, LpMaximize, LpVariable, LpAffineExpression, LpStatus, LpSolutionOptimal, LpSolutionIntegerFeasible,
+    PULP_CBC_CMD
+)
+
+logger = logging.getLogger(__name__)
+
+# Largest DP table (items x budget units) solved exactly, stored as packed bits
+DP_MAX_CELLS = 400_000_000
+# Largest DP capacity in budget units; the value rows scale with it regardless of items
+DP_MAX_CAPACITY = 5_000_000
+# Nodes explored by branch and bound before returning the best solution found
+BNB_NODE_LIMIT = 2_000_000
+SOLVERS = ("auto", "dp", "branch_and_bound", "milp")
+STRATEGIES = ("greedy", "knapsack", "fractional")
+# Previous MILP solutions kept as warm starts, keyed by the project values and costs
+WARM_START_MAX_ENTRIES = 32
+
+_warm_starts = OrderedDict()
+_warm_starts_lock = threading.Lock()
+
+
+def solve_allocation(scores, costs, budget, risk=None, solver="auto", constraints=None,
+                     time_limit=None, gap=None, warm_start=False):
+    """
+    Select projects maximizing the risk-adjusted ESG score within a budget.
+
+    This is a 0/1 knapsack. With solver="auto", integer costs are solved exactly
+    with dynamic programming when the table fits in DP_MAX_CELLS, other inputs
+    with branch and bound, and the MILP solver is used only when extra
+    constraints are given.
+
+    Args:
+        scores (array-like): Predicted ESG score of each project.
+        costs (array-like): Cost of each project.
+        budget (float): Total budget.
+        risk (array-like): Optional risk factor of each project; scores are
+            weighted by (1 - risk).
+        solver (str): One of "auto", "dp", "branch_and_bound" or "milp".
+        constraints (list): Extra linear constraints as (coefficients, upper bound)
+            pairs, i.e. sum(coefficients * selected) <= upper bound, or as
+            (indices, coefficients, upper bound) for constraints on a few
+            projects only; see portfolio_constraints.
+        time_limit (float): MILP time limit in seconds; the best solution found
+            by then is returned, flagged as not proven optimal.
+        gap (float): Relative MIP gap at which the MILP solver stops.
+        warm_start (bool): Start the MILP from the last solution of the same
+            problem with another budget, when that solution is still feasible.
+
+    Returns:
+        dict: Boolean "selected" mask, "objective", "total_cost", "solver",
+            "optimal" flag and "solve_ms".
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unsupported solver: {solver}. Expected one of {SOLVERS}")
+
+    values = np.asarray(scores, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.float64)
+    if risk is not None:
+        values = values * (1 - np.asarray(risk, dtype=np.float64))
+    if values.shape != costs.shape:
+        raise ValueError("Scores and costs must have the same length.")
+    if np.any(costs < 0) or np.any(np.isnan(costs)) or np.any(np.isnan(values)):
+        raise ValueError("Costs must be non-negative and scores must not be missing.")
+
+    if solver == "auto":
+        solver = choose_solver(costs, budget, constraints)
+
+    start = time.perf_counter()
+    optimal = True
+    useful = values > 0
+    if not constraints and costs[useful].sum() <= budget:
+        # Every project with a positive value fits the budget
+        selected = useful
+    elif solver == "milp":
+        selected, optimal = knapsack_milp(
+            values, costs, budget, constraints, time_limit=time_limit, gap=gap, warm_start=warm_start
+        )
+    elif constraints:
+        raise ValueError(f"Solver '{solver}' does not support extra constraints, use 'milp'.")
+    elif solver == "dp":
+        selected = knapsack_dp(values, costs, budget)
+    else:
+        selected, optimal = knapsack_branch_and_bound(values, costs, budget)
+    solve_ms = (time.perf_counter() - start) * 1000
+
+    logger.info(f"Allocated {int(selected.sum())}/{len(values)} projects with {solver} in {solve_ms:.1f} ms")
+    return {
+        "selected": selected,
+        "objective": float(values[selected].sum()),
+        "total_cost": float(costs[selected].sum()),
+        "solver": solver,
+        "optimal": optimal,
+        "solve_ms": solve_ms,
+    }
+
+
+def solve_budget_sweep(scores, costs, budgets, risk=None, frontier_points=50):
+    """
+    Solve the same allocation for several budgets in one pass.
+
+    With integer costs a single DP table up to the largest budget already holds
+    the optimum for every smaller budget, so each scenario only needs a
+    backtrack and the efficient frontier is read straight from the table.
+    Otherwise every budget is solved separately.
+
+    Args:
+        scores (array-like): Predicted ESG score of each project.
+        costs (array-like): Cost of each project.
+        budgets (list): Budgets to solve for.
+        risk (array-like): Optional risk factor of each project.
+        frontier_points (int): Number of points on the frontier curve.
+
+    Returns:
+        list: One solve_allocation-style result per budget.
+        list: Frontier points as {"budget", "objective"} dicts.
+    """
+    values = np.asarray(scores, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.float64)
+    if risk is not None:
+        values = values * (1 - np.asarray(risk, dtype=np.float64))
+    max_budget = max(budgets)
+
+    if np.any(costs < 0) or np.any(np.isnan(costs)) or np.any(np.isnan(values)) \
+            or choose_solver(costs, max_budget) != "dp":
+        results = [solve_allocation(values, costs, budget) for budget in budgets]
+        frontier = sorted(
+            {(float(budget), result["objective"]) for budget, result in zip(budgets, results)}
+        )
+        return results, [{"budget": budget, "objective": objective} for budget, objective in frontier]
+
+    start = time.perf_counter()
+    best, keep, units, capacity = knapsack_dp_table(values, costs, max_budget)
+    scale = _cost_scale(costs)
+    table_ms = (time.perf_counter() - start) * 1000
+
+    results = []
+    for budget in budgets:
+        start = time.perf_counter()
+        # Budgets beyond the table capacity can afford every useful project
+        selected = backtrack_dp(keep, units, min(int(budget // scale), capacity), len(values))
+        results.append({
+            "selected": selected,
+            "objective": float(values[selected].sum()),
+            "total_cost": float(costs[selected].sum()),
+            "solver": "dp",
+            "optimal": True,
+            "solve_ms": (time.perf_counter() - start) * 1000,
+        })
+    logger.info(f"Solved {len(budgets)} budgets over {len(values)} projects from one DP table ({table_ms:.1f} ms)")
+
+    frontier_budgets = np.linspace(0, max_budget, max(2, frontier_points))
+    frontier_values = best[np.minimum(frontier_budgets // scale, capacity).astype(np.int64)]
+    frontier = [
+        {"budget": float(budget), "objective": float(objective)}
+        for budget, objective in zip(frontier_budgets, frontier_values)
+    ]
+    return results, frontier
+
+
+def allocate_greedy(values, costs, budget):
+    """
+    Greedy allocation by value per cost that skips projects which do not fit.
+
+    Unlike stopping at the first project over budget, cheaper projects further
+    down the ranking are still funded. Each round takes the longest affordable
+    prefix of the ranking with one cumulative sum, drops the project that did
+    not fit and everything that no longer fits the remaining budget.
+
+    Returns:
+        np.ndarray: Boolean mask of the selected projects.
+    """
+    selected = np.zeros(len(values), dtype=bool)
+    remaining = float(budget)
+    ratio = np.divide(values, costs, out=np.full(len(values), np.inf), where=costs > 0)
+    ranking = np.argsort(-ratio, kind="stable")
+    ranking = ranking[(values[ranking] > 0) & (costs[ranking] <= remaining)]
+    while len(ranking):
+        cumulative = np.cumsum(costs[ranking])
+        fits = cumulative <= remaining
+        k = len(ranking) if fits.all() else int(np.argmin(fits))
+        selected[ranking[:k]] = True
+        if k:
+            remaining -= cumulative[k - 1]
+        ranking = ranking[k + 1:]
+        ranking = ranking[costs[ranking] <= remaining]
+    return selected
+
+
+def allocate_fractional(values, costs, budget):
+    """
+    Fractional knapsack: fund projects by value per cost, the last one partially.
+
+    Returns:
+        np.ndarray: Funded fraction of each project between 0 and 1.
+    """
+    fractions = np.zeros(len(values))
+    ratio = np.divide(values, costs, out=np.full(len(values), np.inf), where=costs > 0)
+    ranking = np.argsort(-ratio, kind="stable")
+    ranking = ranking[values[ranking] > 0]
+    cumulative = np.cumsum(costs[ranking])
+    full = cumulative <= budget
+    fractions[ranking[full]] = 1.0
+    if not full.all():
+        k = int(np.argmin(full))
+        spent = cumulative[k - 1] if k else 0.0
+        fractions[ranking[k]] = (budget - spent) / costs[ranking[k]]
+    return fractions
+
+
+def choose_solver(costs, budget, constraints=None):
+    """Pick the fastest exact solver for an allocation problem."""
+    if constraints:
+        return "milp"
+    if len(costs) and np.all(costs == np.round(costs)):
+        scale = _cost_scale(costs)
+        capacity = int(min(budget, costs.sum()) // scale)
+        if capacity <= DP_MAX_CAPACITY and len(costs) * (capacity + 1) <= DP_MAX_CELLS:
+            return "dp"
+    return "branch_and_bound"
+
+
+def knapsack_dp(values, costs, budget):
+    """
+    Solve a 0/1 knapsack with integer costs exactly by dynamic programming.
+
+    Args:
+        values (np.ndarray): Value of each item.
+        costs (np.ndarray): Integer cost of each item.
+        budget (float): Capacity; rounded down to whole cost units.
+
+    Returns:
+        np.ndarray: Boolean mask of the selected items.
+    """
+    _, keep, units, capacity = knapsack_dp_table(values, costs, budget)
+    return backtrack_dp(keep, units, capacity, len(values))
+
+
+def knapsack_dp_table(values, costs, budget):
+    """
+    Fill the knapsack DP table for every capacity up to the budget.
+
+    Costs are divided by their greatest common divisor first to keep the
+    table small, and the capacity is capped at the total cost of the projects
+    with a positive value, which any larger budget affords anyway. best[b] is
+    the optimal value for a capacity of b units and keep holds, as packed bits
+    per item, whether the item is taken at b.
+
+    Returns:
+        np.ndarray: Best value for every capacity in units.
+        np.ndarray: Packed take decisions, one row per item.
+        np.ndarray: Item costs in units.
+        int: Capacity of the table in units, at most the budget.
+    """
+    scale = _cost_scale(costs)
+    units = np.round(costs / scale).astype(np.int64)
+    if budget < 0:
+        raise ValueError("Budget must be non-negative.")
+    capacity = int(min(budget // scale, units[values > 0].sum()))
+
+    best = np.zeros(capacity + 1)
+    keep = np.zeros((len(values), (capacity + 8) // 8), dtype=np.uint8)
+    for i in np.flatnonzero((values > 0) & (units <= capacity)):
+        cost = units[i]
+        candidate = best[:capacity + 1 - cost] + values[i]
+        better = candidate > best[cost:]
+        if not better.any():
+            continue
+        best[cost:] = np.where(better, candidate, best[cost:])
+        row = np.zeros(capacity + 1, dtype=bool)
+        row[cost:] = better
+        keep[i] = np.packbits(row)
+    return best, keep, units, capacity
+
+
+def backtrack_dp(keep, units, capacity, n_items):
+    """Recover the items selected at a given capacity from a DP table."""
+    selected = np.zeros(n_items, dtype=bool)
+    remaining = capacity
+    for i in range(n_items - 1, -1, -1):
+        if (keep[i, remaining >> 3] >> (7 - (remaining & 7))) & 1:
+            selected[i] = True
+            remaining -= units[i]
+    return selected
+
+
+def knapsack_branch_and_bound(values, costs, budget, node_limit=BNB_NODE_LIMIT):
+    """
+    Solve a 0/1 knapsack with real-valued costs by depth-first branch and bound.
+
+    Items are explored in decreasing value-per-cost order and pruned with the
+    fractional (Dantzig) upper bound. If node_limit is reached the best
+    solution found so far is returned and flagged as not proven optimal.
+
+    Returns:
+        np.ndarray: Boolean mask of the selected items.
+        bool: True if the solution is proven optimal.
+    """
+    selected = np.zeros(len(values), dtype=bool)
+
+    # Free items with a positive value are always taken, useless items never
+    free = (costs == 0) & (values > 0)
+    selected[free] = True
+    candidates = np.flatnonzero((values > 0) & (costs > 0) & (costs <= budget))
+    if len(candidates) == 0:
+        return selected, True
+
+    order = candidates[np.argsort(-values[candidates] / costs[candidates], kind="stable")]
+    v = values[order].tolist()
+    w = costs[order].tolist()
+    n = len(order)
+    prefix_value = np.concatenate([[0.0], np.cumsum(values[order])]).tolist()
+    prefix_cost = np.concatenate([[0.0], np.cumsum(costs[order])]).tolist()
+
+    def upper_bound(i, capacity, value):
+        # Take items i.. whole while they fit, then a fraction of the next one
+        k = bisect.bisect_right(prefix_cost, prefix_cost[i] + capacity, lo=i) - 1
+        bound = value + prefix_value[k] - prefix_value[i]
+        if k < n:
+            bound += (capacity - (prefix_cost[k] - prefix_cost[i])) * v[k] / w[k]
+        return bound
+
+    tolerance = 1e-9 * max(1.0, prefix_value[-1])
+    best_value, best_taken = -1.0, []
+    taken = []
+    i, capacity, value = 0, float(budget), 0.0
+    nodes = 0
+    optimal = True
+    while True:
+        nodes += 1
+        if nodes > node_limit:
+            optimal = False
+            break
+
+        if i < n and upper_bound(i, capacity, value) > best_value + tolerance:
+            # Forward move: take every following item that fits
+            k = bisect.bisect_right(prefix_cost, prefix_cost[i] + capacity, lo=i) - 1
+            if k > i:
+                taken.extend(range(i, k))
+                capacity -= prefix_cost[k] - prefix_cost[i]
+                value += prefix_value[k] - prefix_value[i]
+                i = k
+            if i < n:
+                # Item i does not fit, continue without it
+                i += 1
+                continue
+        if value > best_value:
+            best_value, best_taken = value, list(taken)
+
+        # Backtrack: drop the last taken item and explore the branch without it
+        if not taken:
+            break
+        j = taken.pop()
+        capacity += w[j]
+        value -= v[j]
+        i = j + 1
+
+    selected[order[best_taken]] = True
+    if not optimal:
+        logger.warning(f"Branch and bound stopped after {node_limit} nodes, solution may be suboptimal")
+    return selected, optimal
+
+
+def portfolio_constraints(costs, budget, risk=None, groups=None, max_share=None, max_average_risk=None,
+                          min_projects=0, min_per_group=None):
+    """
+    Build diversification constraints for solve_allocation.
+
+    Group constraints only involve the projects of their group, so the model
+    stays as sparse as the data: the members of every group are found with one
+    sort of the group codes instead of a mask per group.
+
+    Args:
+        costs (array-like): Cost of each project.
+        budget (float): Total budget; group caps are shares of it.
+        risk (array-like): Risk factor of each project, for max_average_risk.
+        groups (dict): Grouping name -> label of each project, e.g. {"country": [...]}.
+        max_share (dict): Grouping name -> largest share of the budget one group may take.
+        max_average_risk (float): Cap on the mean risk factor of the selected projects.
+        min_projects (int): Least number of projects to select.
+        min_per_group (dict): Grouping name -> least number of projects to select from every group.
+
+    Returns:
+        list: Constraints in the format of solve_allocation.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    groups, max_share, min_per_group = groups or {}, max_share or {}, min_per_group or {}
+    constraints = []
+    for name in set(max_share) | set(min_per_group):
+        if name not in groups:
+            raise ValueError(f"No '{name}' labels given for the projects.")
+        members = _group_members(groups[name])
+        if name in max_share:
+            cap = float(max_share[name]) * budget
+            for indices in members:
+                # A group that cannot exceed its cap needs no constraint
+                if costs[indices].sum() > cap:
+                    constraints.append((indices, costs[indices], cap))
+        if min_per_group.get(name):
+            for indices in members:
+                constraints.append((indices, -np.ones(len(indices)), -int(min_per_group[name])))
+
+    if max_average_risk is not None:
+        if risk is None:
+            raise ValueError("Risk factors are required for an average risk cap.")
+        # mean(risk of selected) <= cap  <=>  sum((risk - cap) * selected) <= 0
+        constraints.append((np.asarray(risk, dtype=np.float64) - max_average_risk, 0.0))
+    if min_projects:
+        constraints.append((-np.ones(len(costs)), -int(min_projects)))
+    return constraints
+
+
+def knapsack_milp(values, costs, budget, constraints=None, time_limit=None, gap=None, warm_start=False):
+    """
+    Solve the allocation as a MILP with PuLP/CBC, supporting extra constraints.
+
+    If CBC stops on the time limit before finding any feasible solution, the
+    warm start or the unconstrained knapsack solution is returned instead when
+    it satisfies the constraints.
+
+    Returns:
+        np.ndarray: Boolean mask of the selected items.
+        bool: True if CBC proved the solution optimal.
+
+    Raises:
+        ValueError: If the problem is infeasible, or no feasible solution was
+            found within the time limit.
+    """
+    constraints = [_as_sparse(constraint, len(values)) for constraint in constraints or []]
+    problem = LpProblem("ESG_Optimization", LpMaximize)
+    allocations = [LpVariable(f"Allocation_{i}", cat='Binary') for i in range(len(values))]
+
+    problem += LpAffineExpression(zip(allocations, values.tolist())), "Maximize ESG Impact Adjusted for Risk"
+    problem += LpAffineExpression(zip(allocations, costs.tolist())) <= budget, "Budget Constraint"
+    for k, (indices, coefficients, upper_bound) in enumerate(constraints):
+        terms = zip([allocations[i] for i in indices.tolist()], coefficients.tolist())
+        problem += LpAffineExpression(terms) <= upper_bound, f"Constraint_{k}"
+
+    key = _problem_key(values, costs) if warm_start else None
+    initial = _warm_start_for(key, costs, budget, constraints) if key else None
+    if initial is not None:
+        for var, value in zip(allocations, initial.tolist()):
+            var.setInitialValue(int(value))
+
+    problem.solve(PULP_CBC_CMD(msg=False, timeLimit=time_limit, gapRel=gap, warmStart=initial is not None))
+    status = LpStatus[problem.status]
+    if status not in ("Optimal", "Not Solved"):
+        raise ValueError(f"Allocation problem could not be solved: {status}")
+
+    # Without an incumbent the variables are unset or hold values of the relaxation
+    solution = [var.varValue for var in allocations]
+    if problem.sol_status in (LpSolutionOptimal, LpSolutionIntegerFeasible) and None not in solution:
+        selected = np.array([value > 0.5 for value in solution], dtype=bool)
+    else:
+        selected = _fallback_selection(values, costs, budget, constraints, initial)
+        if selected is None:
+            raise ValueError(
+                f"No feasible allocation found within the {time_limit}s time limit; "
+                "raise the time limit or relax the constraints."
+            )
+        logger.warning(f"MILP found no solution within {time_limit}s, using a feasible fallback allocation")
+    if key:
+        with _warm_starts_lock:
+            _warm_starts[key] = selected
+            _warm_starts.move_to_end(key)
+            while len(_warm_starts) > WARM_START_MAX_ENTRIES:
+                _warm_starts.popitem(last=False)
+    # Stopping on the time limit or the gap yields a feasible but unproven solution
+    return selected, status == "Optimal" and problem.sol_status == LpSolutionOptimal
+
+
+def _group_members(labels):
+    """Return the project indices of every group, from one stable sort of the group codes."""
+    _, codes = np.unique(np.asarray(labels).astype(str), return_inverse=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    return np.split(order, bounds)
+
+
+def _as_sparse(constraint, n_items):
+    """Normalize a constraint to (indices, coefficients, upper bound) without zero coefficients."""
+    if len(constraint) == 3:
+        indices, coefficients, upper_bound = constraint
+        indices = np.asarray(indices, dtype=np.int64)
+        coefficients = np.broadcast_to(np.asarray(coefficients, dtype=np.float64), indices.shape)
+    else:
+        coefficients, upper_bound = constraint
+        coefficients = np.broadcast_to(np.asarray(coefficients, dtype=np.float64), (n_items,))
+        indices = np.arange(n_items)
+    nonzero = coefficients != 0
+    return indices[nonzero], coefficients[nonzero], float(upper_bound)
+
+
+def _problem_key(values, costs):
+    """
+    Hash the projects of an allocation problem.
+
+    The budget and the constraints are left out: the constraint set changes
+    with the budget (share caps scale with it), and a previous solution is
+    only used after checking it against the current ones.
+    """
+    digest = hashlib.sha1(values.tobytes())
+    digest.update(costs.tobytes())
+    return digest.hexdigest()
+
+
+def _warm_start_for(key, costs, budget, constraints):
+    """Return the last solution of the problem if it satisfies the budget and constraints, else None."""
+    with _warm_starts_lock:
+        previous = _warm_starts.get(key)
+    if previous is None or not _feasible(previous, costs, budget, constraints):
+        return None
+    return previous
+
+
+def _feasible(selected, costs, budget, constraints):
+    """Return True if a selection satisfies the budget and the sparse constraints."""
+    if costs[selected].sum() > budget:
+        return False
+    return all(
+        coefficients[selected[indices]].sum() <= upper_bound + 1e-9
+        for indices, coefficients, upper_bound in constraints
+    )
+
+
+def _fallback_selection(values, costs, budget, constraints, initial=None):
+    """
+    Return the best feasible selection among the warm start and the unconstrained
+    knapsack solution, or None if neither satisfies the constraints.
+    """
+    if choose_solver(costs, budget) == "dp":
+        unconstrained = knapsack_dp(values, costs, budget)
+    else:
+        unconstrained, _ = knapsack_branch_and_bound(values, costs, budget)
+    candidates = [
+        selected for selected in (initial, unconstrained)
+        if selected is not None and _feasible(selected, costs, budget, constraints)
+    ]
+    return max(candidates, key=lambda selected: values[selected].sum(), default=None)
+
+
+def _cost_scale(costs):
+    """Greatest common divisor of integer costs (1 if there are none)."""
+    integer_costs = costs[costs > 0].astype(np.int64)
+    scale = int(np.gcd.reduce(integer_costs)) if len(integer_costs) else 1
+    return max(scale, 1)
@@ -1,24 +1,14 @@
-from pulp import LpProblem, LpMaximize, LpVariable, lpSum
+import numpy as np
+from utils.allocation_engine import solve_allocation
 
-def allocate_budget(projects, budget):
-    # Filter projects and convert to DataFrame if necessary
-    problem = LpProblem("ESG_Optimization", LpMaximize)
-    allocations = LpVariable.dicts("Allocation", range(len(projects)), 0, 1, cat='Binary')
+def allocate_budget(projects, budget, solver="auto"):
+    # Gather scores, risks and costs into arrays for the allocation engine
+    scores = np.fromiter((project['Predicted ESG Score'] for project in projects), dtype=np.float64, count=len(projects))
+    risk = np.fromiter((project['Risk Factor'] for project in projects), dtype=np.float64, count=len(projects))
+    costs = np.fromiter((project['Project Cost'] for project in projects), dtype=np.float64, count=len(projects))
 
-    # Objective
-    problem += lpSum([
-        project['Predicted ESG Score'] * (1 - project['Risk Factor']) * allocations[i]
-        for i, project in enumerate(projects)
-    ])
-
-    # Budget constraint
-    problem += lpSum([
-        project['Project Cost'] * allocations[i]
-        for i, project in enumerate(projects)
-    ]) <= budget
-
-    problem.solve()
+    result = solve_allocation(scores, costs, budget, risk=risk, solver=solver)
 
     # Return allocated projects
-    allocated = [projects[i] for i in range(len(projects)) if allocations[i].varValue == 1]
+    allocated = [projects[i] for i in np.flatnonzero(result["selected"])]
     return allocated
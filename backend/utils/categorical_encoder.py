@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+ENCODING_MODES = ("onehot", "ordinal")
+
+
+class CategoricalEncoder:
+    """
+    Encode categorical columns with a vocabulary fixed at fit time.
+
+    "onehot" emits a scipy.sparse CSR matrix with one column per category,
+    "ordinal" a float32 matrix of category codes with NaN for unknown values.
+    The encoder is saved with the models it was fitted for, so predictions
+    reuse the training columns however few categories the input contains;
+    categories not seen at fit time encode as all-zero (onehot) or NaN (ordinal).
+    """
+
+    def __init__(self, columns, mode="onehot"):
+        if mode not in ENCODING_MODES:
+            raise ValueError(f"Unknown encoding mode '{mode}', expected one of {ENCODING_MODES}")
+        self.columns = list(columns)
+        self.mode = mode
+        self.vocabulary = None
+
+    def fit(self, frame):
+        """Record the sorted categories of every column."""
+        self.vocabulary = {col: sorted(map(str, pd.unique(frame[col].dropna()))) for col in self.columns}
+        return self
+
+    def transform(self, frame):
+        """
+        Encode the columns of a frame.
+
+        Returns:
+            scipy.sparse.csr_matrix or np.ndarray: (rows x features) matrix.
+        """
+        if self.vocabulary is None:
+            raise ValueError("CategoricalEncoder must be fitted before transform.")
+        codes = [self._codes(frame[col], self.vocabulary[col]) for col in self.columns]
+
+        if self.mode == "ordinal":
+            matrix = np.column_stack(codes).astype(np.float32) if codes else np.empty((len(frame), 0), np.float32)
+            matrix[matrix < 0] = np.nan
+            return matrix
+
+        rows, columns, offset = [], [], 0
+        for col, col_codes in zip(self.columns, codes):
+            known = col_codes >= 0
+            rows.append(np.flatnonzero(known))
+            columns.append(col_codes[known] + offset)
+            offset += len(self.vocabulary[col])
+        rows, columns = np.concatenate(rows), np.concatenate(columns)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)), shape=(len(frame), offset)
+        )
+
+    def fit_transform(self, frame):
+        return self.fit(frame).transform(frame)
+
+    def feature_names(self):
+        """Return the names of the encoded columns, "<column>_<category>" for one-hot."""
+        if self.mode == "ordinal":
+            return list(self.columns)
+        return [f"{col}_{category}" for col in self.columns for category in self.vocabulary[col]]
+
+    def to_dict(self):
+        """Return the encoder settings and vocabulary as plain JSON-serializable data."""
+        return {"columns": self.columns, "mode": self.mode, "vocabulary": self.vocabulary}
+
+    @classmethod
+    def from_dict(cls, data):
+        encoder = cls(data["columns"], data["mode"])
+        encoder.vocabulary = {col: list(categories) for col, categories in data["vocabulary"].items()}
+        return encoder
+
+    @staticmethod
+    def _codes(values, categories):
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(str)
+        elif not all(isinstance(category, str) for category in values.cat.categories):
+            values = values.astype(str)
+        return pd.Categorical(values, categories=categories).codes.astype(np.int64)
@@ -0,0 +1,178 @@
+import os
+import hashlib
+import threading
+import logging
+import numpy as np
+import pandas as pd
+from utils.data_processor import extract_year_values, preprocess_dataset
+from utils.dataset_store import ChunkedDatasetWriter
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+INGEST_CHUNK_ROWS = 100_000
+MEDIAN_SAMPLE_SIZE = 100_000
+MAX_PROGRESS_RECORDS = 100
+
+# Progress of the most recent ingestions, keyed by upload ID
+_progress = {}
+_progress_lock = threading.Lock()
+
+
+def spill_upload(stream, path, chunk_size=UPLOAD_CHUNK_BYTES):
+    """
+    Copy an upload stream to disk in fixed-size chunks, hashing it on the way.
+
+    Args:
+        stream: Readable binary stream (uploaded file or raw request body).
+        path (str): Destination file.
+        chunk_size (int): Number of bytes read per chunk.
+
+    Returns:
+        int: Number of bytes written.
+        str: SHA-256 hex digest of the bytes.
+    """
+    written = 0
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            out.write(chunk)
+            digest.update(chunk)
+            written += len(chunk)
+    return written, digest.hexdigest()
+
+
+class StreamingMedian:
+    """
+    Approximate per-column medians over a stream of value matrices.
+
+    Keeps a uniform random sample of at most sample_size non-missing values per
+    column (the values with the smallest random priorities seen so far), so
+    memory stays constant no matter how many rows are fed in.
+    """
+
+    def __init__(self, columns, sample_size=MEDIAN_SAMPLE_SIZE, seed=42):
+        self.columns = list(columns)
+        self.sample_size = sample_size
+        self._rng = np.random.default_rng(seed)
+        self._values = [np.empty(0, dtype=np.float32) for _ in self.columns]
+        self._priorities = [np.empty(0) for _ in self.columns]
+
+    def update(self, values):
+        """Feed a (rows x columns) float matrix; NaNs are ignored."""
+        for i in range(len(self.columns)):
+            column = values[:, i]
+            column = column[~np.isnan(column)]
+            merged_values = np.concatenate([self._values[i], column])
+            merged_priorities = np.concatenate([self._priorities[i], self._rng.random(len(column))])
+            if len(merged_values) > self.sample_size:
+                selected = np.argpartition(merged_priorities, self.sample_size)[:self.sample_size]
+                merged_values, merged_priorities = merged_values[selected], merged_priorities[selected]
+            self._values[i], self._priorities[i] = merged_values, merged_priorities
+
+    def medians(self):
+        """Return the estimated median of every column."""
+        return {
+            col: float(np.median(values)) if len(values) else np.nan
+            for col, values in zip(self.columns, self._values)
+        }
+
+
+def ingest_csv_in_chunks(raw_path, folder, name, upload_id=None, storage_format=None,
+                         chunk_rows=INGEST_CHUNK_ROWS, sample_size=MEDIAN_SAMPLE_SIZE):
+    """
+    Preprocess a spilled CSV upload in chunks with flat memory usage.
+
+    The first pass over the file estimates the year-column medians from a
+    bounded sample, the second pass runs preprocess_dataset on every chunk with
+    those medians and appends the result to the dataset file. On any error the
+    partial file is deleted and the progress is reported as "failed".
+
+    Args:
+        raw_path (str): Spilled raw CSV file.
+        folder (str): Directory for the preprocessed dataset.
+        name (str): File name of the preprocessed dataset, without extension.
+        upload_id (str): Key under which progress is reported.
+        storage_format (str): Storage format passed to the dataset writer.
+        chunk_rows (int): Rows per chunk.
+        sample_size (int): Values sampled per column for the median estimates.
+
+    Returns:
+        dict: Path of the preprocessed dataset, final row count, chunk count and year columns.
+    """
+    upload_id = upload_id or name
+    total_bytes = os.path.getsize(raw_path)
+    try:
+        estimator, raw_rows, chunks, writer = _ingest(raw_path, folder, name, upload_id, storage_format,
+                                                      chunk_rows, sample_size, total_bytes)
+    except Exception as e:
+        _report(upload_id, "failed", 0, total_bytes, 0, error=str(e))
+        raise
+
+    _report(upload_id, "done", total_bytes, total_bytes, writer.rows)
+    logger.info(f"Ingested {raw_rows} rows in {chunks} chunks, {writer.rows} rows kept")
+    return {"path": writer.path, "rows": writer.rows, "chunks": chunks, "year_columns": estimator.columns}
+
+
+def _ingest(raw_path, folder, name, upload_id, storage_format, chunk_rows, sample_size, total_bytes):
+    # Pass 1: estimate medians over the kept rows
+    estimator = None
+    raw_rows = 0
+    for chunk, position in _read_chunks(raw_path, chunk_rows):
+        _, year_columns, values, _ = extract_year_values(chunk)
+        if estimator is None:
+            estimator = StreamingMedian(year_columns, sample_size)
+        estimator.update(values)
+        raw_rows += len(chunk)
+        _report(upload_id, "estimating_medians", position, total_bytes, raw_rows)
+
+    if estimator is None:
+        raise ValueError("The uploaded dataset is empty.")
+    year_medians = estimator.medians()
+
+    # Pass 2: preprocess each chunk and append it to the dataset file, which is
+    # only moved to its final name if every chunk succeeded
+    chunks = 0
+    with ChunkedDatasetWriter(folder, name, storage_format) as writer:
+        for chunk, position in _read_chunks(raw_path, chunk_rows):
+            preprocessed_chunk, _ = preprocess_dataset(chunk, year_medians=year_medians)
+            if not preprocessed_chunk.empty:
+                writer.write(preprocessed_chunk)
+            chunks += 1
+            _report(upload_id, "preprocessing", position, total_bytes, writer.rows)
+        if writer.rows == 0:
+            raise ValueError("The preprocessed dataset is empty. Check your input data and preprocessing logic.")
+    return estimator, raw_rows, chunks, writer
+
+
+def get_progress(upload_id):
+    """Return the latest progress report of an ingestion, or None."""
+    with _progress_lock:
+        progress = _progress.get(upload_id)
+        return dict(progress) if progress else None
+
+
+def _read_chunks(path, chunk_rows):
+    """Yield CSV chunks together with the byte offset reached in the file."""
+    with open(path, 'rb') as handle:
+        for chunk in pd.read_csv(handle, chunksize=chunk_rows, skipinitialspace=True):
+            yield chunk, handle.tell()
+
+
+def _report(upload_id, stage, bytes_done, bytes_total, rows, error=None):
+    with _progress_lock:
+        _progress[upload_id] = {
+            "stage": stage,
+            "bytes_done": bytes_done,
+            "bytes_total": bytes_total,
+            "percent": round(100.0 * bytes_done / bytes_total, 1) if bytes_total else 100.0,
+            "rows": rows,
+        }
+        if error is not None:
+            _progress[upload_id]["error"] = error
+        while len(_progress) > MAX_PROGRESS_RECORDS:
+            _progress.pop(next(iter(_progress)))
+    logger.debug(f"Ingestion {upload_id}: {stage} {bytes_done}/{bytes_total} bytes, {rows} rows")
@@ -1,63 +1,152 @@
 import pandas as pd
 import numpy as np
 
+KEY_COLUMNS = ["CountryName", "SeriesName"]
+# Missing Cost/RiskFactor values are filled with pseudo-random values hashed from the
+# project keys, so every upload (and every chunk) of a project gets the same values
+COST_FILL_KEY = "esg-cost-fill-v1"
+RISK_FILL_KEY = "esg-risk-fill-v1"
 
-def preprocess_dataset(dataset):
-    try:
-        # Standardize column names
-        dataset.columns = [
-            col.strip().replace("[", "").replace("]", "").replace(" ", "") for col in dataset.columns
-        ]
-
-        # Fix year column naming: e.g., "2004[YR2004]" -> "YR2020"
-        dataset.columns = [
-            f"YR{col[-4:]}" if col[-4:].isdigit() and "YR" in col else col for col in dataset.columns
-        ]
-
-        # Detect year columns dynamically
-        year_columns = [col for col in dataset.columns if "YR" in col]
-        if not year_columns:
-            raise ValueError("No valid year columns found (e.g., YR2020). Ensure dataset format is correct.")
-
-        # Ensure required columns are present
-        required_columns = ["CountryName", "SeriesName"] + year_columns
-        missing_columns = [col for col in required_columns if col not in dataset.columns]
-        if missing_columns:
-            raise ValueError(f"Dataset is missing required columns: {missing_columns}")
 
-        # Handle missing or invalid "Cost" column
-        if "Cost" not in dataset.columns:
-            dataset["Cost"] = np.random.randint(20, 81, size=len(dataset))
-        else:
-            dataset["Cost"] = dataset["Cost"].fillna(np.random.randint(20, 81, size=len(dataset)))
+def normalize_column_names(columns):
+    """
+    Standardize raw column names in a single vectorized pass.
+
+    Brackets and spaces are removed and World Bank year headers are collapsed,
+    e.g. "2004 [YR2004]" -> "YR2004".
 
-        # Handle missing or invalid "RiskFactor" column
-        if "RiskFactor" not in dataset.columns:
-            dataset["RiskFactor"] = np.random.uniform(0.1, 0.5, size=len(dataset))
-        else:
-            dataset["RiskFactor"] = dataset["RiskFactor"].fillna(np.random.uniform(0.1, 0.5, size=len(dataset)))
+    Args:
+        columns (Iterable): Raw column names.
+
+    Returns:
+        pd.Index: Normalized column names.
+    """
+    columns = pd.Index(columns).astype(str).str.strip().str.replace(r"[\[\] ]", "", regex=True)
+    return columns.str.replace(r"^(?=.*YR).*(\d{4})$", r"YR\1", regex=True)
+
+
+def extract_year_values(dataset):
+    """
+    Validate a raw dataset and extract its year values as a float32 matrix.
+
+    Args:
+        dataset (pd.DataFrame): Raw dataset.
+
+    Returns:
+        dict: Normalized-to-raw column name mapping.
+        list: Detected year columns.
+        np.ndarray: Year values of the kept rows.
+        np.ndarray: Boolean mask of rows that are not all 0 or all NaN.
+    """
+    # Map normalized names back to the raw columns so only the needed ones are copied
+    columns = normalize_column_names(dataset.columns)
+    source_columns = dict(zip(columns, dataset.columns))
+
+    # Detect year columns dynamically
+    year_columns = [col for col in columns if "YR" in col]
+    if not year_columns:
+        raise ValueError("No valid year columns found (e.g., YR2020). Ensure dataset format is correct.")
+
+    # Ensure required columns are present
+    required_columns = KEY_COLUMNS + year_columns
+    missing_columns = [col for col in required_columns if col not in source_columns]
+    if missing_columns:
+        raise ValueError(f"Dataset is missing required columns: {missing_columns}")
+
+    # Coerce all year columns at once; World Bank exports use ".." for missing values
+    years = dataset[[source_columns[col] for col in year_columns]]
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in years.dtypes):
+        years = years.apply(pd.to_numeric, errors="coerce")
+    values = years.to_numpy(dtype=np.float32)
+
+    # Drop rows with all year values as 0 or NaN
+    keep = ~((values == 0).all(axis=1) | np.isnan(values).all(axis=1))
+    return source_columns, year_columns, values[keep], keep
+
+
+def preprocess_dataset(dataset, year_medians=None):
+    """
+    Clean a raw ESG dataset for prediction.
 
-        # Drop rows with all year values as 0 or NaN
-        dataset = dataset[required_columns + ["Cost", "RiskFactor"]]
-        dataset = dataset.loc[~(dataset[year_columns].eq(0).all(axis=1) | dataset[year_columns].isna().all(axis=1))]
+    Rows whose year values are all 0 or all missing are dropped, remaining gaps
+    are filled with the per-year medians, year columns are stored as float32
+    and the country/series keys as categoricals. Missing Cost and RiskFactor
+    values are filled with values derived from each project's keys, so
+    re-uploading a file yields the same frame. The input frame is not modified.
 
-        # Fill missing values for year columns with column medians
-        for col in year_columns:
-            dataset[col].fillna(dataset[col].median(), inplace=True)
+    Args:
+        dataset (pd.DataFrame): Raw dataset.
+        year_medians (dict): Optional medians to fill with instead of the ones of
+            this frame, e.g. estimates over a whole file processed in chunks.
 
+    Returns:
+        pd.DataFrame: Preprocessed dataset.
+        list: Detected year columns.
+    """
+    try:
+        source_columns, year_columns, values, keep = extract_year_values(dataset)
+        index = dataset.index[keep]
+        years = pd.DataFrame(values, columns=year_columns, index=index)
+
+        # Fill missing values for all year columns with their medians in one call
+        years = years.fillna(years.median() if year_medians is None else year_medians)
+
+        keys = pd.DataFrame(
+            {col: dataset[source_columns[col]].to_numpy()[keep] for col in KEY_COLUMNS}, index=index
+        ).astype("category")
+
+        # Handle missing or invalid "Cost" and "RiskFactor" columns
+        extras = pd.DataFrame({
+            "Cost": _fill_with_random(dataset, source_columns.get("Cost"), keep,
+                                      (20 + np.floor(61 * _key_uniform(keys, COST_FILL_KEY))).astype(np.int64)),
+            "RiskFactor": _fill_with_random(dataset, source_columns.get("RiskFactor"), keep,
+                                            0.1 + 0.4 * _key_uniform(keys, RISK_FILL_KEY)).astype(np.float32),
+        }, index=index)
+
+        dataset = pd.concat([keys, years, extras], axis=1)
         return dataset, year_columns
     except Exception as e:
         print(f"Error in preprocessing dataset: {e}")
         raise
 
 
-def create_pivot_data(dataset, year_column='YR2020'):
+def preprocess_csv(file_path):
+    """
+    Read a raw ESG dataset from a CSV file and preprocess it.
+
+    A module-level function so servers can run it in a worker process.
+
+    Returns:
+        pd.DataFrame: Preprocessed dataset.
+        list: Detected year columns.
+    """
+    return preprocess_dataset(pd.read_csv(file_path))
+
+
+def _key_uniform(keys, hash_key):
+    """Return a pseudo-random number in [0, 1) per row, derived from its country and series."""
+    hashes = pd.util.hash_pandas_object(keys.astype(str), index=False, hash_key=hash_key).to_numpy()
+    return (hashes >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _fill_with_random(dataset, column, keep, random_values):
+    """Return the kept values of a column with gaps (or the whole column, if absent) filled with random_values."""
+    if column is None:
+        return random_values
+    values = pd.to_numeric(dataset[column], errors="coerce").to_numpy(dtype=np.float64)[keep]
+    return np.where(np.isnan(values), random_values, values)
+
+
+def create_pivot_data(dataset, year_column='YR2020', encode=True):
     """
     Create pivoted data structure for machine learning model training.
 
     Args:
         dataset (pd.DataFrame): Preprocessed dataset.
         year_column (str): The year column to use for pivoting.
+        encode (bool): One-hot encode the country/series keys. Models trained
+            through utils.model_store encode the keys themselves with their
+            saved vocabulary and take the unencoded pivot.
 
     Returns:
         pd.DataFrame: Pivoted dataset ready for ML input.
@@ -73,12 +162,18 @@ def create_pivot_data(dataset, year_column='YR2020'):
 
         # Pivot data to wide format
         pivot_data = dataset.pivot_table(
-            index=['CountryName', 'SeriesName'],
-            values=year_column
+            index=KEY_COLUMNS,
+            values=year_column,
+            observed=True
         ).reset_index()
 
+        # Drop categories that were filtered out so they do not become empty dummy columns
+        for col in KEY_COLUMNS:
+            if isinstance(pivot_data[col].dtype, pd.CategoricalDtype):
+                pivot_data[col] = pivot_data[col].cat.remove_unused_categories()
+
         # One-hot encode categorical features
-        pivot_data_encoded = encode_categorical_features(pivot_data, ['CountryName', 'SeriesName'])
+        pivot_data_encoded = encode_categorical_features(pivot_data, KEY_COLUMNS) if encode else pivot_data
         print(f"Pivot data created:\n{pivot_data_encoded.head()}")
 
         if pivot_data_encoded.empty:
@@ -89,6 +184,23 @@ def create_pivot_data(dataset, year_column='YR2020'):
         print(f"Error in creating pivot data: {e}")
         raise
 
+def coerce_dataset_dtypes(dataset):
+    """
+    Cast a preprocessed dataset to compact typed columns.
+
+    Args:
+        dataset (pd.DataFrame): Preprocessed dataset.
+
+    Returns:
+        pd.DataFrame: Dataset with categorical keys and float32 year/risk columns.
+    """
+    dtypes = {col: "float32" for col in dataset.columns if "YR" in col}
+    dtypes.update({col: "category" for col in KEY_COLUMNS if col in dataset.columns})
+    if "RiskFactor" in dataset.columns:
+        dtypes["RiskFactor"] = "float32"
+    return dataset.astype(dtypes)
+
+
 def encode_categorical_features(dataframe, categorical_columns):
     """
     Encode categorical features into one-hot representations.
@@ -0,0 +1,301 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+import pandas as pd
+from utils.data_processor import coerce_dataset_dtypes
+from utils.dataset_store import load_dataset, dataset_columns, find_dataset_file, file_fingerprint, STORAGE_FORMATS
+from utils.row_index import RowIndex, INDEXED_COLUMNS, row_index_path
+
+logger = logging.getLogger(__name__)
+
+PREPROCESSED_PREFIX = 'preprocessed_dataset_'
+
+
+class _DatasetEntry:
+    """A cached dataset frame together with the file state it was loaded from."""
+
+    def __init__(self, dataset_id, path, frame, mtime, complete=True):
+        self.dataset_id = dataset_id
+        self.path = path
+        self.mtime = mtime
+        self.set_frame(frame, complete)
+
+    def set_frame(self, frame, complete):
+        # complete is False while only a projection of the stored columns is cached
+        self.frame = frame
+        self.complete = complete
+        self.nbytes = int(frame.memory_usage(deep=True).sum())
+
+    def covers(self, columns):
+        if columns is None:
+            return self.complete
+        return all(col in self.frame.columns for col in columns)
+
+
+class DatasetRegistry:
+    """
+    In-memory registry of preprocessed datasets keyed by dataset ID.
+
+    Frames are kept with typed dtypes and evicted least-recently-used first
+    once either the entry count or the byte budget is exceeded. A cached frame
+    is reloaded from disk only when the modification time of its file changes.
+    Column projections are cached too: a lookup for a subset of columns only
+    reads those columns, and later lookups load the missing ones on demand.
+    With an UploadIndex, the latest dataset and dataset files are looked up in
+    the index; the upload folder is only scanned for datasets it does not know.
+    Each dataset also gets a RowIndex of its series and countries, saved next
+    to the dataset file, so filtered lookups slice rows instead of scanning.
+    """
+
+    def __init__(self, upload_folder, max_entries=8, max_bytes=512 * 1024 * 1024, loader=None, index=None):
+        self.upload_folder = upload_folder
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.loader = loader or load_dataset
+        self.index = index
+        self._entries = OrderedDict()
+        self._paths = {}
+        self._fingerprints = {}
+        self._row_indexes = {}
+        self._latest_id = None
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "misses": 0, "reloads": 0, "evictions": 0}
+
+    def register(self, dataset_id, path, frame):
+        """
+        Register a freshly preprocessed dataset and mark it as the latest one.
+
+        Args:
+            dataset_id (str): Identifier of the dataset.
+            path (str): File the dataset was persisted to.
+            frame (pd.DataFrame): Preprocessed dataset.
+
+        Returns:
+            pd.DataFrame: The typed frame held by the registry.
+        """
+        frame = coerce_dataset_dtypes(frame)
+        row_index = RowIndex.from_frame(frame)
+        row_index.save(row_index_path(path))
+        with self._lock:
+            mtime = os.path.getmtime(path)
+            self._paths[dataset_id] = path
+            self._store(_DatasetEntry(dataset_id, path, frame, mtime))
+            self._row_indexes[dataset_id] = ((path, mtime), row_index)
+            self._latest_id = dataset_id
+        logger.info(f"Dataset {dataset_id} registered ({len(frame)} rows)")
+        return frame
+
+    def add(self, dataset_id, path):
+        """
+        Record a dataset file as the latest one without loading it.
+
+        Used for datasets that were written in chunks; the frame (or only the
+        columns an endpoint needs) is loaded on first use.
+
+        Args:
+            dataset_id (str): Identifier of the dataset.
+            path (str): File the dataset was persisted to.
+        """
+        with self._lock:
+            if self._paths.get(dataset_id) != path:
+                self._entries.pop(dataset_id, None)
+            self._paths[dataset_id] = path
+            self._latest_id = dataset_id
+
+    def remove(self, dataset_id):
+        """Forget a dataset whose files were deleted."""
+        with self._lock:
+            self._entries.pop(dataset_id, None)
+            self._paths.pop(dataset_id, None)
+            self._fingerprints.pop(dataset_id, None)
+            self._row_indexes.pop(dataset_id, None)
+            if self._latest_id == dataset_id:
+                self._latest_id = None
+
+    def get(self, dataset_id=None, columns=None, rows=None):
+        """
+        Fetch a dataset, loading it from disk on a miss or when its file changed.
+
+        Args:
+            dataset_id (str): Identifier of the dataset, defaults to the latest upload.
+            columns (list): Optional subset of columns to return.
+            rows (np.ndarray): Optional row offsets to return, see row_index().
+
+        Returns:
+            pd.DataFrame: The requested dataset.
+        """
+        with self._lock:
+            if dataset_id is None:
+                dataset_id = self.latest_id()
+            path = self._resolve_path(dataset_id)
+            mtime = os.path.getmtime(path)
+
+            entry = self._entries.get(dataset_id)
+            if entry is not None and entry.mtime != mtime:
+                self._stats["reloads"] += 1
+                logger.info(f"Dataset {dataset_id} changed on disk, reloading")
+                entry = None
+            elif entry is not None and entry.covers(columns):
+                self._entries.move_to_end(dataset_id)
+                self._stats["hits"] += 1
+            else:
+                self._stats["misses"] += 1
+
+            if entry is None:
+                entry = _DatasetEntry(dataset_id, path, self._load(path, columns), mtime, complete=columns is None)
+                self._store(entry)
+            elif not entry.covers(columns):
+                wanted = columns if columns is not None else dataset_columns(path)
+                missing = [col for col in wanted if col not in entry.frame.columns]
+                frame = pd.concat([entry.frame, self._load(path, missing)], axis=1)
+                entry.set_frame(frame, complete=entry.complete or columns is None)
+                self._store(entry)
+
+            frame = entry.frame
+
+        if columns is not None:
+            missing_columns = [col for col in columns if col not in frame.columns]
+            if missing_columns:
+                raise ValueError(f"Dataset is missing required columns: {missing_columns}")
+            frame = frame[columns]
+        if rows is not None:
+            frame = frame.take(rows)
+        return frame
+
+    def row_index(self, dataset_id=None):
+        """
+        Return the series/country row index of a dataset.
+
+        The index saved next to the dataset file is used while it is newer than
+        the file; otherwise it is rebuilt from the key columns and saved again.
+
+        Args:
+            dataset_id (str): Identifier of the dataset, defaults to the latest upload.
+
+        Returns:
+            RowIndex: Row offsets per series and country.
+        """
+        with self._lock:
+            if dataset_id is None:
+                dataset_id = self.latest_id()
+            path = self._resolve_path(dataset_id)
+            version = (path, os.path.getmtime(path))
+            cached = self._row_indexes.get(dataset_id)
+            if cached is None or cached[0] != version:
+                index_path = row_index_path(path)
+                if os.path.exists(index_path) and os.path.getmtime(index_path) >= version[1]:
+                    row_index = RowIndex.load(index_path)
+                else:
+                    key_columns = [col for col in INDEXED_COLUMNS if col in dataset_columns(path)]
+                    row_index = RowIndex.from_frame(self.get(dataset_id, columns=key_columns))
+                    row_index.save(index_path)
+                    logger.info(f"Row index of dataset {dataset_id} saved at: {index_path}")
+                cached = (version, row_index)
+                self._row_indexes[dataset_id] = cached
+            return cached[1]
+
+    def latest_id(self):
+        """Return the ID of the most recent dataset, from the index or scanning the upload folder once."""
+        with self._lock:
+            if self._latest_id is None and self.index is not None:
+                self._latest_id = self.index.latest_id()
+            if self._latest_id is None:
+                latest_file = find_latest_dataset(self.upload_folder)
+                if latest_file is None:
+                    raise FileNotFoundError("No preprocessed dataset found. Please upload a dataset first.")
+                self._latest_id = dataset_id_from_path(latest_file)
+                self._paths[self._latest_id] = latest_file
+            return self._latest_id
+
+    def dataset_path(self, dataset_id):
+        """Return the file backing a dataset."""
+        with self._lock:
+            return self._resolve_path(dataset_id)
+
+    def fingerprint(self, dataset_id=None):
+        """
+        Return a content hash of a dataset file, computed once per file version.
+
+        Args:
+            dataset_id (str): Identifier of the dataset, defaults to the latest upload.
+
+        Returns:
+            str: SHA-256 hex digest of the stored dataset.
+        """
+        with self._lock:
+            if dataset_id is None:
+                dataset_id = self.latest_id()
+            path = self._resolve_path(dataset_id)
+            version = (path, os.path.getmtime(path))
+            cached = self._fingerprints.get(dataset_id)
+            if cached is None or cached[0] != version:
+                cached = (version, file_fingerprint(path))
+                self._fingerprints[dataset_id] = cached
+            return cached[1]
+
+    def stats(self):
+        """Return hit/miss counters and current memory usage."""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"] + self._stats["reloads"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": sum(entry.nbytes for entry in self._entries.values()),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "latest_id": self._latest_id,
+            }
+
+    def _load(self, path, columns):
+        frame = coerce_dataset_dtypes(self.loader(path, columns))
+        if columns is not None:
+            missing_columns = [col for col in columns if col not in frame.columns]
+            if missing_columns:
+                raise ValueError(f"Dataset is missing required columns: {missing_columns}")
+        return frame
+
+    def _resolve_path(self, dataset_id):
+        path = self._paths.get(dataset_id)
+        if path is None and self.index is not None:
+            path = self.index.dataset_path(dataset_id)
+        if path is None:
+            path = find_dataset_file(self.upload_folder, f'{PREPROCESSED_PREFIX}{dataset_id}')
+            if path is None:
+                raise FileNotFoundError(f"Dataset '{dataset_id}' not found.")
+            self._paths[dataset_id] = path
+        return path
+
+    def _store(self, entry):
+        self._entries[entry.dataset_id] = entry
+        self._entries.move_to_end(entry.dataset_id)
+        self._evict()
+
+    def _evict(self):
+        total_bytes = sum(entry.nbytes for entry in self._entries.values())
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or total_bytes > self.max_bytes):
+            dataset_id, entry = self._entries.popitem(last=False)
+            total_bytes -= entry.nbytes
+            self._stats["evictions"] += 1
+            logger.info(f"Evicted dataset {dataset_id} from registry ({entry.nbytes} bytes)")
+
+
+def dataset_id_from_path(path):
+    """Derive the dataset ID from a preprocessed dataset file name."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name[len(PREPROCESSED_PREFIX):] if name.startswith(PREPROCESSED_PREFIX) else name
+
+
+def find_latest_dataset(folder):
+    """Return the most recently modified preprocessed dataset in a folder, or None."""
+    # Only dataset files; sidecars like the row index share the prefix
+    extensions = tuple(STORAGE_FORMATS.values())
+    preprocessed_files = [
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.startswith(PREPROCESSED_PREFIX) and f.endswith(extensions)
+    ]
+    if not preprocessed_files:
+        return None
+    return max(preprocessed_files, key=os.path.getmtime)
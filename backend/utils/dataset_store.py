@@ -0,0 +1,176 @@
+import os
+import io
+import hashlib
+import pandas as pd
+from utils.data_processor import coerce_dataset_dtypes
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional, fall back to CSV storage
+    pa = None
+    feather = None
+
+# Supported on-disk formats for preprocessed datasets, keyed by file extension
+STORAGE_FORMATS = {'feather': '.feather', 'csv': '.csv'}
+DEFAULT_STORAGE_FORMAT = 'feather' if feather is not None else 'csv'
+
+
+def save_dataset(dataset, folder, name, storage_format=None):
+    """
+    Persist a preprocessed dataset.
+
+    Feather files are written uncompressed (Arrow IPC) so they can be
+    memory-mapped on read, with categorical keys stored as dictionaries and
+    year columns as float32.
+
+    Args:
+        dataset (pd.DataFrame): Preprocessed dataset.
+        folder (str): Target directory.
+        name (str): File name without extension.
+        storage_format (str): "feather" or "csv", defaults to the best available.
+
+    Returns:
+        str: Path of the written file.
+    """
+    storage_format = storage_format or DEFAULT_STORAGE_FORMAT
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unsupported storage format: {storage_format}")
+
+    path = os.path.join(folder, name + STORAGE_FORMATS[storage_format])
+    dataset = coerce_dataset_dtypes(dataset).reset_index(drop=True)
+    if storage_format == 'feather':
+        if feather is None:
+            raise ImportError("pyarrow is required for the feather storage format")
+        feather.write_feather(dataset, path, compression='uncompressed')
+    else:
+        dataset.to_csv(path, index=False)
+    return path
+
+
+class ChunkedDatasetWriter:
+    """
+    Write a preprocessed dataset chunk by chunk without holding it in memory.
+
+    Feather output is an Arrow IPC file with one record batch per chunk. Keys
+    are written as plain strings because each chunk has its own categories;
+    load_dataset restores them as categoricals. Chunks go to a temporary file
+    that only replaces path once the writer is closed without an error, so a
+    failed ingestion never leaves a partial dataset under a valid name.
+    """
+
+    def __init__(self, folder, name, storage_format=None):
+        self.storage_format = storage_format or DEFAULT_STORAGE_FORMAT
+        if self.storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Unsupported storage format: {self.storage_format}")
+        self.path = os.path.join(folder, name + STORAGE_FORMATS[self.storage_format])
+        self.temp_path = self.path + '.part'
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+    def write(self, chunk):
+        """Append a preprocessed chunk."""
+        chunk = chunk.reset_index(drop=True)
+        for col in chunk.columns:
+            if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+                chunk[col] = chunk[col].astype(str)
+
+        if self.storage_format == 'feather':
+            if pa is None:
+                raise ImportError("pyarrow is required for the feather storage format")
+            if self._writer is None:
+                self._schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                self._writer = pa.ipc.new_file(self.temp_path, self._schema)
+            self._writer.write_table(pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False))
+        else:
+            chunk.to_csv(self.temp_path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        self.rows += len(chunk)
+
+    def close(self):
+        """Finish the file, move it to its final path and return that path."""
+        self._finish()
+        if os.path.exists(self.temp_path):
+            os.replace(self.temp_path, self.path)
+        return self.path
+
+    def discard(self):
+        """Delete the partially written file."""
+        try:
+            self._finish()
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+
+    def _finish(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def load_dataset(path, columns=None):
+    """
+    Load a preprocessed dataset, reading only the requested columns.
+
+    Args:
+        path (str): Dataset file written by save_dataset.
+        columns (list): Optional subset of columns to read.
+
+    Returns:
+        pd.DataFrame: Dataset with typed columns.
+    """
+    if path.endswith(STORAGE_FORMATS['feather']):
+        if feather is None:
+            raise ImportError("pyarrow is required to read feather datasets")
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        return coerce_dataset_dtypes(table.to_pandas())
+    return coerce_dataset_dtypes(pd.read_csv(path, usecols=columns))
+
+
+def dataset_columns(path):
+    """Return the column names of a stored dataset without loading its data."""
+    if path.endswith(STORAGE_FORMATS['feather']):
+        return feather.read_table(path, memory_map=True).column_names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def find_dataset_file(folder, name):
+    """Return the stored file for a dataset name in any supported format, or None."""
+    for extension in STORAGE_FORMATS.values():
+        path = os.path.join(folder, name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_csv(path):
+    """
+    Export a stored dataset as CSV text.
+
+    Args:
+        path (str): Dataset file written by save_dataset.
+
+    Returns:
+        str: CSV representation of the dataset.
+    """
+    buffer = io.StringIO()
+    load_dataset(path).to_csv(buffer, index=False)
+    return buffer.getvalue()
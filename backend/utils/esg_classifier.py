@@ -0,0 +1,47 @@
+import numpy as np
+from utils.inference_backend import input_tensor_type, to_numpy
+
+CLASSIFY_BATCH_SIZE = 32
+CLASSIFY_MAX_TOKENS = 512
+
+
+def classify_texts(texts, tokenizer, model, batch_size=CLASSIFY_BATCH_SIZE, sort_by_length=True,
+                   max_tokens=CLASSIFY_MAX_TOKENS):
+    """
+    Classify texts in fixed-size batches with a sequence classification model.
+
+    Texts are tokenized once and, by default, batched in order of token length
+    so each batch pads to about the same length. Results are yielded batch by
+    batch, so they come back in processing order; each carries the index of
+    its text in the input list.
+
+    Args:
+        texts (list[str]): Texts to classify.
+        tokenizer: Hugging Face tokenizer of the model.
+        model: Hugging Face sequence classification model (TensorFlow, PyTorch or ONNX Runtime).
+        batch_size (int): Texts per forward pass.
+        sort_by_length (bool): Batch texts of similar length together.
+        max_tokens (int): Texts are truncated to this many tokens.
+
+    Yields:
+        dict: index, label and per-label scores of one text.
+    """
+    return_tensors = input_tensor_type(model)
+    id2label = model.config.id2label
+    labels = [id2label[i] for i in range(len(id2label))]
+    input_ids = tokenizer(list(texts), truncation=True, max_length=max_tokens)["input_ids"]
+    order = np.argsort([len(ids) for ids in input_ids], kind="stable") if sort_by_length else np.arange(len(texts))
+
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        inputs = tokenizer.pad({"input_ids": [input_ids[i] for i in batch]}, return_tensors=return_tensors)
+        logits = to_numpy(model(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]).logits)
+        # Softmax in NumPy so every backend is scored the same way
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        scores = exp / exp.sum(axis=-1, keepdims=True)
+        for i, row in zip(batch, scores):
+            yield {
+                "index": int(i),
+                "label": labels[int(row.argmax())],
+                "scores": {label: float(score) for label, score in zip(labels, row)},
+            }
@@ -0,0 +1,122 @@
+import re
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# T5 reads at most 512 tokens; leave room for the prompt
+CHUNK_TOKENS = 480
+MAX_ROUNDS = 8
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+def project_result_texts(future_years):
+    """
+    Build one sentence per project with vectorized string operations.
+
+    Args:
+        future_years (pd.DataFrame): Projects with "Series Name", "Predicted ESG Score",
+            "Risk Factor" and "Project Cost" columns.
+
+    Returns:
+        list[str]: "Project: ..., ESG Score: ..., Risk Factor: ..., Cost: ..." per row.
+    """
+    texts = (
+        "Project: " + future_years['Series Name'].astype(str)
+        + ", ESG Score: " + np.char.mod('%.2f', future_years['Predicted ESG Score'].to_numpy(dtype=float))
+        + ", Risk Factor: " + np.char.mod('%.2f', future_years['Risk Factor'].to_numpy(dtype=float))
+        + ", Cost: " + future_years['Project Cost'].astype(str)
+    )
+    return texts.tolist()
+
+
+def chunk_by_tokens(segments, tokenizer, chunk_tokens=CHUNK_TOKENS):
+    """
+    Pack text segments into chunks of at most chunk_tokens tokens.
+
+    Segments are kept whole where they fit; a segment longer than a chunk is
+    split at token boundaries.
+
+    Args:
+        segments (list[str]): Sentences or rows, in order.
+        tokenizer: Hugging Face tokenizer.
+        chunk_tokens (int): Token budget of a chunk.
+
+    Returns:
+        list[str]: Chunk texts.
+        int: Number of tokens in the segments.
+    """
+    token_ids = tokenizer(segments, add_special_tokens=False)["input_ids"]
+    chunks, current, current_tokens = [], [], 0
+    for segment, ids in zip(segments, token_ids):
+        if len(ids) > chunk_tokens:
+            if current:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(
+                tokenizer.decode(ids[start:start + chunk_tokens], skip_special_tokens=True)
+                for start in range(0, len(ids), chunk_tokens)
+            )
+            continue
+        if current_tokens + len(ids) > chunk_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(segment)
+        current_tokens += len(ids)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks, sum(len(ids) for ids in token_ids)
+
+
+def summarize_hierarchical(segments, tokenizer, summarize_many, chunk_tokens=CHUNK_TOKENS, max_rounds=MAX_ROUNDS):
+    """
+    Map-reduce summarization of text longer than the model's input window.
+
+    The segments are packed into token-bounded chunks which are summarized
+    together (summarize_many batches them), then the chunk summaries are
+    chunked and summarized again until they fit into a single final summary.
+
+    Args:
+        segments (list[str] or str): Sentences or rows to summarize; a string
+            is split into sentences.
+        tokenizer: Hugging Face tokenizer of the summarization model.
+        summarize_many (callable): Takes a list of texts and returns one summary per text.
+        chunk_tokens (int): Token budget of a chunk.
+        max_rounds (int): Maximum number of reduce rounds before the final summary.
+
+    Returns:
+        str: Final summary.
+        dict: Chunks per round, tokens processed, elapsed seconds and tokens per second.
+    """
+    if isinstance(segments, str):
+        segments = [s for s in SENTENCE_BOUNDARY.split(segments) if s]
+    if not segments:
+        raise ValueError("No text to summarize.")
+
+    start = time.perf_counter()
+    chunks, tokens = chunk_by_tokens(segments, tokenizer, chunk_tokens)
+    tokens_processed = tokens
+    chunks_per_round = []
+    while len(chunks) > 1 and len(chunks_per_round) < max_rounds:
+        chunks_per_round.append(len(chunks))
+        summaries = summarize_many(chunks)
+        chunks, tokens = chunk_by_tokens(summaries, tokenizer, chunk_tokens)
+        tokens_processed += tokens
+
+    summary = summarize_many([" ".join(chunks)])[0]
+    chunks_per_round.append(1)
+    seconds = time.perf_counter() - start
+    stats = {
+        "input_segments": len(segments),
+        "chunks_per_round": chunks_per_round,
+        "tokens_processed": tokens_processed,
+        "seconds": seconds,
+        "tokens_per_second": tokens_processed / seconds if seconds > 0 else None,
+    }
+    logger.info(
+        f"Summarized {len(segments)} segments in {len(chunks_per_round)} rounds, "
+        f"{tokens_processed} tokens at {stats['tokens_per_second'] or 0:.0f} tokens/s"
+    )
+    return summary, stats
@@ -0,0 +1,128 @@
+import os
+import shutil
+import platform
+import tempfile
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "native" runs the TensorFlow/PyTorch model, "onnx" an exported ONNX Runtime
+# graph and "onnx-int8" the same graph with dynamic int8 quantization
+INFERENCE_BACKENDS = ("native", "onnx", "onnx-int8")
+DEFAULT_INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'native')
+ONNX_MODEL_FOLDER = os.environ.get('ONNX_MODEL_FOLDER', os.path.join('.', 'uploads', 'models', 'onnx'))
+
+# Optimum model class per task
+ONNX_MODEL_CLASSES = {
+    "seq2seq": "ORTModelForSeq2SeqLM",
+    "sequence-classification": "ORTModelForSequenceClassification",
+}
+
+
+def backend_for(task):
+    """
+    Return the inference backend configured for a task.
+
+    SUMMARY_INFERENCE_BACKEND and CLASSIFY_INFERENCE_BACKEND override
+    INFERENCE_BACKEND for the summarization and classification models.
+    """
+    backend = os.environ.get(f'{task.upper()}_INFERENCE_BACKEND', DEFAULT_INFERENCE_BACKEND)
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {INFERENCE_BACKENDS}")
+    return backend
+
+
+def onnx_model_path(model_name, quantized=False, folder=None):
+    """Return the directory of the exported (and optionally quantized) ONNX model."""
+    variant = "int8" if quantized else "fp32"
+    return os.path.join(folder or ONNX_MODEL_FOLDER, model_name.replace('/', '--'), variant)
+
+
+def load_onnx_model(model_name, task, quantized=False, folder=None):
+    """
+    Load a Hugging Face model as an ONNX Runtime model, exporting it on first use.
+
+    The export (and the int8 quantization of every ONNX file) happens once;
+    later calls load the cached artifacts from disk. Requires optimum[onnxruntime].
+
+    Args:
+        model_name (str): Hugging Face model name.
+        task (str): "seq2seq" or "sequence-classification".
+        quantized (bool): Use dynamic int8 quantization.
+        folder (str): Root of the exported models.
+
+    Returns:
+        Tokenizer and ONNX Runtime model; the model takes PyTorch tensors.
+    """
+    try:
+        import optimum.onnxruntime as ort
+        from transformers import AutoTokenizer
+    except ImportError as e:
+        raise ImportError("The ONNX inference backend requires optimum[onnxruntime].") from e
+
+    model_class = getattr(ort, ONNX_MODEL_CLASSES[task])
+    fp32_path = onnx_model_path(model_name, False, folder)
+    if not os.path.isdir(fp32_path):
+        logger.info(f"Exporting {model_name} to ONNX at: {fp32_path}")
+        _publish(fp32_path, lambda tmp: _export(model_class, AutoTokenizer, model_name, tmp))
+
+    path = fp32_path
+    if quantized:
+        path = onnx_model_path(model_name, True, folder)
+        if not os.path.isdir(path):
+            logger.info(f"Quantizing {model_name} to int8 at: {path}")
+            _publish(path, lambda tmp: _quantize(ort, fp32_path, tmp))
+
+    return AutoTokenizer.from_pretrained(path), model_class.from_pretrained(path)
+
+
+def input_tensor_type(model):
+    """Return the return_tensors value a tokenizer should use for a model."""
+    if type(model).__module__.startswith("optimum"):
+        return "pt"
+    return getattr(model, "framework", "pt")
+
+
+def to_numpy(tensor):
+    """Convert TensorFlow, PyTorch or NumPy model outputs to a NumPy array."""
+    if hasattr(tensor, "detach"):
+        return tensor.detach().cpu().numpy()
+    return np.asarray(tensor)
+
+
+def _export(model_class, tokenizer_class, model_name, target):
+    model_class.from_pretrained(model_name, export=True).save_pretrained(target)
+    tokenizer_class.from_pretrained(model_name).save_pretrained(target)
+
+
+def _quantize(ort, source, target):
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        config = AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    else:
+        config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+    # Quantized graphs keep their file names so the model loads like the fp32 export
+    for file_name in sorted(os.listdir(source)):
+        if file_name.endswith('.onnx'):
+            quantizer = ort.ORTQuantizer.from_pretrained(source, file_name=file_name)
+            quantizer.quantize(save_dir=target, quantization_config=config, file_suffix="")
+        elif not os.path.exists(os.path.join(target, file_name)):
+            shutil.copy2(os.path.join(source, file_name), target)
+
+
+def _publish(path, build):
+    # Build into a temporary directory and rename it, so a crashed or concurrent
+    # export never leaves a half-written model behind
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        build(tmp)
+        os.rename(tmp, path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
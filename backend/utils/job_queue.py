@@ -0,0 +1,140 @@
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from utils.model_store import fit_timed
+from utils.serving import worker_context
+
+logger = logging.getLogger(__name__)
+
+MAX_JOB_RECORDS = 200
+
+
+class TrainingJobQueue:
+    """
+    Background training of the ESG and risk models.
+
+    Each job prepares the training data in a coordinator thread and fits the
+    two forests concurrently in a bounded process pool. Jobs for a dataset
+    fingerprint that is already queued or running are coalesced into that job.
+    Training goes through the ModelStore, so a request that needs the same
+    models waits for the job instead of training them a second time.
+    """
+
+    def __init__(self, model_store, n_jobs=2, forest_n_jobs=None, max_concurrent_jobs=2):
+        self.model_store = model_store
+        self.n_jobs = n_jobs
+        self.forest_n_jobs = forest_n_jobs
+        self._coordinators = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix='training-job')
+        self._pool = None
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fingerprint, load_dataset, dataset_id=None, parent=None):
+        """
+        Queue a training job, or return the pending job for the same fingerprint.
+
+        Args:
+            fingerprint (str): Content hash of the dataset.
+            load_dataset (callable): Returns the full preprocessed dataset.
+            dataset_id (str): Dataset the job trains on, for reporting.
+            parent (tuple): (fingerprint, load_dataset) of the previous dataset
+                version to update the models from incrementally.
+
+        Returns:
+            dict: Job record.
+            bool: True if the request was coalesced into an existing job.
+        """
+        with self._lock:
+            job_id = self._active.get(fingerprint)
+            if job_id is not None:
+                return dict(self._jobs[job_id]), True
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "dataset_id": dataset_id,
+                "fingerprint": fingerprint,
+                "status": "queued",
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "duration_seconds": None,
+                "timings": None,
+                "model_version": None,
+                "model_source": None,
+                "parent_fingerprint": parent[0] if parent else None,
+                "lineage": None,
+                "error": None,
+            }
+            self._active[fingerprint] = job_id
+            self._trim()
+            job = dict(self._jobs[job_id])
+
+        self._coordinators.submit(self._run, job_id, fingerprint, load_dataset, parent)
+        logger.info(f"Training job {job_id} queued for dataset {fingerprint[:16]}")
+        return job, False
+
+    def get(self, job_id):
+        """Return a copy of a job record, or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def shutdown(self):
+        """Stop accepting jobs and release the worker processes."""
+        self._coordinators.shutdown(wait=False)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def _run(self, job_id, fingerprint, load_dataset, parent=None):
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            bundle, source = self.model_store.get_or_train(
+                fingerprint, load_dataset, trainer=self._train_parallel, parent=parent
+            )
+            self._update(
+                job_id,
+                status="done",
+                model_version=bundle["version"],
+                model_source=source,
+                timings=bundle["timings"] if source == "trained" else None,
+                lineage=bundle.get("lineage"),
+            )
+            logger.info(f"Training job {job_id} finished, model version {bundle['version']} ({source})")
+        except Exception as e:
+            logger.error(f"Training job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                job = self._jobs[job_id]
+                job["finished_at"] = time.time()
+                job["duration_seconds"] = job["finished_at"] - job["started_at"]
+                self._active.pop(fingerprint, None)
+
+    def _train_parallel(self, X, y, risk_X, risk_y, **model_options):
+        """Fit the ESG and risk models at the same time in the process pool."""
+        pool = self._get_pool()
+        esg_future = pool.submit(fit_timed, X, y, self.forest_n_jobs, **model_options)
+        risk_future = pool.submit(fit_timed, risk_X, risk_y, self.forest_n_jobs, **model_options)
+        rf_model_esg, esg_fit_seconds = esg_future.result()
+        rf_model_risk, risk_fit_seconds = risk_future.result()
+        return rf_model_esg, rf_model_risk, {"esg_fit_seconds": esg_fit_seconds, "risk_fit_seconds": risk_fit_seconds}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.n_jobs, mp_context=worker_context())
+            return self._pool
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _trim(self):
+        # Forget the oldest finished jobs once too many records are kept
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(self._jobs) - MAX_JOB_RECORDS)]:
+            del self._jobs[job_id]
@@ -0,0 +1,36 @@
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LazyResource:
+    """
+    A heavy object (model, tokenizer, trained pipeline) created on first use.
+
+    The loader runs at most once, even when several request threads ask for
+    the resource at the same time.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        """Return the resource, loading it on the first call."""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    start = time.perf_counter()
+                    self._value = self._loader()
+                    self._loaded = True
+                    logger.info(f"Loaded {self.name} in {time.perf_counter() - start:.2f}s")
+        return self._value
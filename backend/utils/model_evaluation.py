@@ -0,0 +1,279 @@
+import time
+import logging
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold, ParameterSampler, TimeSeriesSplit
+from models.esg_model import training_cells, categorical_feature_mask, BACKEND_ENCODINGS
+from utils.categorical_encoder import CategoricalEncoder
+from utils.data_processor import KEY_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+CV_METHODS = ("kfold", "time")
+# Best candidates by RMSE whose fit and latency are re-timed serially after the CV rounds
+DEFAULT_FINALISTS = 5
+# Randomized search spaces; every model is also evaluated with its default parameters
+MODEL_SPACES = {
+    "random_forest": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 8, 16, 32],
+        "min_samples_leaf": [1, 2, 5, 10],
+        "max_features": [1.0, 0.5, "sqrt"],
+    },
+    "hist_gradient_boosting": {
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_iter": [100, 200, 400],
+        "max_leaf_nodes": [15, 31, 63],
+        "min_samples_leaf": [5, 20, 50],
+        "l2_regularization": [0.0, 0.1, 1.0],
+    },
+}
+# Feature encoding of each model, as for the model backends of models.esg_model
+MODEL_ENCODINGS = BACKEND_ENCODINGS
+
+
+def cv_folds(years, n_splits=5, method="kfold", random_state=42):
+    """
+    Split training cells into cross-validation folds.
+
+    "kfold" shuffles the cells into n_splits folds. "time" splits on the
+    sorted distinct years: every fold trains on the years before its test
+    years, like predicting the next years of the series in production.
+
+    Args:
+        years (np.ndarray): Year of each training cell.
+        n_splits (int): Number of folds.
+        method (str): "kfold" or "time".
+        random_state (int): Shuffle seed of "kfold".
+
+    Returns:
+        list: (train indices, test indices) per fold.
+    """
+    if method not in CV_METHODS:
+        raise ValueError(f"Unknown CV method '{method}', expected one of {CV_METHODS}")
+    if method == "kfold":
+        return list(KFold(n_splits, shuffle=True, random_state=random_state).split(years))
+
+    distinct = np.unique(years)
+    if len(distinct) <= n_splits:
+        raise ValueError(f"Time-series CV with {n_splits} splits needs more than {n_splits} distinct years.")
+    folds = []
+    for train_years, test_years in TimeSeriesSplit(n_splits).split(distinct):
+        folds.append((
+            np.flatnonzero(np.isin(years, distinct[train_years])),
+            np.flatnonzero(np.isin(years, distinct[test_years])),
+        ))
+    return folds
+
+
+class FoldCache:
+    """
+    Fold feature matrices of the training cells, per encoding.
+
+    The features of every encoding are built once and sliced into the
+    (X_train, y_train, X_test, y_test) of every fold on first use; all
+    candidates with that encoding share these matrices. joblib memory-maps
+    the arrays when handing them to worker processes instead of copying them
+    per task.
+    """
+
+    def __init__(self, cells, folds):
+        self.cells = cells
+        self.folds = folds
+        self._encoders = {}
+        self._fold_data = {}
+
+    def encoder(self, encoding):
+        if encoding not in self._encoders:
+            self._encoders[encoding] = CategoricalEncoder(KEY_COLUMNS, mode=encoding).fit(self.cells)
+        return self._encoders[encoding]
+
+    def get(self, encoding):
+        """Return the (X_train, y_train, X_test, y_test) of every fold for an encoding."""
+        if encoding not in self._fold_data:
+            X = self.encoder(encoding).transform(self.cells)
+            y = self.cells["Value"].to_numpy(dtype=np.float64)
+            self._fold_data[encoding] = [
+                (X[train], y[train], X[test], y[test]) for train, test in self.folds
+            ]
+        return self._fold_data[encoding]
+
+
+def make_model(name, params, encoder=None, random_state=42):
+    """
+    Create an unfitted regressor of one of the MODEL_SPACES.
+
+    Args:
+        name (str): Model name, a key of MODEL_SPACES.
+        params (dict): Model parameters.
+        encoder (CategoricalEncoder): Ordinal encoder of the features, to mark
+            the categorical features of gradient boosting.
+    """
+    if name == "random_forest":
+        return RandomForestRegressor(random_state=random_state, n_jobs=1, **params)
+    if name == "hist_gradient_boosting":
+        categorical = "from_dtype"
+        if encoder is not None:
+            categorical = categorical_feature_mask(encoder)
+        return HistGradientBoostingRegressor(random_state=random_state, categorical_features=categorical, **params)
+    raise ValueError(f"Unknown model '{name}', expected one of {list(MODEL_SPACES)}")
+
+
+def sample_candidates(models, n_iter, random_state=42):
+    """Return the default parameters and n_iter random samples of the search space of every model."""
+    candidates = []
+    for name in models:
+        if name not in MODEL_SPACES:
+            raise ValueError(f"Unknown model '{name}', expected one of {list(MODEL_SPACES)}")
+        candidates.append((name, {}))
+        candidates.extend((name, params) for params in ParameterSampler(MODEL_SPACES[name], n_iter, random_state=random_state))
+    return candidates
+
+
+def measure_latency(model, X, latency_rows=1000, repeats=5):
+    """Return the best time in ms over repeats to predict one request of latency_rows rows drawn from X."""
+    request = X[np.arange(latency_rows) % X.shape[0]]
+    latency_ms = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(request)
+        latency_ms = min(latency_ms, (time.perf_counter() - start) * 1000)
+    return latency_ms
+
+
+def evaluate_fold(name, params, encoder, X_train, y_train, X_test, y_test, latency_rows=1000, repeats=5):
+    """
+    Fit a candidate on one fold and measure its accuracy and speed.
+
+    Returns:
+        dict: r2, rmse, mae, fit_seconds, predict_us_per_row (on the test
+            fold) and latency_ms, the best time over repeats to predict one
+            request of latency_rows rows.
+    """
+    model = make_model(name, params, encoder)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predicted = model.predict(X_test)
+    predict_seconds = time.perf_counter() - start
+
+    latency_ms = measure_latency(model, X_test, latency_rows, repeats)
+
+    return {
+        "r2": float(r2_score(y_test, predicted)),
+        "rmse": float(np.sqrt(mean_squared_error(y_test, predicted))),
+        "mae": float(mean_absolute_error(y_test, predicted)),
+        "fit_seconds": fit_seconds,
+        "predict_us_per_row": predict_seconds * 1e6 / max(1, X_test.shape[0]),
+        "latency_ms": latency_ms,
+    }
+
+
+def retime_serially(name, params, encoder, X_train, y_train, X_test, latency_rows=1000, repeats=5):
+    """Fit a candidate and time its prediction with nothing else running, for SLO selection."""
+    model = make_model(name, params, encoder)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    return fit_seconds, measure_latency(model, X_test, latency_rows, repeats)
+
+
+def evaluate_models(dataset, models=tuple(MODEL_SPACES), n_iter=10, cv="kfold", n_splits=5, n_jobs=-1,
+                    split_year=2020, latency_rows=1000, time_budget=None, finalists=DEFAULT_FINALISTS,
+                    random_state=42):
+    """
+    Cross-validate the default and randomly sampled parameters of the ESG regressors.
+
+    Every (candidate, fold) pair is a joblib task and runs in parallel across
+    n_jobs processes. Candidates are dispatched in rounds of n_jobs so the
+    search stops starting new candidates once time_budget seconds are spent.
+
+    Times measured in the rounds are inflated by the fits running next to
+    them, so the finalists (the best candidates by RMSE) are refitted on the
+    first fold one at a time afterwards. Their "fit_seconds" and "latency_ms"
+    are replaced by these serial timings, flagged with "timing": "serial";
+    the CV means are kept as "fit_seconds_cv" and "latency_ms_cv".
+
+    Args:
+        dataset (pd.DataFrame): Preprocessed dataset.
+        models (iterable): Model names, keys of MODEL_SPACES.
+        n_iter (int): Random samples per model on top of its defaults.
+        cv (str): "kfold" or "time", see cv_folds.
+        n_splits (int): Number of folds.
+        n_jobs (int): joblib worker processes, -1 for all cores.
+        split_year (int): Only cells before this year are used, like in training.
+        latency_rows (int): Rows of the simulated prediction request.
+        time_budget (float): Optional limit in seconds on the search.
+        finalists (int): Number of best candidates re-timed serially.
+        random_state (int): Seed of the folds and the parameter samples.
+
+    Returns:
+        list[dict]: One result per evaluated candidate with its parameters,
+            the mean and std of every fold metric and the fold count.
+    """
+    cells = training_cells(dataset, split_year)
+    if cells.empty:
+        raise ValueError("No historical data available to evaluate the ESG models.")
+    folds = cv_folds(cells["Year"].to_numpy(), n_splits, cv, random_state)
+    cache = FoldCache(cells, folds)
+    candidates = sample_candidates(models, n_iter, random_state)
+
+    results = []
+    start = time.perf_counter()
+    round_size = effective_n_jobs(n_jobs)
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for offset in range(0, len(candidates), round_size):
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                logger.info(f"Time budget spent, {len(candidates) - offset} candidates not evaluated")
+                break
+            batch = candidates[offset:offset + round_size]
+            tasks = []
+            for name, params in batch:
+                encoding = MODEL_ENCODINGS[name]
+                encoder = cache.encoder(encoding)
+                tasks.extend(
+                    delayed(evaluate_fold)(name, params, encoder, *fold, latency_rows=latency_rows)
+                    for fold in cache.get(encoding)
+                )
+            fold_results = parallel(tasks)
+            for i, (name, params) in enumerate(batch):
+                scores = fold_results[i * len(folds):(i + 1) * len(folds)]
+                result = {"model": name, "params": params, "folds": len(folds)}
+                for metric in scores[0]:
+                    values = [score[metric] for score in scores]
+                    result[metric] = float(np.mean(values))
+                    result[f"{metric}_std"] = float(np.std(values))
+                results.append(result)
+    logger.info(f"Evaluated {len(results)} candidates on {len(folds)} folds in {time.perf_counter() - start:.1f}s")
+
+    for result in results:
+        result["timing"] = "parallel"
+    for result in sorted(results, key=lambda result: result["rmse"])[:finalists]:
+        encoding = MODEL_ENCODINGS[result["model"]]
+        X_train, y_train, X_test, _ = cache.get(encoding)[0]
+        fit_seconds, latency_ms = retime_serially(
+            result["model"], result["params"], cache.encoder(encoding), X_train, y_train, X_test, latency_rows
+        )
+        result.update(
+            fit_seconds_cv=result["fit_seconds"], latency_ms_cv=result["latency_ms"],
+            fit_seconds=fit_seconds, latency_ms=latency_ms, timing="serial"
+        )
+    return results
+
+
+def best_within_slo(results, latency_slo_ms=None):
+    """
+    Return the most accurate result (lowest RMSE) whose request latency meets the SLO, or None.
+
+    With an SLO only serially timed results are eligible, since the latency of
+    the others was measured under CPU contention.
+    """
+    eligible = [
+        result for result in results
+        if latency_slo_ms is None or (result.get("timing") == "serial" and result["latency_ms"] <= latency_slo_ms)
+    ]
+    return min(eligible, key=lambda result: result["rmse"], default=None)
@@ -0,0 +1,498 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+import joblib
+import numpy as np
+import pandas as pd
+from models.esg_model import (
+    prepare_training_data, prepare_forecast_training_data, train_model, predict_scores,
+    year_value_matrix, build_forecast_features, training_delta, warm_start_forest,
+    categorical_feature_mask, MODEL_BACKENDS, BACKEND_ENCODINGS
+)
+
+logger = logging.getLogger(__name__)
+
+# v2 bundles carry the CategoricalEncoder their sparse features were built with
+MODEL_PREFIX = 'esg_models_v2_'
+FORECAST_PREFIX = 'esg_forecast_'
+LINEAGE_FILE = 'lineage.jsonl'
+# Model file name suffix per backend; forest files keep their original names
+BACKEND_SUFFIXES = {"random_forest": "", "hist_gradient_boosting": "_hgb"}
+
+# Incremental updates fall back to a full refit of a model when more than this
+# share of its parent's training rows changed or disappeared, or when the delta
+# is larger than this share of all rows
+INCREMENTAL_MAX_CHANGED_SHARE = 0.05
+INCREMENTAL_MAX_DELTA_SHARE = 0.5
+# Added trees are fitted on the delta plus a bootstrap sample of the unchanged rows
+# of at most this size, weighted up to stand for all unchanged rows
+INCREMENTAL_MAX_CONTEXT_ROWS = 200_000
+
+
+class ModelStore:
+    """
+    Trained ESG and risk models, keyed by the fingerprint of their dataset.
+
+    Models are trained once per fingerprint, saved with joblib in model_folder
+    and kept in a process-wide LRU cache of at most max_entries bundles. A
+    bundle is a dict with the two forests, their feature columns and training
+    metadata. Multi-year forecast models are stored the same way, keyed by the
+    fingerprint and their number of lag features.
+
+    Models can also be derived incrementally from the models of a parent
+    dataset version; every trained bundle records its lineage, which is also
+    appended to lineage.jsonl in model_folder.
+
+    backend selects the regressors (see models.esg_model.MODEL_BACKENDS); the
+    models of each backend are saved under their own file names.
+    """
+
+    def __init__(self, model_folder, max_entries=4, backend="random_forest"):
+        if backend not in MODEL_BACKENDS:
+            raise ValueError(f"Unknown model backend '{backend}', expected one of {MODEL_BACKENDS}")
+        self.model_folder = model_folder
+        self.max_entries = max_entries
+        self.backend = backend
+        os.makedirs(model_folder, exist_ok=True)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._training_locks = {}
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "train_seconds": 0.0}
+
+    def model_path(self, fingerprint, lags=None):
+        """Return the joblib file of the models (or the forecast model with lags) for a fingerprint."""
+        suffix = BACKEND_SUFFIXES[self.backend]
+        if lags is not None:
+            return os.path.join(self.model_folder, f'{FORECAST_PREFIX}{fingerprint[:16]}_lag{lags}{suffix}.joblib')
+        return os.path.join(self.model_folder, f'{MODEL_PREFIX}{fingerprint[:16]}{suffix}.joblib')
+
+    def has_models(self, fingerprint):
+        """Return True if the ESG and risk models of a fingerprint are cached or saved."""
+        with self._lock:
+            if fingerprint in self._cache:
+                return True
+        return os.path.exists(self.model_path(fingerprint))
+
+    def get_or_train(self, fingerprint, load_dataset, trainer=None, lags=None, parent=None):
+        """
+        Return the models for a dataset fingerprint, training them on a miss.
+
+        Args:
+            fingerprint (str): Content hash of the dataset.
+            load_dataset (callable): Returns the full preprocessed dataset; only
+                called when the models have to be trained.
+            trainer (callable): Fits the ESG and risk models (or the forecast
+                model), see train_in_process.
+            lags (int): Return the multi-year forecast model with this many lag
+                features instead of the ESG and risk models.
+            parent (tuple): (fingerprint, load_dataset) of a previous dataset
+                version; on a miss the models are updated incrementally from
+                the parent's models instead of trained from scratch.
+
+        Returns:
+            dict: Model bundle.
+            str: Where the bundle came from ("memory", "disk" or "trained").
+        """
+        key = fingerprint if lags is None else f'{fingerprint}:lag{lags}'
+        bundle = self._lookup(key)
+        if bundle is not None:
+            return bundle, "memory"
+
+        # Serialize work per model so concurrent requests train only once
+        with self._lock:
+            training_lock = self._training_locks.setdefault(key, threading.Lock())
+        with training_lock:
+            bundle = self._lookup(key)
+            if bundle is not None:
+                return bundle, "memory"
+
+            path = self.model_path(fingerprint, lags)
+            if os.path.exists(path):
+                bundle = joblib.load(path)
+                source = "disk"
+            else:
+                if lags is not None:
+                    bundle = self.train_forecast(fingerprint, load_dataset(), lags, trainer)
+                elif parent is not None and parent[0] != fingerprint:
+                    bundle = self._train_from_parent(fingerprint, load_dataset, trainer, parent)
+                else:
+                    bundle = self.train(fingerprint, load_dataset(), trainer)
+                joblib.dump(bundle, path)
+                logger.info(f"Models for dataset {fingerprint[:16]} saved at: {path}")
+                if lags is None:
+                    self._record_lineage(bundle)
+                source = "trained"
+
+            with self._lock:
+                self._stats["disk_hits" if source == "disk" else "misses"] += 1
+                self._cache[key] = bundle
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    evicted, _ = self._cache.popitem(last=False)
+                    logger.info(f"Evicted models for dataset {evicted[:16]} from cache")
+            return bundle, source
+
+    def train(self, fingerprint, dataset, trainer=None):
+        """
+        Train the ESG and risk models on a preprocessed dataset.
+
+        Args:
+            fingerprint (str): Content hash of the dataset.
+            dataset (pd.DataFrame): Preprocessed dataset.
+            trainer (callable): Fits the ESG and risk models, see train_in_process.
+
+        Returns:
+            dict: Model bundle.
+        """
+        start = time.perf_counter()
+        X, y, risk_X, risk_y, encoder = prepare_training_data(dataset, encoding=BACKEND_ENCODINGS[self.backend])
+        if X.shape[0] == 0:
+            raise ValueError("No historical data available to train the ESG model.")
+        prepare_seconds = time.perf_counter() - start
+        rf_model_esg, rf_model_risk, timings = (trainer or train_in_process)(
+            X, y, risk_X, risk_y, **self._model_options(encoder)
+        )
+        train_seconds = time.perf_counter() - start
+
+        with self._lock:
+            self._stats["train_seconds"] += train_seconds
+        logger.info(f"Trained models for dataset {fingerprint[:16]} on {X.shape[0]} rows in {train_seconds:.2f}s")
+        return {
+            "fingerprint": fingerprint,
+            "version": fingerprint[:16],
+            "backend": self.backend,
+            "esg_model": rf_model_esg,
+            "risk_model": rf_model_risk,
+            "encoder": encoder,
+            "feature_columns": encoder.feature_names(),
+            "train_rows": X.shape[0],
+            "train_seconds": train_seconds,
+            "timings": {"prepare_seconds": prepare_seconds, **timings},
+            "trained_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "lineage": {
+                "mode": "full",
+                "parent_fingerprint": None,
+                "trees": {"esg": _tree_count(rf_model_esg), "risk": _tree_count(rf_model_risk)},
+            },
+        }
+
+    def train_incremental(self, fingerprint, dataset, parent_bundle, parent_dataset):
+        """
+        Update the parent's ESG and risk models with what changed in a new dataset version.
+
+        The (country, series, year) training cells and project risks of both
+        versions are compared. Each forest is grown (warm start) with a share
+        of extra trees proportional to the share of new and changed rows,
+        fitted on those rows plus a bootstrap sample of the unchanged ones so
+        they still learn the whole distribution. A forest is reused as is if
+        the change is too small to earn a tree, or refitted from scratch if
+        too much of its training data changed or was removed. New countries or series cannot be represented
+        by the parent's encoder, so they trigger a full retrain, as does any
+        backend other than the random forest.
+
+        Args:
+            fingerprint (str): Content hash of the new dataset.
+            dataset (pd.DataFrame): New preprocessed dataset.
+            parent_bundle (dict): Model bundle of the previous dataset version.
+            parent_dataset (pd.DataFrame): Previous preprocessed dataset.
+
+        Returns:
+            dict: Model bundle with the lineage of the update.
+        """
+        start = time.perf_counter()
+        esg_cells, risk_cells, counts = training_delta(parent_dataset, dataset)
+        encoder = parent_bundle["encoder"]
+        unseen = any(
+            not frame.loc[frame["Changed"], col].isin(encoder.vocabulary[col]).all()
+            for frame in (esg_cells, risk_cells) for col in encoder.columns
+        )
+        reason = None
+        if parent_bundle.get("backend", "random_forest") != "random_forest" or self.backend != "random_forest":
+            # Only forests can grow extra trees on the changed rows alone
+            reason = f"{self.backend} models are not updated incrementally"
+        elif unseen:
+            reason = "new countries or series"
+        if reason is not None:
+            logger.info(f"Retraining models for dataset {fingerprint[:16]} from scratch: {reason}")
+            bundle = self.train(fingerprint, dataset)
+            bundle["lineage"].update(parent_fingerprint=parent_bundle["fingerprint"], delta=counts, reason=reason)
+            return bundle
+
+        full_data = {}
+
+        def full_rows(name):
+            # Full training data with the parent's encoder, only built if a model needs a refit
+            if not full_data:
+                X, y, risk_X, risk_y, _ = prepare_training_data(dataset, encoder=encoder)
+                full_data.update(esg=(X, y), risk=(risk_X, risk_y))
+            return full_data[name]
+
+        updates, models, added_trees = {}, {}, {}
+        for name, cells, target, stale in (
+            ("esg", esg_cells, "Value", counts["changed_cells"] + counts["removed_cells"]),
+            ("risk", risk_cells, "RiskFactor", counts["changed_risk_rows"] + counts["removed_risk_rows"]),
+        ):
+            parent_model = parent_bundle[f"{name}_model"]
+            delta, context = cells[cells["Changed"]], cells[~cells["Changed"]]
+            total = len(cells)
+            added = int(round(len(parent_model.estimators_) * len(delta) / max(total, 1)))
+            if stale > INCREMENTAL_MAX_CHANGED_SHARE * total or len(delta) > INCREMENTAL_MAX_DELTA_SHARE * total:
+                updates[name], models[name] = "refit", train_model(*full_rows(name))
+                added_trees[name] = len(models[name].estimators_)
+            elif added == 0:
+                updates[name], models[name], added_trees[name] = "reused", parent_model, 0
+            else:
+                sample = context.sample(min(len(context), INCREMENTAL_MAX_CONTEXT_ROWS), replace=True, random_state=42)
+                rows = pd.concat([delta, sample])
+                weights = np.concatenate([np.ones(len(delta)), np.full(len(sample), len(context) / max(len(sample), 1))])
+                models[name] = warm_start_forest(
+                    parent_model, encoder.transform(rows), rows[target].to_numpy(), added, sample_weight=weights
+                )
+                updates[name], added_trees[name] = "warm_start", added
+        train_seconds = time.perf_counter() - start
+
+        with self._lock:
+            self._stats["train_seconds"] += train_seconds
+        logger.info(
+            f"Updated models for dataset {fingerprint[:16]} from {parent_bundle['version']} in {train_seconds:.2f}s "
+            f"(ESG: {updates['esg']}, risk: {updates['risk']}, {int(esg_cells['Changed'].sum())} changed cells)"
+        )
+        return {
+            "fingerprint": fingerprint,
+            "version": fingerprint[:16],
+            "backend": self.backend,
+            "esg_model": models["esg"],
+            "risk_model": models["risk"],
+            "encoder": encoder,
+            "feature_columns": encoder.feature_names(),
+            "train_rows": counts["cells"],
+            "train_seconds": train_seconds,
+            "timings": {"update_seconds": train_seconds},
+            "trained_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "lineage": {
+                "mode": "incremental",
+                "parent_fingerprint": parent_bundle["fingerprint"],
+                "delta": counts,
+                "updates": updates,
+                "added_trees": added_trees,
+                "trees": {"esg": len(models["esg"].estimators_), "risk": len(models["risk"].estimators_)},
+            },
+        }
+
+    def lineage(self, fingerprint):
+        """
+        Return the lineage records of a model version and its ancestors, newest first.
+
+        Returns:
+            list[dict]: One record per version, empty if the version is unknown.
+        """
+        records = {}
+        path = os.path.join(self.model_folder, LINEAGE_FILE)
+        if os.path.exists(path):
+            with open(path) as handle:
+                for line in handle:
+                    record = json.loads(line)
+                    records[record["fingerprint"]] = record
+
+        chain = []
+        while fingerprint in records and len(chain) < len(records):
+            chain.append(records[fingerprint])
+            fingerprint = records[fingerprint]["parent_fingerprint"]
+        return chain
+
+    def train_forecast(self, fingerprint, dataset, lags=0, trainer=None):
+        """
+        Train the multi-year ESG forecast model on a preprocessed dataset.
+
+        The model predicts a year's value from the country/series codes, the
+        year and the values of the previous lags years. It is fitted through
+        trainer (see train_in_process) without risk data.
+
+        Returns:
+            dict: Forecast model bundle.
+        """
+        start = time.perf_counter()
+        X, y, encoder = prepare_forecast_training_data(dataset, lags)
+        if X.empty:
+            raise ValueError("No historical data available to train the ESG forecast model.")
+        prepare_seconds = time.perf_counter() - start
+        forecast_model, _, timings = (trainer or train_in_process)(
+            X, y, None, None, **self._model_options(encoder, extra_features=1 + lags)
+        )
+        fit_seconds = timings["esg_fit_seconds"]
+        train_seconds = time.perf_counter() - start
+
+        with self._lock:
+            self._stats["train_seconds"] += train_seconds
+        logger.info(f"Trained forecast model with {lags} lags for dataset {fingerprint[:16]} on {len(X)} rows in {train_seconds:.2f}s")
+        return {
+            "fingerprint": fingerprint,
+            "version": f'{fingerprint[:16]}-lag{lags}',
+            "backend": self.backend,
+            "forecast_model": forecast_model,
+            "lags": lags,
+            "encoder": encoder,
+            "feature_columns": list(X.columns),
+            "train_rows": len(X),
+            "train_seconds": train_seconds,
+            "timings": {"prepare_seconds": prepare_seconds, "fit_seconds": fit_seconds},
+            "trained_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def stats(self):
+        """Return cache hit/miss counters."""
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": (self._stats["memory_hits"] + self._stats["disk_hits"]) / lookups if lookups else 0.0,
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+            }
+
+    def _train_from_parent(self, fingerprint, load_dataset, trainer, parent):
+        # Update the parent's models, or train from scratch if the parent dataset was deleted
+        try:
+            parent_bundle, _ = self.get_or_train(parent[0], parent[1], trainer)
+            parent_dataset = parent[1]()
+        except FileNotFoundError as e:
+            logger.warning(f"Parent dataset of {fingerprint[:16]} is gone ({e}), training from scratch")
+            return self.train(fingerprint, load_dataset(), trainer)
+        return self.train_incremental(fingerprint, load_dataset(), parent_bundle, parent_dataset)
+
+    def _model_options(self, encoder, extra_features=0):
+        # Keyword arguments of train_model for the configured backend
+        if self.backend == "hist_gradient_boosting":
+            return {"backend": self.backend, "categorical_features": categorical_feature_mask(encoder, extra_features)}
+        return {}
+
+    def _record_lineage(self, bundle):
+        record = {
+            "fingerprint": bundle["fingerprint"],
+            "version": bundle["version"],
+            "backend": bundle.get("backend", "random_forest"),
+            "trained_at": bundle["trained_at"],
+            "train_seconds": bundle["train_seconds"],
+            **bundle["lineage"],
+        }
+        with self._lock:
+            with open(os.path.join(self.model_folder, LINEAGE_FILE), 'a') as handle:
+                handle.write(json.dumps(record) + "\n")
+
+    def _lookup(self, fingerprint):
+        with self._lock:
+            bundle = self._cache.get(fingerprint)
+            if bundle is not None:
+                self._cache.move_to_end(fingerprint)
+                self._stats["memory_hits"] += 1
+            return bundle
+
+
+def train_in_process(X, y, risk_X, risk_y, **model_options):
+    """
+    Fit the ESG and risk models one after the other in the calling process.
+
+    Args:
+        risk_X, risk_y: Risk training data; None fits only the first model,
+            like for the forecast model.
+        **model_options: Backend and categorical features, passed to train_model.
+
+    Returns:
+        RandomForestRegressor: ESG model (or the regressor of the chosen backend).
+        RandomForestRegressor: Risk model, or None without risk data.
+        dict: Fit time of each model in seconds.
+    """
+    rf_model_esg, esg_fit_seconds = fit_timed(X, y, **model_options)
+    if risk_X is None:
+        return rf_model_esg, None, {"esg_fit_seconds": esg_fit_seconds, "risk_fit_seconds": 0.0}
+    rf_model_risk, risk_fit_seconds = fit_timed(risk_X, risk_y, **model_options)
+    return rf_model_esg, rf_model_risk, {"esg_fit_seconds": esg_fit_seconds, "risk_fit_seconds": risk_fit_seconds}
+
+
+def fit_timed(X, y, n_jobs=None, **model_options):
+    """Fit a single regressor and return it with its fit time in seconds."""
+    start = time.perf_counter()
+    model = train_model(X, y, n_jobs, **model_options)
+    return model, time.perf_counter() - start
+
+
+def _tree_count(model):
+    # Trees of a forest, or boosting iterations of gradient boosting
+    return len(model.estimators_) if hasattr(model, "estimators_") else int(model.n_iter_)
+
+
+def predict_with_bundle(bundle, features):
+    """
+    Predict ESG scores and risk factors for a batch of projects.
+
+    Args:
+        bundle (dict): Model bundle from ModelStore.
+        features (pd.DataFrame): Projects with CountryName/SeriesName columns;
+            they are encoded with the bundle's training vocabulary.
+
+    Returns:
+        np.ndarray: Predicted ESG scores.
+        np.ndarray: Predicted risk factors.
+        float: Inference latency in milliseconds.
+    """
+    start = time.perf_counter()
+    X_future = bundle["encoder"].transform(features)
+    predicted_esg_scores, predicted_risk_factors = predict_scores(
+        (bundle["esg_model"], bundle["risk_model"]), X_future, X_future
+    )
+    return predicted_esg_scores, predicted_risk_factors, (time.perf_counter() - start) * 1000
+
+
+def predict_risk_with_bundle(bundle, features):
+    """Predict risk factors for projects with CountryName/SeriesName columns with the bundle's risk model."""
+    return bundle["risk_model"].predict(bundle["encoder"].transform(features))
+
+
+def forecast_with_bundle(bundle, dataset, years):
+    """
+    Predict ESG scores of every dataset row for several years.
+
+    Years whose lag features are all in the dataset are predicted in a single
+    batched call. Years past the data are forecast one year at a time, each
+    step feeding its predictions to the lags of the next; intermediate years
+    are filled in as needed.
+
+    Args:
+        bundle (dict): Forecast model bundle from ModelStore.
+        dataset (pd.DataFrame): Preprocessed dataset with the year columns.
+        years (list[int]): Years to predict.
+
+    Returns:
+        np.ndarray: (len(years) x rows) predicted ESG scores, years in the given order.
+        int: Number of predict calls.
+        float: Inference latency in milliseconds.
+    """
+    start = time.perf_counter()
+    lags = bundle["lags"]
+    model = bundle["forecast_model"]
+    codes = bundle["encoder"].transform(dataset)
+    data_years, values = year_value_matrix(dataset)
+    last_year = int(data_years.max()) if len(data_years) else min(years) - 1
+
+    def predict(lookup_years, lookup_values, target_years):
+        X = build_forecast_features(codes, lookup_years, lookup_values, target_years, lags)
+        X = pd.DataFrame(X, columns=bundle["feature_columns"])
+        return model.predict(X).reshape(len(target_years), len(codes))
+
+    direct = sorted({year for year in years if lags == 0 or year - 1 <= last_year})
+    predictions = dict(zip(direct, predict(data_years, values, direct))) if direct else {}
+    calls = 1 if direct else 0
+
+    if len(predictions) < len(set(years)):
+        lookup_years, lookup_values = list(data_years), values
+        for year in range(last_year + 1, max(years) + 1):
+            if year not in predictions:
+                predictions[year] = predict(np.array(lookup_years), lookup_values, [year])[0]
+                calls += 1
+            lookup_years.append(year)
+            lookup_values = np.column_stack([lookup_values, predictions[year].astype(np.float32)])
+
+    return np.stack([predictions[year] for year in years]), calls, (time.perf_counter() - start) * 1000
@@ -0,0 +1,71 @@
+import time
+import uuid
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionResultNotFound(LookupError):
+    """A result ID that is unknown or has expired."""
+
+
+class PredictionSessionStore:
+    """
+    Server-side store of prediction results, keyed by a random result ID.
+
+    /predict-esg keeps the frame it returns here so /allocate-budget can be
+    called with the result ID instead of posting the predictions back. Results
+    expire ttl_seconds after they were last used; beyond max_entries the least
+    recently used result is evicted.
+    """
+
+    def __init__(self, ttl_seconds=900, max_entries=32):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"stored": 0, "hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def put(self, value):
+        """Store a result and return its ID."""
+        result_id = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            self._entries[result_id] = [value, time.monotonic() + self.ttl_seconds]
+            self._stats["stored"] += 1
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+                logger.info(f"Evicted prediction result {evicted}")
+        return result_id
+
+    def get(self, result_id):
+        """Return a stored result and extend its lifetime, or None if it is unknown or expired."""
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(result_id)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            entry[1] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(result_id)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def stats(self):
+        """Return the number of stored results and the hit/miss counters."""
+        with self._lock:
+            self._expire()
+            return {**self._stats, "entries": len(self._entries), "ttl_seconds": self.ttl_seconds}
+
+    def _expire(self):
+        # Entries are ordered by last use, so the expired ones come first
+        now = time.monotonic()
+        while self._entries:
+            result_id, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[result_id]
+            self._stats["expired"] += 1
@@ -0,0 +1,141 @@
+import io
+import gzip
+import json
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is optional, Arrow responses are then not offered
+    pa = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, gzip is always available
+    zstandard = None
+
+# Response formats for prediction frames, keyed by name
+RESPONSE_FORMATS = {
+    "records": "application/json",
+    "split": "application/vnd.esg.split+json",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+def negotiate_format(accept):
+    """
+    Pick the response format of a frame from an Accept header.
+
+    Media ranges are tried by descending quality; "records" (a JSON list of
+    row objects) is used for */*, application/json or when nothing matches.
+
+    Args:
+        accept (str): Accept header value, may be empty.
+
+    Returns:
+        str: Format name, a key of RESPONSE_FORMATS.
+    """
+    by_mimetype = {mimetype: name for name, mimetype in RESPONSE_FORMATS.items()}
+    if pa is None:
+        by_mimetype.pop(RESPONSE_FORMATS["arrow"])
+    for mimetype, quality in _ranked(accept):
+        if quality > 0 and mimetype in by_mimetype:
+            return by_mimetype[mimetype]
+    return "records"
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick "zstd", "gzip" or None from an Accept-Encoding header, preferring zstd when available."""
+    accepted = {coding for coding, quality in _ranked(accept_encoding) if quality > 0}
+    if "zstd" in accepted and zstandard is not None:
+        return "zstd"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def encode_frame(frame, fmt, key, metadata, dumps=json.dumps):
+    """
+    Serialize a frame and the response metadata in a response format.
+
+    "records" is {key: [row objects], **metadata}; "split" sends the column
+    names once, {key: {"columns": [...], "data": [[...], ...]}, **metadata};
+    "arrow" is an Arrow IPC stream of the frame with the metadata as JSON
+    under the "metadata" key of the schema metadata.
+
+    Args:
+        frame (pd.DataFrame): Rows to send.
+        fmt (str): Format name, a key of RESPONSE_FORMATS.
+        key (str): Name of the rows in JSON responses.
+        metadata (dict): Other JSON-serializable response fields.
+        dumps (callable): JSON encoder.
+
+    Returns:
+        bytes: Response body.
+    """
+    if fmt == "records":
+        return dumps({key: frame.to_dict(orient="records"), **metadata}).encode()
+    if fmt == "split":
+        return dumps({key: frame.to_dict(orient="split", index=False), **metadata}).encode()
+    if fmt == "arrow":
+        if pa is None:
+            raise ImportError("pyarrow is required for Arrow responses")
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"metadata": dumps(metadata)})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    raise ValueError(f"Unsupported response format: {fmt}. Expected one of {list(RESPONSE_FORMATS)}")
+
+
+def decode_frame(body, fmt, key):
+    """Read the frame and metadata back from an encoded (uncompressed) body, the inverse of encode_frame."""
+    if fmt == "arrow":
+        if pa is None:
+            raise ImportError("pyarrow is required for Arrow responses")
+        table = pa.ipc.open_stream(io.BytesIO(body)).read_all()
+        return table.to_pandas(), json.loads(table.schema.metadata.get(b"metadata", b"{}"))
+    payload = json.loads(body)
+    rows = payload.pop(key)
+    frame = pd.DataFrame(rows["data"], columns=rows["columns"]) if fmt == "split" else pd.DataFrame.from_records(rows)
+    return frame, payload
+
+
+def compress(body, encoding):
+    """
+    Compress a response body.
+
+    Returns:
+        bytes: Compressed body, or the body itself when it is small or encoding is None.
+        str: Content-Encoding applied, or None.
+    """
+    if encoding is None or len(body) < COMPRESSION_MIN_BYTES:
+        return body, None
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), "zstd"
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def _ranked(header):
+    # (value, quality) pairs of a comma-separated header, highest quality first
+    ranked = []
+    for position, item in enumerate((header or "").split(",")):
+        value, *params = [part.strip() for part in item.split(";")]
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        ranked.append((-quality, position, value.lower()))
+    return [(value, -quality) for quality, _, value in sorted(ranked)]
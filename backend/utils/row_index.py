@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import pandas as pd
+
+INDEXED_COLUMNS = ["SeriesName", "CountryName"]
+ROW_INDEX_SUFFIX = '.rows.npz'
+
+
+class RowIndex:
+    """
+    Row offsets of every series and country of a dataset.
+
+    For each indexed column the row offsets are stored grouped by value, in
+    CSR layout: rows of the i-th value are order[starts[i]:starts[i + 1]],
+    ascending. Filters slice these arrays instead of comparing every row.
+    """
+
+    def __init__(self, columns):
+        # column -> (values, order, starts)
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, frame, columns=INDEXED_COLUMNS):
+        """Build the index of the given columns of a frame."""
+        indexed = {}
+        for col in columns:
+            if col not in frame.columns:
+                continue
+            # Codes in order of first appearance; missing values get -1 and are left out
+            codes, values = pd.factorize(frame[col], sort=False)
+            keep = codes >= 0
+            order = np.flatnonzero(keep)[np.argsort(codes[keep], kind="stable")].astype(np.int64)
+            starts = np.concatenate([[0], np.cumsum(np.bincount(codes[keep], minlength=len(values)))]).astype(np.int64)
+            indexed[col] = (np.asarray(values.astype(str), dtype=str), order, starts)
+        return cls(indexed)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            columns = {
+                col: (data[f"{col}_values"], data[f"{col}_order"], data[f"{col}_starts"])
+                for col in INDEXED_COLUMNS if f"{col}_values" in data
+            }
+        return cls(columns)
+
+    def save(self, path):
+        arrays = {}
+        for col, (values, order, starts) in self.columns.items():
+            arrays.update({f"{col}_values": values, f"{col}_order": order, f"{col}_starts": starts})
+        # np.savez appends .npz unless the name already ends with it
+        tmp_path = f'{path[:-len(".npz")]}.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def values(self, column):
+        """Return the distinct values of a column in order of first appearance."""
+        return self.columns[column][0].tolist()
+
+    def rows(self, filters):
+        """
+        Return the ascending row offsets matching all filters.
+
+        Args:
+            filters (dict): Column name -> list of accepted values; None means no filter.
+
+        Returns:
+            np.ndarray: Row offsets, or None when no filter is given.
+        """
+        selected = None
+        for col, accepted in filters.items():
+            if accepted is None:
+                continue
+            values, order, starts = self.columns[col]
+            positions = np.flatnonzero(np.isin(values, list(accepted)))
+            rows = np.concatenate([order[starts[i]:starts[i + 1]] for i in positions] + [np.empty(0, np.int64)])
+            rows.sort()
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+        return selected
+
+
+def row_index_path(dataset_path):
+    """Return the row index file stored next to a dataset file."""
+    return os.path.splitext(dataset_path)[0] + ROW_INDEX_SUFFIX
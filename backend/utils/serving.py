@@ -0,0 +1,108 @@
+import os
+import time
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER_THREADS = 16
+
+
+def worker_context():
+    """
+    Return the multiprocessing context for worker pools.
+
+    Pools are created lazily from request or job threads. Forking there would
+    copy locks held by other threads (logging, registry, model store) and the
+    dataset and model caches into every worker, so workers are started from a
+    clean forkserver process, or spawned where forkserver is unavailable.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+class CpuOffload:
+    """
+    Run CPU-bound calls in a shared process pool.
+
+    Request handlers run in the server's threads and only share the GIL for
+    Python code, so one long DP table or CSV parse would stall every other
+    request. Calls made through run() execute in a separate process instead,
+    while the handler thread waits on the result without holding the GIL.
+    Functions and arguments must be picklable; with workers=0 calls run inline.
+    """
+
+    def __init__(self, workers=0):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {"offloaded": 0, "inline": 0, "errors": 0, "offloaded_ms": 0.0}
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) in a worker process and return its result."""
+        if not self.enabled:
+            with self._lock:
+                self._stats["inline"] += 1
+            return fn(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return self._get_pool().submit(fn, *args, **kwargs).result()
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["offloaded"] += 1
+                self._stats["offloaded_ms"] += (time.perf_counter() - start) * 1000
+
+    def stats(self):
+        """Return the number of offloaded and inline calls and the mean offloaded call time."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["workers"] = self.workers
+        stats["mean_offloaded_ms"] = stats["offloaded_ms"] / stats["offloaded"] if stats["offloaded"] else 0.0
+        return stats
+
+    def shutdown(self):
+        """Release the worker processes."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+            return self._pool
+
+
+def serve(app, host='0.0.0.0', port=5000, threads=DEFAULT_SERVER_THREADS):
+    """
+    Serve a WSGI app with waitress, a multi-threaded production server.
+
+    A single server process is used on purpose: the dataset and model caches,
+    training jobs, upload progress and the summarization batcher live in
+    process memory, and CPU-bound work is spread over CpuOffload's processes.
+
+    Args:
+        app: WSGI application.
+        host (str): Interface to listen on.
+        port (int): Port to listen on.
+        threads (int): Request handler threads.
+    """
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError as e:
+        raise ImportError("The production server requires waitress: pip install waitress") from e
+
+    logger.info(f"Serving on {host}:{port} with {threads} threads (pid {os.getpid()})")
+    waitress_serve(app, host=host, port=port, threads=threads)
@@ -0,0 +1,158 @@
+import time
+import queue
+import hashlib
+import threading
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BATCH_WINDOW_MS = 20
+MAX_BATCH_SIZE = 16
+CACHE_ENTRIES = 1024
+LATENCY_WINDOW = 1000
+
+
+def summary_cache_key(text, prompt, max_length, min_length):
+    """Return the cache key of a summarization request."""
+    digest = hashlib.sha256()
+    for part in (prompt, text, str(max_length), str(min_length)):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SummarizationWorker:
+    """
+    Micro-batching front end for a summarization model.
+
+    Requests are queued and a single background thread collects them for up to
+    batch_window_ms (or until max_batch_size requests are waiting), then runs
+    one generate call per group of requests sharing max_length/min_length.
+    Finished summaries are kept in an LRU cache, and identical requests that
+    arrive while one is in flight wait for that request instead of queueing again.
+    """
+
+    def __init__(self, generate_batch, batch_window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE,
+                 cache_entries=CACHE_ENTRIES):
+        """
+        Args:
+            generate_batch (callable): Takes a list of prompted texts, max_length
+                and min_length, and returns one summary per text.
+            batch_window_ms (float): How long to wait for more requests after the first.
+            max_batch_size (int): Maximum number of texts per generate call.
+            cache_entries (int): Number of summaries kept in the LRU cache.
+        """
+        self.generate_batch = generate_batch
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.cache_entries = cache_entries
+        self._queue = queue.Queue()
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._batch_sizes = {}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "batches": 0, "errors": 0}
+
+    def summarize(self, text, prompt="summarize: ", max_length=150, min_length=40, timeout=None):
+        """Return the summary of a text, batching it with concurrent requests."""
+        return self.submit(text, prompt, max_length, min_length).result(timeout)
+
+    def submit(self, text, prompt="summarize: ", max_length=150, min_length=40):
+        """
+        Queue a summarization request.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the summary string.
+        """
+        key = summary_cache_key(text, prompt, max_length, min_length)
+        with self._lock:
+            self._stats["requests"] += 1
+            summary = self._cache.get(key)
+            if summary is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                self._latencies.append(0.0)
+                future = Future()
+                future.set_result(summary)
+                return future
+
+            future = self._pending.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future
+
+            future = Future()
+            self._pending[key] = future
+            self._ensure_started()
+        self._queue.put((key, prompt + text, max_length, min_length, time.perf_counter()))
+        return future
+
+    def stats(self):
+        """Return queue depth, cache counters, batch size histogram and latency percentiles."""
+        with self._lock:
+            latencies = np.array(self._latencies) if self._latencies else None
+            return {
+                **self._stats,
+                "queue_depth": self._queue.qsize(),
+                "cache_entries": len(self._cache),
+                "max_cache_entries": self.cache_entries,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "latency_ms_p50": float(np.percentile(latencies, 50)) if latencies is not None else None,
+                "latency_ms_p99": float(np.percentile(latencies, 99)) if latencies is not None else None,
+            }
+
+    def _ensure_started(self):
+        # Called with the lock held; the thread only starts once there is work
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='summarization-worker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Requests with different generation lengths cannot share a generate call
+            groups = {}
+            for request in batch:
+                groups.setdefault((request[2], request[3]), []).append(request)
+            for (max_length, min_length), requests in groups.items():
+                self._generate(requests, max_length, min_length)
+
+    def _generate(self, requests, max_length, min_length):
+        try:
+            summaries = self.generate_batch([request[1] for request in requests], max_length, min_length)
+            error = None
+        except Exception as e:
+            logger.error(f"Summarization batch of {len(requests)} failed: {e}")
+            summaries, error = None, e
+
+        finished = time.perf_counter()
+        with self._lock:
+            self._stats["batches"] += 1
+            self._batch_sizes[len(requests)] = self._batch_sizes.get(len(requests), 0) + 1
+            for i, (key, _, _, _, queued_at) in enumerate(requests):
+                future = self._pending.pop(key)
+                self._latencies.append((finished - queued_at) * 1000)
+                if error is not None:
+                    self._stats["errors"] += 1
+                    future.set_exception(error)
+                    continue
+                self._cache[key] = summaries[i]
+                self._cache.move_to_end(key)
+                future.set_result(summaries[i])
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import threading
+import logging
+from utils.row_index import row_index_path
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'upload_index.json'
+DATASET_ID_LENGTH = 16
+
+
+def content_dataset_id(digest):
+    """Return the dataset ID of an upload with the given SHA-256 hex digest."""
+    return digest[:DATASET_ID_LENGTH]
+
+
+class UploadIndex:
+    """
+    Index of content-addressed uploads, persisted as a small JSON file.
+
+    Each entry maps the SHA-256 of the raw uploaded bytes to the dataset built
+    from them (its ID, raw and preprocessed files, size and row count), so a
+    re-upload of the same bytes is recognized without preprocessing it again
+    and the latest dataset is known without scanning the upload folder.
+
+    A retention policy evicts the least recently uploaded datasets once their
+    files exceed max_bytes, and datasets not uploaded for max_age_days; 0
+    disables either limit.
+    """
+
+    def __init__(self, folder, max_bytes=0, max_age_days=0):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_FILE)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._claims = {}
+        self._entries = {}
+        self._latest_id = None
+        if os.path.exists(self.path):
+            with open(self.path) as handle:
+                data = json.load(handle)
+            self._entries = data.get("entries", {})
+            self._latest_id = data.get("latest_id")
+        self._by_id = {entry["dataset_id"]: digest for digest, entry in self._entries.items()}
+
+    def claim(self, digest):
+        """Return a lock that serializes the handling of uploads with the same content."""
+        with self._lock:
+            return self._claims.setdefault(digest, threading.Lock())
+
+    def lookup(self, digest):
+        """Return the entry of previously uploaded content whose dataset file still exists, or None."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if not os.path.exists(entry["path"]):
+                self._drop(digest)
+                self._save()
+                return None
+            return dict(entry)
+
+    def add(self, digest, raw_path, path, rows):
+        """Record a new upload and mark it as the latest dataset."""
+        now = time.time()
+        entry = {
+            "dataset_id": content_dataset_id(digest),
+            "raw_path": raw_path,
+            "path": path,
+            "bytes": _file_size(raw_path) + _file_size(path),
+            "rows": rows,
+            "created_at": now,
+            "last_uploaded_at": now,
+        }
+        with self._lock:
+            self._entries[digest] = entry
+            self._by_id[entry["dataset_id"]] = digest
+            self._latest_id = entry["dataset_id"]
+            self._save()
+        return dict(entry)
+
+    def touch(self, digest):
+        """Mark previously uploaded content as uploaded again and as the latest dataset."""
+        with self._lock:
+            entry = self._entries[digest]
+            entry["last_uploaded_at"] = time.time()
+            self._latest_id = entry["dataset_id"]
+            self._save()
+            return dict(entry)
+
+    def latest_id(self):
+        """Return the ID of the most recently uploaded dataset, or None."""
+        with self._lock:
+            return self._latest_id
+
+    def dataset_path(self, dataset_id):
+        """Return the preprocessed file of an indexed dataset, or None."""
+        with self._lock:
+            digest = self._by_id.get(dataset_id)
+            return self._entries[digest]["path"] if digest else None
+
+    def enforce_retention(self, protect=()):
+        """
+        Delete the files of datasets that exceed the size or age limits.
+
+        Args:
+            protect (iterable): Dataset IDs that must be kept, e.g. the one just uploaded.
+
+        Returns:
+            list[str]: IDs of the evicted datasets.
+        """
+        protect = set(protect)
+        with self._lock:
+            # Least recently uploaded first
+            candidates = sorted(
+                (digest for digest, entry in self._entries.items() if entry["dataset_id"] not in protect),
+                key=lambda digest: self._entries[digest]["last_uploaded_at"]
+            )
+            evict = []
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                evict = [digest for digest in candidates if self._entries[digest]["last_uploaded_at"] < cutoff]
+            if self.max_bytes:
+                total = sum(entry["bytes"] for entry in self._entries.values())
+                total -= sum(self._entries[digest]["bytes"] for digest in evict)
+                for digest in candidates:
+                    if total <= self.max_bytes:
+                        break
+                    if digest not in evict:
+                        evict.append(digest)
+                        total -= self._entries[digest]["bytes"]
+
+            evicted = []
+            for digest in evict:
+                entry = self._drop(digest)
+                for path in (entry["raw_path"], entry["path"], row_index_path(entry["path"])):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                evicted.append(entry["dataset_id"])
+                logger.info(f"Evicted upload {entry['dataset_id']} ({entry['bytes']} bytes)")
+            if evicted:
+                self._save()
+            return evicted
+
+    def stats(self):
+        """Return the number and total size of the indexed uploads."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(entry["bytes"] for entry in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "max_age_days": self.max_age_days,
+                "latest_id": self._latest_id,
+            }
+
+    def _drop(self, digest):
+        entry = self._entries.pop(digest)
+        self._by_id.pop(entry["dataset_id"], None)
+        if self._latest_id == entry["dataset_id"]:
+            self._latest_id = None
+        return entry
+
+    def _save(self):
+        # Write a temporary file and rename it so readers never see a partial index
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as handle:
+            json.dump({"latest_id": self._latest_id, "entries": self._entries}, handle)
+        os.replace(tmp_path, self.path)
+
+
+def _file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else 0